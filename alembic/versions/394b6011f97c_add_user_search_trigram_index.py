@@ -0,0 +1,40 @@
+"""add user search trigram index
+
+Revision ID: 394b6011f97c
+Revises: ee3bb6853e30
+Create Date: 2026-10-17 06:52:10.418263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '394b6011f97c'
+down_revision: Union[str, Sequence[str], None] = 'ee3bb6853e30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Creating the extension needs a role allowed to (e.g. the database owner)
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # The expressions must match app.services.users.SEARCH_TERMS for the planner to use the index.
+    # Built concurrently so registrations are not blocked on a large users table.
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_search_trgm ON users USING gin (
+                (lower(coalesce(first_name, '') || ' ' || coalesce(last_name, ''))) gin_trgm_ops,
+                (lower(last_name)) gin_trgm_ops,
+                (lower(email)) gin_trgm_ops
+            )
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_trgm")
@@ -0,0 +1,28 @@
+"""add users last_seen_at
+
+Revision ID: 5c8e1f0a7d42
+Revises: 394b6011f97c
+Create Date: 2026-10-17 09:12:05.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e1f0a7d42'
+down_revision: Union[str, Sequence[str], None] = '394b6011f97c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'last_seen_at')
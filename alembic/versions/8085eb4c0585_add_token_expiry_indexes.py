@@ -0,0 +1,37 @@
+"""add token expiry indexes
+
+Revision ID: 8085eb4c0585
+Revises: c2925f247889
+Create Date: 2026-10-17 06:14:37.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8085eb4c0585'
+down_revision: Union[str, Sequence[str], None] = 'c2925f247889'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_refresh_tokens_expires_at'), 'refresh_tokens', ['expires_at'], unique=False)
+    # (user_id, is_revoked) also serves user_id-only lookups
+    op.create_index('ix_refresh_tokens_user_id_is_revoked', 'refresh_tokens', ['user_id', 'is_revoked'], unique=False)
+    op.drop_index(op.f('ix_refresh_tokens_user_id'), table_name='refresh_tokens')
+    op.create_index(op.f('ix_verification_tokens_expires_at'), 'verification_tokens', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_password_reset_tokens_expires_at'), 'password_reset_tokens', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_password_reset_tokens_expires_at'), table_name='password_reset_tokens')
+    op.drop_index(op.f('ix_verification_tokens_expires_at'), table_name='verification_tokens')
+    op.create_index(op.f('ix_refresh_tokens_user_id'), 'refresh_tokens', ['user_id'], unique=False)
+    op.drop_index('ix_refresh_tokens_user_id_is_revoked', table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_expires_at'), table_name='refresh_tokens')
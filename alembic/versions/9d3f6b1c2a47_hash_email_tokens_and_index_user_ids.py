@@ -0,0 +1,47 @@
+"""hash email tokens and index user ids
+
+Revision ID: 9d3f6b1c2a47
+Revises: e4b7a2c91f35
+Create Date: 2026-10-17 13:05:48.227316
+
+Verification and password reset tokens are stored as the sha256 of the
+emailed value. Outstanding tokens are hashed in place, so links already sent
+keep working. Downgrading cannot recover the raw values and deletes them.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f6b1c2a47'
+down_revision: Union[str, Sequence[str], None] = 'e4b7a2c91f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('verification_tokens', 'password_reset_tokens')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column('token_hash', sa.LargeBinary(length=32), nullable=True))
+        op.execute(f"UPDATE {table} SET token_hash = sha256(convert_to(token, 'UTF8'))")
+        op.alter_column(table, 'token_hash', nullable=False)
+        op.drop_index(op.f(f'ix_{table}_token'), table_name=table)
+        op.drop_column(table, 'token')
+        op.create_index(op.f(f'ix_{table}_token_hash'), table, ['token_hash'], unique=True)
+        op.create_index(op.f(f'ix_{table}_user_id'), table, ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.execute(f"DELETE FROM {table}")
+        op.drop_index(op.f(f'ix_{table}_user_id'), table_name=table)
+        op.drop_index(op.f(f'ix_{table}_token_hash'), table_name=table)
+        op.drop_column(table, 'token_hash')
+        op.add_column(table, sa.Column('token', sa.String(), nullable=False))
+        op.create_index(op.f(f'ix_{table}_token'), table, ['token'], unique=True)
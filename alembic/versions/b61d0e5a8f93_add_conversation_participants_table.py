@@ -0,0 +1,44 @@
+"""add conversation_participants table
+
+Revision ID: b61d0e5a8f93
+Revises: 9d3f6b1c2a47
+Create Date: 2026-10-17 15:20:11.604218
+
+Only participants may join, read or post to a conversation. Existing
+conversations start with their creator as the only participant.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b61d0e5a8f93'
+down_revision: Union[str, Sequence[str], None] = '9d3f6b1c2a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conversation_participants',
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('conversation_id', 'user_id')
+    )
+    op.create_index('ix_conversation_participants_user_id', 'conversation_participants', ['user_id'], unique=False)
+    op.execute(
+        "INSERT INTO conversation_participants (conversation_id, user_id) "
+        "SELECT id, created_by FROM conversations"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversation_participants_user_id', table_name='conversation_participants')
+    op.drop_table('conversation_participants')
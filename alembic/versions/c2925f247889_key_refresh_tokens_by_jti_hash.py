@@ -0,0 +1,39 @@
+"""key refresh tokens by jti hash
+
+Revision ID: c2925f247889
+Revises: 77f276ead0f6
+Create Date: 2026-10-17 06:05:12.481203
+
+Existing refresh tokens carry no jti and cannot be looked up under the new key,
+so they are deleted; affected users have to log in again.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2925f247889'
+down_revision: Union[str, Sequence[str], None] = '77f276ead0f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("DELETE FROM refresh_tokens")
+    op.drop_index(op.f('ix_refresh_tokens_token'), table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'token')
+    op.add_column('refresh_tokens', sa.Column('jti_hash', sa.LargeBinary(length=32), nullable=False))
+    op.create_index(op.f('ix_refresh_tokens_jti_hash'), 'refresh_tokens', ['jti_hash'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM refresh_tokens")
+    op.drop_index(op.f('ix_refresh_tokens_jti_hash'), table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'jti_hash')
+    op.add_column('refresh_tokens', sa.Column('token', sa.String(length=512), nullable=False))
+    op.create_index(op.f('ix_refresh_tokens_token'), 'refresh_tokens', ['token'], unique=True)
@@ -0,0 +1,40 @@
+"""add token_revocations table
+
+Revision ID: e4b7a2c91f35
+Revises: 5c8e1f0a7d42
+Create Date: 2026-10-17 11:40:27.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7a2c91f35'
+down_revision: Union[str, Sequence[str], None] = '5c8e1f0a7d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('token_revocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(length=64), nullable=True),
+    sa.Column('revoked_before', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_token_revocations_id'), 'token_revocations', ['id'], unique=False)
+    op.create_index('ix_token_revocations_expires_at_id', 'token_revocations', ['expires_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_token_revocations_expires_at_id', table_name='token_revocations')
+    op.drop_index(op.f('ix_token_revocations_id'), table_name='token_revocations')
+    op.drop_table('token_revocations')
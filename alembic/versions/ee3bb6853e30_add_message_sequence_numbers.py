@@ -0,0 +1,49 @@
+"""add message sequence numbers
+
+Revision ID: ee3bb6853e30
+Revises: 2b7833834a52
+Create Date: 2026-10-17 06:41:27.553018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ee3bb6853e30'
+down_revision: Union[str, Sequence[str], None] = '2b7833834a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversations', sa.Column('last_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('messages', sa.Column('seq', sa.BigInteger(), nullable=True))
+    # Number existing messages in insertion order within each conversation
+    op.execute("""
+        UPDATE messages SET seq = numbered.seq
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY conversation_id ORDER BY id) AS seq
+            FROM messages
+        ) AS numbered
+        WHERE messages.id = numbered.id
+    """)
+    op.execute("""
+        UPDATE conversations SET last_seq = counts.last_seq
+        FROM (SELECT conversation_id, max(seq) AS last_seq FROM messages GROUP BY conversation_id) AS counts
+        WHERE conversations.id = counts.conversation_id
+    """)
+    op.alter_column('messages', 'seq', nullable=False)
+    op.create_index('ix_messages_conversation_id_seq', 'messages', ['conversation_id', 'seq'], unique=True)
+    op.drop_index('ix_messages_conversation_id_id', table_name='messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', 'id'], unique=False)
+    op.drop_index('ix_messages_conversation_id_seq', table_name='messages')
+    op.drop_column('messages', 'seq')
+    op.drop_column('conversations', 'last_seq')
@@ -0,0 +1,165 @@
+"""Picks Argon2 costs for this host.
+
+Memory cost comes first: each of the `concurrency` hashes that can run at
+once (one per password hashing worker) gets an equal share of
+ARGON2_MEMORY_BUDGET_MB, capped at 256 MiB and halved while a single pass
+is already slower than the target. Time cost is then raised as far as the
+target allows. Latencies are measured with every worker hashing at once,
+as they would be at peak login traffic.
+
+    python -m app.auth.calibration --target-ms 250 --memory-budget-mb 1024 --write argon2.json
+
+With ARGON2_CALIBRATION_FILE set, the app uses the costs in that file, and
+calibrates and writes it at startup if it does not exist yet. One process
+calibrates, holding a lock on "<file>.lock", while the others wait and load
+its result. Stored hashes made at other costs keep verifying; those with a
+lower time or memory cost than the configured one are rehashed on the next
+login, and stronger ones are left as they are.
+"""
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Tuple
+
+from app.auth.security import Argon2Cost
+from app.config.settings import settings
+
+# OWASP's floor for Argon2id, and a ceiling past which time cost is the better lever
+MIN_MEMORY_KIB = 19 * 1024
+MAX_MEMORY_KIB = 256 * 1024
+SAMPLE_PASSWORD = "Calibrati0n-sample"
+
+
+def _timed_hash(cost: Argon2Cost) -> float:
+    hasher = cost.hasher()
+    start = time.perf_counter()
+    hasher.hash(SAMPLE_PASSWORD)
+    return time.perf_counter() - start
+
+
+def measure(cost: Argon2Cost, concurrency: int, rounds: int = 3) -> float:
+    """Median seconds per hash with `concurrency` hashes running at once."""
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        # One untimed round starts the workers
+        list(pool.map(_timed_hash, [cost] * concurrency))
+        return statistics.median(pool.map(_timed_hash, [cost] * concurrency * rounds))
+
+
+def calibrate(
+        target_ms: float = settings.ARGON2_TARGET_MS,
+        concurrency: int = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+        memory_budget_mb: int = settings.ARGON2_MEMORY_BUDGET_MB,
+        parallelism: int = settings.ARGON2_PARALLELISM,
+        verbose: bool = False
+) -> Tuple[Argon2Cost, float]:
+    """Returns the chosen cost and its measured seconds per hash."""
+    target = target_ms / 1000
+    memory_cost = memory_budget_mb * 1024 // concurrency // 1024 * 1024
+    memory_cost = max(MIN_MEMORY_KIB, min(MAX_MEMORY_KIB, memory_cost))
+
+    def timed(cost: Argon2Cost) -> float:
+        latency = measure(cost, concurrency)
+        if verbose:
+            print(f"  t={cost.time_cost} m={cost.memory_cost // 1024}MiB p={cost.parallelism}: {latency * 1000:.0f} ms")
+        return latency
+
+    cost = Argon2Cost(1, memory_cost, parallelism)
+    latency = timed(cost)
+    while latency > target and cost.memory_cost > MIN_MEMORY_KIB:
+        cost = Argon2Cost(1, max(MIN_MEMORY_KIB, cost.memory_cost // 2), parallelism)
+        latency = timed(cost)
+
+    # Latency grows linearly with time cost, so one estimate lands close
+    time_cost = max(1, int(target / latency))
+    if time_cost > 1:
+        cost = Argon2Cost(time_cost, cost.memory_cost, parallelism)
+        latency = timed(cost)
+        while latency > target and cost.time_cost > 1:
+            cost = Argon2Cost(cost.time_cost - 1, cost.memory_cost, parallelism)
+            latency = timed(cost)
+    return cost, latency
+
+
+def load_calibration(path: str) -> Argon2Cost:
+    with open(path) as f:
+        data = json.load(f)
+    return Argon2Cost(data["time_cost"], data["memory_cost"], data["parallelism"])
+
+
+def save_calibration(path: str, cost: Argon2Cost, latency: float, concurrency: int) -> Argon2Cost:
+    """Writes the file unless another process got there first; returns the cost the file holds."""
+    data = {
+        **asdict(cost),
+        "latency_ms": round(latency * 1000, 1),
+        "concurrency": concurrency,
+        "calibrated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    try:
+        # Linking fails if the file exists, so workers calibrating at once agree on one result
+        os.link(tmp_path, path)
+    except FileExistsError:
+        return load_calibration(path)
+    finally:
+        os.remove(tmp_path)
+    return cost
+
+
+def load_or_calibrate(path: str) -> Argon2Cost:
+    if os.path.exists(path):
+        return load_calibration(path)
+    # Workers starting together would skew each other's measurements, so one
+    # calibrates while the rest block here and then load its file
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            return load_calibration(path)
+        concurrency = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+        print(f"Calibrating Argon2 for {settings.ARGON2_TARGET_MS:.0f} ms at {concurrency} concurrent hashes")
+        cost, latency = calibrate(concurrency=concurrency)
+        cost = save_calibration(path, cost, latency, concurrency)
+        print(f"Argon2 cost {cost} written to {path}")
+        return cost
+
+
+async def configured_cost() -> Argon2Cost:
+    """The cost to hash new passwords with in this deployment."""
+    path = settings.ARGON2_CALIBRATION_FILE
+    if not path:
+        return Argon2Cost.from_settings()
+    return await asyncio.to_thread(load_or_calibrate, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick Argon2 costs for this host")
+    parser.add_argument("--target-ms", type=float, default=settings.ARGON2_TARGET_MS)
+    parser.add_argument("--concurrency", type=int, default=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+                        help="hashes running at once; the password hashing worker count")
+    parser.add_argument("--memory-budget-mb", type=int, default=settings.ARGON2_MEMORY_BUDGET_MB)
+    parser.add_argument("--parallelism", type=int, default=settings.ARGON2_PARALLELISM)
+    parser.add_argument("--write", metavar="PATH", help="save the result for ARGON2_CALIBRATION_FILE")
+    args = parser.parse_args()
+
+    cost, latency = calibrate(args.target_ms, args.concurrency, args.memory_budget_mb, args.parallelism, verbose=True)
+    print(f"ARGON2_TIME_COST={cost.time_cost}")
+    print(f"ARGON2_MEMORY_COST={cost.memory_cost}")
+    print(f"ARGON2_PARALLELISM={cost.parallelism}")
+    print(f"{latency * 1000:.0f} ms per hash, about {args.concurrency / latency:.0f} logins/s at {args.concurrency} concurrent hashes")
+    if args.write:
+        if os.path.exists(args.write):
+            os.remove(args.write)
+        save_calibration(args.write, cost, latency, args.concurrency)
+        print(f"written to {args.write}")
+
+
+if __name__ == "__main__":
+    main()
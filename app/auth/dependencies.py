@@ -1,32 +1,59 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_db
+from app.auth.revocation import revocations
 from app.auth.security import verify_token
+from app.auth.user_cache import CachedUser, user_cache
 from app.models.user import User
 
 security = HTTPBearer()
 
-def get_current_user(
+
+def access_token_claims(token: str) -> Optional[dict]:
+    """Returns the claims of a valid, unrevoked access token that names a user, else None."""
+    payload = verify_token(token)
+    if not payload or payload.get("type") != "access" or payload.get("user_id") is None:
+        return None
+    # Checked on every call, cached verification or not
+    if revocations.is_revoked(payload):
+        return None
+    return payload
+
+
+async def resolve_user(token: str, db: AsyncSession) -> Optional[CachedUser]:
+    """Returns the user an access token belongs to, or None if it is not valid."""
+    payload = access_token_claims(token)
+    if payload is None:
+        return None
+    return await load_user(payload["user_id"], db)
+
+
+async def load_user(user_id: int, db: AsyncSession) -> Optional[CachedUser]:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    generation = user_cache.generation
+    db_user = await db.get(User, user_id)
+    if db_user is None:
+        return None
+
+    user = CachedUser.from_user(db_user)
+    user_cache.set(user, generation)
+    return user
+
+
+async def get_current_user(
         token: str = Depends(security),
-        db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
-    payload = verify_token(token.credentials)
-    if not payload or payload.get("type") != "access":
-        raise credentials_exception
-
-    email: str = payload.get("sub")
-    if email is None:
-        raise credentials_exception
-
-    user = db.query(User).filter(User.email == email).first()
+        db: AsyncSession = Depends(get_db)
+) -> CachedUser:
+    user = await resolve_user(token.credentials, db)
     if user is None:
-        raise credentials_exception
-
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
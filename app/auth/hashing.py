@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Set
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+
+from app import metrics
+from app.auth import security
+from app.auth.security import Argon2Cost
+from app.config.settings import settings
+from app.database import open_session
+from app.models import User
+
+
+class PasswordHashingEngine:
+    """Runs Argon2 hashing/verification in a process pool so it never blocks the event loop."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 64, retry_after: int = 1):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+        self.cost = Argon2Cost.from_settings()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self.hash_stats = metrics.latency("password_hash")
+        self.verify_stats = metrics.latency("password_verify")
+        self.rejected = metrics.counter("password_hash_rejected")
+        metrics.gauge("password_hash_pending", lambda: self.pending)
+
+    def configure(self, cost: Argon2Cost):
+        """Hashes new passwords at `cost` from now on, here and in the pool's workers."""
+        self.cost = cost
+        security.configure_password_hash(cost)
+        self.shutdown()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=security.configure_password_hash,
+                initargs=(self.cost,)
+            )
+        return self._executor
+
+    async def _run(self, stats: metrics.LatencyStats, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            stats.observe(time.perf_counter() - start)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.hash_stats, security.get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.verify_stats, security.verify_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return security.password_needs_rehash(hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class PasswordRehasher:
+    """Upgrades a stored hash to the current cost after a successful login, off the request path.
+
+    The UPDATE only matches while the row still holds the hash that was
+    verified, so a password changed meanwhile is never overwritten. Rehashes
+    are skipped while the hashing pool is half full; the next login retries.
+    """
+
+    def __init__(self, engine: PasswordHashingEngine):
+        self.engine = engine
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.rehashed = metrics.counter("password_rehashed")
+        self.skipped = metrics.counter("password_rehash_skipped")
+
+    def schedule(self, user_id: int, password: str, old_hash: str):
+        if self.engine.pending >= self.engine.max_pending // 2:
+            self.skipped.inc()
+            return
+        task = asyncio.create_task(self._rehash(user_id, password, old_hash))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _rehash(self, user_id: int, password: str, old_hash: str):
+        try:
+            new_hash = await self.engine.hash(password)
+            async with open_session() as db:
+                result = await db.execute(
+                    update(User)
+                    .where(User.id == user_id, User.hashed_password == old_hash)
+                    .values(hashed_password=new_hash)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            if result.rowcount:
+                self.rehashed.inc()
+        except Exception as e:
+            print(f"Password rehash for user {user_id} failed: {str(e)}")
+
+    async def stop(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+password_hasher = PasswordHashingEngine(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER
+)
+password_rehasher = PasswordRehasher(password_hasher)
@@ -0,0 +1,270 @@
+"""Server-side revocation of access tokens without a query per request.
+
+Access tokens carry a jti and an iat. A token is revoked when its jti is on
+the denylist, or when its user has a revoked_before time (password reset,
+deactivation) later than the token's iat. Both live in memory: jtis in a
+Bloom filter backed by an exact dict that rules out its false positives, and
+revoked_before times in a dict keyed by user id.
+
+Revocations are stored in token_revocations; every worker rebuilds from that
+table at startup, waiting at most REVOCATION_LOAD_MAX_SECONDS before serving
+while the load finishes in the background, and again every
+REVOCATION_RELOAD_SECONDS, which also drops entries whose tokens have all
+expired. New revocations reach the other workers through a RevocationChannel:
+the chat broker when CHAT_BROKER is "tcp", otherwise this worker only.
+"""
+import asyncio
+import json
+import math
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+
+from app import metrics
+from app.chat.pubsub import Broker, BrokerObserver, chat_broker
+from app.config.settings import settings
+from app.database import open_session
+from app.models import TokenRevocation
+
+# Conversation ids start at 1 and presence uses room 0
+REVOCATION_ROOM = -1
+
+# ("jti", jti, exp) or ("user", user_id, revoked_before); times are epoch seconds
+Revocation = Tuple[str, object, float]
+
+
+class BloomFilter:
+    """Set membership with no false negatives, in about 1.2 bytes per key at a 0.1% error rate."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing on the two halves of the string hash, cached on the str
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+
+class RevocationChannel:
+    """Delivers revocations to every worker's list, including the publisher's."""
+
+    def publish(self, revocation: Revocation):
+        raise NotImplementedError
+
+    def subscribe(self, callback: Callable[[Revocation], None]):
+        raise NotImplementedError
+
+
+class LocalRevocationChannel(RevocationChannel):
+    def __init__(self):
+        self._subscribers: List[Callable[[Revocation], None]] = []
+
+    def publish(self, revocation: Revocation):
+        for callback in self._subscribers:
+            callback(revocation)
+
+    def subscribe(self, callback: Callable[[Revocation], None]):
+        self._subscribers.append(callback)
+
+
+class BrokerRevocationChannel(LocalRevocationChannel, BrokerObserver):
+    """Relays revocations through the chat broker on a pinned room.
+
+    Revocations published while the broker is disconnected are picked up by
+    the other workers at their next reload.
+    """
+
+    def __init__(self, broker: Broker):
+        super().__init__()
+        self.broker = broker
+        broker.add_observer(self)
+        broker.pin(REVOCATION_ROOM)
+
+    def publish(self, revocation: Revocation):
+        super().publish(revocation)
+        self.broker.publish(REVOCATION_ROOM, json.dumps(revocation, separators=(",", ":")))
+
+    def observe(self, room_id: int, payload: str):
+        if room_id == REVOCATION_ROOM:
+            # Our own publishes come back through a LocalBroker; adding twice is harmless
+            for callback in self._subscribers:
+                callback(tuple(json.loads(payload)))
+
+    def set_live(self, live: bool):
+        pass
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite hands back naive datetimes; everything in the table is UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationList:
+    def __init__(
+            self,
+            channel: RevocationChannel,
+            bloom_capacity: int = settings.REVOCATION_BLOOM_CAPACITY,
+            bloom_error_rate: float = settings.REVOCATION_BLOOM_ERROR_RATE,
+            reload_seconds: float = settings.REVOCATION_RELOAD_SECONDS,
+            batch_size: int = settings.REVOCATION_LOAD_BATCH_SIZE
+    ):
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.reload_seconds = reload_seconds
+        self.batch_size = batch_size
+        self._loaded = asyncio.Event()
+        self._bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self._jtis: Dict[str, float] = {}
+        self._revoked_before: Dict[int, float] = {}
+        # Revocations that arrive while a reload is reading the table
+        self._arrived_during_load: Optional[List[Revocation]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.rejected = metrics.counter("token_revocations_rejected")
+        self.load_time = metrics.latency("token_revocations_load")
+        metrics.gauge("token_revocations_jtis", lambda: len(self._jtis))
+        metrics.gauge("token_revocations_users", lambda: len(self._revoked_before))
+
+        self.channel = channel
+        self.channel.subscribe(self._apply)
+
+    def is_revoked(self, claims: dict) -> bool:
+        before = self._revoked_before.get(claims.get("user_id"))
+        # Tokens without an iat predate revocation support
+        if before is not None and claims.get("iat", 0) < before:
+            self.rejected.inc()
+            return True
+        jti = claims.get("jti")
+        if jti is not None and jti in self._bloom and jti in self._jtis:
+            self.rejected.inc()
+            return True
+        return False
+
+    def revoke_token(self, jti: str, expires_at: float):
+        """Publishes a stored jti revocation; call after the transaction commits."""
+        self.channel.publish(("jti", jti, expires_at))
+
+    def revoke_user(self, user_id: int, revoked_before: float):
+        """Publishes a stored revoked_before; call after the transaction commits."""
+        self.channel.publish(("user", user_id, revoked_before))
+
+    def _apply(self, revocation: Revocation):
+        if self._arrived_during_load is not None:
+            self._arrived_during_load.append(revocation)
+        self._add(self._bloom, self._jtis, self._revoked_before, revocation)
+
+    @staticmethod
+    def _add(bloom: BloomFilter, jtis: Dict[str, float], revoked_before: Dict[int, float], revocation: Revocation):
+        kind, key, value = revocation
+        if kind == "jti":
+            if key not in jtis:
+                bloom.add(key)
+            jtis[key] = value
+        else:
+            revoked_before[key] = max(value, revoked_before.get(key, 0))
+
+    async def load(self):
+        """Rebuilds the structures from token_revocations."""
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        rows: List[Revocation] = []
+        self._arrived_during_load = []
+        try:
+            async with open_session() as db:
+                after = None
+                while True:
+                    query = (
+                        select(TokenRevocation.id, TokenRevocation.expires_at, TokenRevocation.user_id,
+                               TokenRevocation.jti, TokenRevocation.revoked_before)
+                        .where(TokenRevocation.expires_at > now)
+                        .order_by(TokenRevocation.expires_at, TokenRevocation.id)
+                        .limit(self.batch_size)
+                    )
+                    if after is not None:
+                        query = query.where(tuple_(TokenRevocation.expires_at, TokenRevocation.id) > after)
+                    batch = (await db.execute(query)).all()
+                    for row in batch:
+                        if row.jti is not None:
+                            rows.append(("jti", row.jti, _timestamp(row.expires_at)))
+                        if row.revoked_before is not None:
+                            rows.append(("user", row.user_id, _timestamp(row.revoked_before)))
+                    if len(batch) < self.batch_size:
+                        break
+                    after = (batch[-1].expires_at, batch[-1].id)
+            rows.extend(self._arrived_during_load)
+        finally:
+            self._arrived_during_load = None
+
+        jti_count = sum(1 for kind, _, _ in rows if kind == "jti")
+        bloom = BloomFilter(max(self.bloom_capacity, 2 * jti_count), self.bloom_error_rate)
+        jtis: Dict[str, float] = {}
+        revoked_before: Dict[int, float] = {}
+        for revocation in rows:
+            self._add(bloom, jtis, revoked_before, revocation)
+        self._bloom, self._jtis, self._revoked_before = bloom, jtis, revoked_before
+        self._loaded.set()
+        self.load_time.observe(time.perf_counter() - start)
+
+    async def start(self, max_wait: float = settings.REVOCATION_LOAD_MAX_SECONDS) -> bool:
+        """Starts loading and reloading; returns whether the first load finished within max_wait."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._loaded.wait(), max_wait)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._loaded.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"Token revocation reload failed: {str(e)}")
+                # Until the first load succeeds, revoked tokens are accepted
+                if not self._loaded.is_set():
+                    await asyncio.sleep(1)
+                    continue
+            await asyncio.sleep(self.reload_seconds)
+
+
+def create_revocation_channel() -> RevocationChannel:
+    if settings.CHAT_BROKER == "tcp":
+        return BrokerRevocationChannel(chat_broker)
+    return LocalRevocationChannel()
+
+
+revocations = RevocationList(create_revocation_channel())
@@ -1,54 +1,119 @@
-from datetime import datetime, timedelta
+import hashlib
+import secrets
+import time
+from dataclasses import dataclass
+from datetime import timedelta
 from typing import Optional
-from jose import jwt, JWTError
-from argon2 import PasswordHasher
+import bcrypt
+from argon2 import PasswordHasher, extract_parameters
 from argon2.exceptions import VerifyMismatchError, InvalidHashError
+from app.auth.tokens import token_engine, verified_tokens
 from app.config.settings import settings
 
+# Hashes from before the move to Argon2; they verify, then get rehashed on login
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+
+@dataclass(frozen=True)
+class Argon2Cost:
+    time_cost: int  # Number of iterations
+    memory_cost: int  # Memory usage in KiB
+    parallelism: int  # Degree of parallelism
+
+    @classmethod
+    def from_settings(cls) -> "Argon2Cost":
+        return cls(settings.ARGON2_TIME_COST, settings.ARGON2_MEMORY_COST, settings.ARGON2_PARALLELISM)
+
+    def hasher(self) -> PasswordHasher:
+        return PasswordHasher(
+            time_cost=self.time_cost,
+            memory_cost=self.memory_cost,
+            parallelism=self.parallelism,
+            hash_len=settings.ARGON2_HASH_LENGTH,  # Hash length
+            salt_len=settings.ARGON2_SALT_LENGTH  # Salt length
+        )
+
+
 # Initialize Argon2 password hasher
-password_hash = PasswordHasher(
-    time_cost=settings.ARGON2_TIME_COST,  # Number of iterations
-    memory_cost=settings.ARGON2_MEMORY_COST,  # Memory usage (64MB)
-    parallelism=settings.ARGON2_PARALLELISM,  # Degree of parallelism
-    hash_len=settings.ARGON2_HASH_LENGTH,  # Hash length
-    salt_len=settings.ARGON2_SALT_LENGTH  # Salt length
-)
+password_cost = Argon2Cost.from_settings()
+password_hash = password_cost.hasher()
+
+
+def configure_password_hash(cost: Argon2Cost):
+    """Sets the cost of new hashes in this process; hashes made at any other cost still verify."""
+    global password_cost, password_hash
+    password_cost = cost
+    password_hash = cost.hasher()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    if hashed_password.startswith(BCRYPT_PREFIXES):
+        try:
+            # bcrypt only ever used the first 72 bytes; bcrypt 5 raises on longer input
+            return bcrypt.checkpw(plain_password.encode()[:72], hashed_password.encode())
+        except ValueError:
+            return False
     try:
         return password_hash.verify(hashed_password, plain_password)
     except (VerifyMismatchError, InvalidHashError):
         return False
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True for bcrypt hashes and Argon2 hashes weaker than the current cost.
+
+    A stronger stored hash is kept, so a cheaper calibration never downgrades it.
+    """
+    if hashed_password.startswith(BCRYPT_PREFIXES):
+        return True
+    try:
+        stored = extract_parameters(hashed_password)
+    except InvalidHashError:
+        return False
+    return stored.time_cost < password_cost.time_cost or stored.memory_cost < password_cost.memory_cost
+
+
 def get_password_hash(password: str) -> str:
     return password_hash.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    if expires_delta is None:
+        expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    # jti and iat let the token be revoked (app.auth.revocation); iat keeps
+    # sub-second precision so a token issued just before a password reset
+    # does not survive it by falling in the same second
+    to_encode.setdefault("jti", new_jti())
+    now = time.time()
+    to_encode.update({"exp": int(now + expires_delta.total_seconds()), "iat": now, "type": "access"})
+    return token_engine.encode(to_encode)
 
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+
+def new_jti() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def hash_token(token: str) -> bytes:
+    # Fixed-width key for token lookups; never store the raw value
+    return hashlib.sha256(token.encode()).digest()
 
 
 def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode.setdefault("jti", new_jti())
+    expire = int(time.time() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds())
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    return token_engine.encode(to_encode)
 
 
 def verify_token(token: str) -> Optional[dict]:
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    payload = verified_tokens.get(token)
+    if payload is not None:
         return payload
-    except JWTError:
-        return None
\ No newline at end of file
+    payload = token_engine.decode(token)
+    # Access tokens are presented on every request; refresh tokens once each
+    if payload is not None and payload.get("type") == "access":
+        verified_tokens.set(token, payload)
+    return payload
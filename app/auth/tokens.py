@@ -0,0 +1,256 @@
+"""JSON Web Token signing and verification.
+
+Keys are parsed once at startup and the JOSE header of each engine is
+serialized once, so signing is one JSON dump plus a MAC or signature, and
+verifying a well-formed token skips header parsing entirely.
+
+HS256/384/512 use SECRET_KEY. EdDSA (Ed25519) and ES256 (P-256) sign with
+the PEM private key in JWT_PRIVATE_KEY_FILE; the public half, plus any
+retired keys listed in JWT_PUBLIC_KEY_FILES, is published at
+/.well-known/jwks.json so other services can verify tokens without the
+shared secret. Changing ALGORITHM invalidates every token already issued.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+
+from app import metrics
+from app.config.settings import settings
+
+HMAC_DIGESTS = {"HS256": "sha256", "HS384": "sha384", "HS512": "sha512"}
+
+
+def b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _dumps(value: dict) -> bytes:
+    # Sorted keys match the headers python-jose wrote, so its tokens take the fast path
+    return json.dumps(value, separators=(",", ":"), sort_keys=True).encode()
+
+
+class TokenEngine:
+    """Signs claims into compact JWS tokens and verifies them."""
+
+    def __init__(self, algorithm: str, kid: Optional[str] = None):
+        self.algorithm = algorithm
+        self.kid = kid
+        header = {"alg": algorithm, "typ": "JWT"}
+        if kid is not None:
+            header["kid"] = kid
+        self._header = b64encode(_dumps(header))
+
+    def encode(self, claims: dict) -> str:
+        signing_input = self._header + b"." + b64encode(_dumps(claims))
+        return (signing_input + b"." + b64encode(self._sign(signing_input))).decode()
+
+    def decode(self, token: str) -> Optional[dict]:
+        """Returns the claims of a token with a valid signature that has not expired, else None."""
+        try:
+            signing_input, _, signature = token.encode("ascii").rpartition(b".")
+            header, _, payload = signing_input.partition(b".")
+            kid = self.kid
+            if header != self._header:
+                fields = json.loads(b64decode(header))
+                if not isinstance(fields, dict) or fields.get("alg") != self.algorithm:
+                    return None
+                kid = fields.get("kid")
+            if not payload or not self._verify(signing_input, b64decode(signature), kid):
+                return None
+            claims = json.loads(b64decode(payload))
+        except (ValueError, binascii.Error):
+            return None
+        if not isinstance(claims, dict):
+            return None
+
+        now = time.time()
+        exp = claims.get("exp")
+        if exp is not None and (not isinstance(exp, (int, float)) or exp < now):
+            return None
+        nbf = claims.get("nbf")
+        if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+            return None
+        return claims
+
+    def jwks(self) -> dict:
+        """Public keys for verifiers, as a JWK Set."""
+        return {"keys": []}
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        raise NotImplementedError
+
+    def _verify(self, signing_input: bytes, signature: bytes, kid: Optional[str]) -> bool:
+        raise NotImplementedError
+
+
+class HmacTokenEngine(TokenEngine):
+    def __init__(self, secret: str, algorithm: str = "HS256"):
+        super().__init__(algorithm)
+        self._key = secret.encode()
+        self._digest = HMAC_DIGESTS[algorithm]
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        return hmac.digest(self._key, signing_input, self._digest)
+
+    def _verify(self, signing_input: bytes, signature: bytes, kid: Optional[str]) -> bool:
+        return hmac.compare_digest(hmac.digest(self._key, signing_input, self._digest), signature)
+
+
+def public_jwk(public_key) -> dict:
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        raw = public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return {"kty": "OKP", "crv": "Ed25519", "x": b64encode(raw).decode()}
+    if isinstance(public_key, ec.EllipticCurvePublicKey) and isinstance(public_key.curve, ec.SECP256R1):
+        numbers = public_key.public_numbers()
+        return {
+            "kty": "EC", "crv": "P-256",
+            "x": b64encode(numbers.x.to_bytes(32, "big")).decode(),
+            "y": b64encode(numbers.y.to_bytes(32, "big")).decode(),
+        }
+    raise ValueError("Only Ed25519 and P-256 keys are supported")
+
+
+def jwk_thumbprint(jwk: dict) -> str:
+    # RFC 7638: the required members only, in lexicographic order
+    required = ("crv", "kty", "x") if jwk["kty"] == "OKP" else ("crv", "kty", "x", "y")
+    canonical = json.dumps({name: jwk[name] for name in required}, separators=(",", ":"), sort_keys=True)
+    return b64encode(hashlib.sha256(canonical.encode()).digest()).decode()
+
+
+class KeyPairTokenEngine(TokenEngine):
+    """EdDSA (Ed25519) or ES256 (P-256); verifies with the signing key or any retired public key."""
+
+    def __init__(self, algorithm: str, private_key, retired_public_keys: Optional[List] = None):
+        if algorithm == "EdDSA":
+            if not isinstance(private_key, ed25519.Ed25519PrivateKey):
+                raise ValueError("EdDSA needs an Ed25519 private key")
+        elif algorithm == "ES256":
+            if not isinstance(private_key, ec.EllipticCurvePrivateKey) or not isinstance(private_key.curve, ec.SECP256R1):
+                raise ValueError("ES256 needs a P-256 private key")
+        else:
+            raise ValueError(f"Unsupported algorithm {algorithm}")
+        self._private_key = private_key
+        self._jwks: List[dict] = []
+        self._public_keys: Dict[str, object] = {}
+        for public_key in [private_key.public_key()] + list(retired_public_keys or []):
+            jwk = public_jwk(public_key)
+            kid = jwk_thumbprint(jwk)
+            self._public_keys[kid] = public_key
+            self._jwks.append({**jwk, "kid": kid, "use": "sig", "alg": algorithm})
+        super().__init__(algorithm, kid=self._jwks[0]["kid"])
+
+    @classmethod
+    def from_files(cls, algorithm: str, private_key_file: str, public_key_files: List[str]) -> "KeyPairTokenEngine":
+        with open(private_key_file, "rb") as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+        retired = []
+        for path in public_key_files:
+            with open(path, "rb") as f:
+                retired.append(serialization.load_pem_public_key(f.read()))
+        return cls(algorithm, private_key, retired)
+
+    def jwks(self) -> dict:
+        return {"keys": self._jwks}
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        if self.algorithm == "EdDSA":
+            return self._private_key.sign(signing_input)
+        r, s = decode_dss_signature(self._private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def _verify(self, signing_input: bytes, signature: bytes, kid: Optional[str]) -> bool:
+        public_key = self._public_keys.get(kid) if kid is not None else None
+        if public_key is None:
+            return False
+        try:
+            if self.algorithm == "EdDSA":
+                public_key.verify(signature, signing_input)
+            else:
+                if len(signature) != 64:
+                    return False
+                der = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+                public_key.verify(der, signing_input, ec.ECDSA(hashes.SHA256()))
+        except InvalidSignature:
+            return False
+        return True
+
+
+class VerifiedTokenCache:
+    """LRU of the claims of recently verified tokens, keyed by a digest of the token.
+
+    An entry is only served until the token's exp, so a hit is as good as a
+    fresh verification.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = metrics.counter("jwt_cache_hits")
+        self.misses = metrics.counter("jwt_cache_misses")
+        metrics.gauge("jwt_cache_size", lambda: len(self._entries))
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(key)
+        self.hits.inc()
+        # Callers get their own copy to modify
+        return dict(entry[1])
+
+    def set(self, token: str, claims: dict):
+        exp = claims.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (exp, dict(claims))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def create_token_engine() -> TokenEngine:
+    if settings.ALGORITHM in HMAC_DIGESTS:
+        if not settings.SECRET_KEY:
+            raise ValueError(f"ALGORITHM {settings.ALGORITHM} needs SECRET_KEY")
+        return HmacTokenEngine(settings.SECRET_KEY, settings.ALGORITHM)
+    if not settings.JWT_PRIVATE_KEY_FILE:
+        raise ValueError(f"ALGORITHM {settings.ALGORITHM} needs JWT_PRIVATE_KEY_FILE")
+    return KeyPairTokenEngine.from_files(settings.ALGORITHM, settings.JWT_PRIVATE_KEY_FILE, settings.JWT_PUBLIC_KEY_FILES)
+
+
+token_engine = create_token_engine()
+verified_tokens = VerifiedTokenCache(max_size=settings.JWT_CACHE_MAX_SIZE)
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from app import metrics
+from app.config.settings import settings
+
+
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    id: int
+    email: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    is_active: bool
+    is_verified: bool
+
+    @classmethod
+    def from_user(cls, user) -> "CachedUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            is_active=bool(user.is_active),
+            is_verified=bool(user.is_verified)
+        )
+
+
+class InvalidationBackend:
+    """Delivers user invalidations to every worker's cache, including the publisher's."""
+
+    def publish(self, user_id: int):
+        raise NotImplementedError
+
+    def subscribe(self, callback: Callable[[int], None]):
+        raise NotImplementedError
+
+
+class LocalInvalidationBackend(InvalidationBackend):
+    def __init__(self):
+        self._subscribers: List[Callable[[int], None]] = []
+
+    def publish(self, user_id: int):
+        for callback in self._subscribers:
+            callback(user_id)
+
+    def subscribe(self, callback: Callable[[int], None]):
+        self._subscribers.append(callback)
+
+
+class UserCache:
+    def __init__(self, max_size: int, ttl_seconds: float, backend: Optional[InvalidationBackend] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self._entries: "OrderedDict[int, Tuple[float, CachedUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = metrics.counter("user_cache_hits")
+        self.misses = metrics.counter("user_cache_misses")
+        metrics.gauge("user_cache_size", lambda: len(self._entries))
+
+        self.backend = backend or LocalInvalidationBackend()
+        self.backend.subscribe(self._evict)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get(self, user_id: int) -> Optional[CachedUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(user_id)
+        self.hits.inc()
+        return entry[1]
+
+    def set(self, user: CachedUser, generation: Optional[int] = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            # Skip entries loaded before an invalidation landed
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self.backend.publish(user_id)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def _evict(self, user_id: int):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(user_id, None)
+
+
+user_cache = UserCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS
+)
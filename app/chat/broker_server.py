@@ -0,0 +1,116 @@
+"""Minimal TCP pub/sub server for chat fanout between workers.
+
+Stands in for a real message broker in development and benchmarks:
+
+    python -m app.chat.broker_server --port 7010
+
+Line protocol, one command per line:
+
+    SUB <room>
+    UNSUB <room>
+    PUB <room> <published_at> <payload>
+
+PUB lines are forwarded as "MSG <room> <published_at> <payload>" to every other
+client subscribed to the room. Lines are processed a read buffer at a time, and
+each subscriber gets a single write per buffer.
+"""
+import argparse
+import asyncio
+from typing import Dict, List, Optional, Set
+
+READ_SIZE = 65536
+
+
+class BrokerServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 7010):
+        self.host = host
+        self.port = port
+        self.messages_routed = 0
+        self._rooms: Dict[int, Set[asyncio.StreamWriter]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Chat broker listening on {self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        rooms: Set[int] = set()
+        buffer = b""
+        try:
+            while True:
+                chunk = await reader.read(READ_SIZE)
+                if not chunk:
+                    break
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                outgoing: Dict[asyncio.StreamWriter, List[bytes]] = {}
+                for line in lines:
+                    try:
+                        self._dispatch(line, writer, rooms, outgoing)
+                    except ValueError:
+                        print(f"Chat broker ignoring malformed line: {line[:80]!r}")
+                for subscriber, frames in outgoing.items():
+                    subscriber.write(b"".join(frames))
+        except ConnectionError:
+            pass
+        finally:
+            for room_id in rooms:
+                self._unsubscribe(room_id, writer)
+            writer.close()
+
+    def _dispatch(self, line: bytes, writer, rooms: Set[int], outgoing):
+        command, _, rest = line.partition(b" ")
+        if command == b"PUB":
+            room, _, _ = rest.partition(b" ")
+            subscribers = self._rooms.get(int(room))
+            if not subscribers:
+                return
+            frame = b"MSG " + rest + b"\n"
+            for subscriber in subscribers:
+                if subscriber is not writer:
+                    outgoing.setdefault(subscriber, []).append(frame)
+                    self.messages_routed += 1
+        elif command == b"SUB":
+            room_id = int(rest)
+            rooms.add(room_id)
+            self._rooms.setdefault(room_id, set()).add(writer)
+        elif command == b"UNSUB":
+            room_id = int(rest)
+            rooms.discard(room_id)
+            self._unsubscribe(room_id, writer)
+
+    def _unsubscribe(self, room_id: int, writer):
+        subscribers = self._rooms.get(room_id)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self._rooms[room_id]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local chat pub/sub broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7010)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(BrokerServer(args.host, args.port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import time
+import types
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+
+from app import metrics
+from app.auth.user_cache import CachedUser
+from app.config.settings import settings
+
+# Typing frames are serialized compactly with "type" first, so they can be
+# told apart from messages without parsing
+TYPING_PREFIX = '{"type":"typing"'
+
+
+class SendBacklog:
+    """Totals over every connection's outbound queue, for metrics."""
+
+    def __init__(self):
+        self.queues = 0
+        self.frames = 0
+        self.bytes = 0
+
+        self.lag = metrics.latency("chat_send_queue_lag")
+        self.coalesced = metrics.counter("chat_send_coalesced")
+        self.dropped = metrics.counter("chat_send_dropped")
+        self.slow_consumers = metrics.counter("chat_slow_consumers_closed")
+        metrics.gauge("chat_send_queues", lambda: self.queues)
+        metrics.gauge("chat_send_queued_frames", lambda: self.frames)
+        metrics.gauge("chat_send_queued_bytes", lambda: self.bytes)
+
+
+send_backlog = SendBacklog()
+
+
+@types.coroutine
+def _finish(coroutine, waiting_on):
+    """Awaits the rest of a coroutine that was stepped once and is suspended on `waiting_on`."""
+    while True:
+        try:
+            value = yield waiting_on
+        except BaseException as e:
+            try:
+                waiting_on = coroutine.throw(e)
+            except StopIteration as stop:
+                return stop.value
+        else:
+            try:
+                waiting_on = coroutine.send(value)
+            except StopIteration as stop:
+                return stop.value
+
+
+class SendQueue:
+    """Frames waiting for the socket; exists only while a send is in flight."""
+    __slots__ = ("frames", "bytes", "typing", "presence", "task")
+
+    def __init__(self):
+        self.frames: Deque[Tuple[float, str]] = deque()
+        self.bytes = 0
+        # Coalesced frames: a repeated typing frame is sent once, and presence
+        # updates merge into one frame with the latest status per user
+        self.typing: Dict[str, None] = {}
+        self.presence: Dict[str, str] = {}
+        self.task: Optional[asyncio.Task] = None
+
+
+class Connection:
+    # Idle sockets dominate a chat worker, so keep per-connection state small
+    __slots__ = ("websocket", "user", "rooms", "member_of", "watching", "queue", "closed")
+
+    def __init__(self, websocket: WebSocket, user: CachedUser):
+        self.websocket = websocket
+        self.user = user
+        self.rooms: Set[int] = set()
+        # Conversations the user is known to take part in; allocated on first use
+        self.member_of: Optional[Set[int]] = None
+        # User ids whose presence this socket follows; allocated on first use
+        self.watching: Optional[Set[int]] = None
+        self.queue: Optional[SendQueue] = None
+        self.closed = False
+
+    async def send(self, payload: str):
+        """Sends a frame, waiting for the socket, or queues it behind frames that are still waiting."""
+        if self.queue is not None or self.closed:
+            if not self.enqueue(payload):
+                raise WebSocketDisconnect(status.WS_1013_TRY_AGAIN_LATER)
+            return
+        # Frames fanned out while this send is in flight queue up behind it
+        queue = self._open_queue()
+        sent = False
+        try:
+            await self.websocket.send_text(payload)
+            sent = True
+        except Exception:
+            # The receive loop cleans up after dead sockets
+            self.closed = True
+        finally:
+            if self.queue is queue:
+                if sent and (queue.frames or queue.presence or queue.typing):
+                    queue.task = asyncio.create_task(self._write(queue))
+                else:
+                    self._release(queue)
+        if not sent:
+            raise WebSocketDisconnect(status.WS_1013_TRY_AGAIN_LATER)
+
+    def enqueue(self, payload: str, coalesce: bool = False) -> bool:
+        """Sends a frame now if the socket keeps up, else queues it; False once the socket was dropped.
+
+        Coalesced (typing) frames are dropped rather than queued behind a backlog.
+        """
+        if self.closed:
+            return False
+        queue = self.queue
+        if queue is None:
+            return self._send_now(payload)
+        if coalesce:
+            if queue.bytes > settings.CHAT_SEND_QUEUE_DROP_BYTES:
+                send_backlog.dropped.inc()
+            elif payload in queue.typing:
+                send_backlog.coalesced.inc()
+            else:
+                queue.typing[payload] = None
+            return True
+
+        now = time.monotonic()
+        if queue.bytes + len(payload) > settings.CHAT_SEND_QUEUE_MAX_BYTES or (
+                queue.frames and now - queue.frames[0][0] > settings.CHAT_SEND_QUEUE_MAX_LAG_SECONDS):
+            self._drop_slow()
+            return False
+        queue.frames.append((now, payload))
+        queue.bytes += len(payload)
+        send_backlog.frames += 1
+        send_backlog.bytes += len(payload)
+        return True
+
+    def enqueue_presence(self, users: Dict[str, str]):
+        if self.closed:
+            return
+        queue = self.queue
+        if queue is None:
+            self._send_now(json.dumps({"type": "presence", "users": users}, separators=(",", ":")))
+        elif queue.bytes > settings.CHAT_SEND_QUEUE_DROP_BYTES:
+            send_backlog.dropped.inc()
+        else:
+            if queue.presence:
+                send_backlog.coalesced.inc()
+            queue.presence.update(users)
+
+    def _open_queue(self) -> SendQueue:
+        queue = self.queue = SendQueue()
+        send_backlog.queues += 1
+        return queue
+
+    def _send_now(self, payload: str) -> bool:
+        # Step the send once: a socket that keeps up completes it without
+        # suspending, which spares a task per recipient on fanout. One that
+        # suspends (its transport is full) finishes in the writer task, and
+        # frames queue behind it until it catches up.
+        send = self.websocket.send_text(payload)
+        try:
+            waiting_on = send.send(None)
+        except StopIteration:
+            return True
+        except Exception:
+            # The receive loop cleans up after dead sockets
+            self.closed = True
+            return False
+        queue = self._open_queue()
+        queue.task = asyncio.create_task(self._write(queue, _finish(send, waiting_on)))
+        return True
+
+    async def _write(self, queue: SendQueue, in_flight=None):
+        """Drains the queue, then releases it; one runs per connection while frames are waiting."""
+        try:
+            if in_flight is not None:
+                await in_flight
+            while True:
+                if queue.frames:
+                    queued_at, payload = queue.frames.popleft()
+                    queue.bytes -= len(payload)
+                    send_backlog.frames -= 1
+                    send_backlog.bytes -= len(payload)
+                    send_backlog.lag.observe(time.monotonic() - queued_at)
+                elif queue.presence:
+                    payload = json.dumps({"type": "presence", "users": queue.presence}, separators=(",", ":"))
+                    queue.presence = {}
+                elif queue.typing:
+                    payload = next(iter(queue.typing))
+                    del queue.typing[payload]
+                else:
+                    break
+                await self.websocket.send_text(payload)
+        except Exception:
+            self.closed = True
+        finally:
+            self._release(queue)
+
+    def _release(self, queue: SendQueue):
+        if self.queue is queue:
+            self.queue = None
+            send_backlog.queues -= 1
+            send_backlog.frames -= len(queue.frames)
+            send_backlog.bytes -= queue.bytes
+
+    def _drop_slow(self):
+        send_backlog.slow_consumers.inc()
+        self.discard()
+        asyncio.create_task(self._close())
+
+    async def _close(self):
+        try:
+            await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except Exception:
+            pass
+
+    def discard(self):
+        """Stops sending and drops anything still queued, once the socket is closed or given up on."""
+        self.closed = True
+        queue = self.queue
+        if queue is not None:
+            self._release(queue)
+            if queue.task is not None and queue.task is not asyncio.current_task():
+                queue.task.cancel()
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self._rooms: Dict[int, Set[Connection]] = {}
+        self._connections: Set[Connection] = set()
+        # Called as rooms gain their first / lose their last local connection,
+        # e.g. by the pub/sub broker to follow which rooms this worker serves
+        self._room_listeners: List[Tuple[Callable[[int], None], Callable[[int], None]]] = []
+
+        self.delivered = metrics.counter("chat_messages_delivered")
+        self.fanout = metrics.latency("chat_fanout")
+        metrics.gauge("chat_connections", lambda: len(self._connections))
+        metrics.gauge("chat_rooms", lambda: len(self._rooms))
+
+    def add_room_listener(self, opened: Callable[[int], None], closed: Callable[[int], None]):
+        self._room_listeners.append((opened, closed))
+
+    def add(self, connection: Connection):
+        self._connections.add(connection)
+
+    def remove(self, connection: Connection):
+        self._connections.discard(connection)
+        for room_id in connection.rooms:
+            self._leave(connection, room_id)
+        connection.rooms.clear()
+
+    def join(self, connection: Connection, room_id: int):
+        members = self._rooms.get(room_id)
+        if members is None:
+            members = self._rooms[room_id] = set()
+            for opened, _ in self._room_listeners:
+                opened(room_id)
+        members.add(connection)
+        connection.rooms.add(room_id)
+
+    def leave(self, connection: Connection, room_id: int):
+        connection.rooms.discard(room_id)
+        self._leave(connection, room_id)
+
+    def _leave(self, connection: Connection, room_id: int):
+        members = self._rooms.get(room_id)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self._rooms[room_id]
+                for _, closed in self._room_listeners:
+                    closed(room_id)
+
+    def rooms(self) -> List[int]:
+        return list(self._rooms)
+
+    def room_size(self, room_id: int) -> int:
+        return len(self._rooms.get(room_id, ()))
+
+    async def broadcast(self, room_id: int, payload: str) -> int:
+        """Queues an already serialized frame for every connection in the room."""
+        members = self._rooms.get(room_id)
+        if not members:
+            return 0
+
+        start = time.perf_counter()
+        coalesce = payload.startswith(TYPING_PREFIX)
+        delivered = 0
+        # Each socket drains its own queue, so a slow one holds up nobody else
+        for connection in tuple(members):
+            if connection.enqueue(payload, coalesce):
+                delivered += 1
+            else:
+                # Dropped as too slow; the receive loop finishes the cleanup
+                self.remove(connection)
+        self.fanout.observe(time.perf_counter() - start)
+        self.delivered.inc(delivered)
+        if send_backlog.queues:
+            # Let the writers run before the next frame piles onto their queues
+            await asyncio.sleep(0)
+        return delivered
+
+
+connection_registry = ConnectionRegistry()
@@ -0,0 +1,348 @@
+"""WebSocket chat gateway.
+
+Clients connect to /ws?token=<access token> (or send an Authorization header)
+and exchange JSON text frames:
+
+    {"type": "join", "room": 1}
+    {"type": "leave", "room": 1}
+    {"type": "message", "room": 1, "body": "hello", "client_id": "optional"}
+    {"type": "typing", "room": 1}
+
+Rooms are conversation ids, and only the conversation's participants may
+join or resume them; anyone else is told the conversation was not found. A
+message is acknowledged with {"type": "ack", "room": 1, "client_id": ...} once
+the message writer has accepted it for persistence, and fanned out to the room
+once it is committed:
+
+    {"type": "message", "room": 1, "id": 7, "seq": 3, "sender_id": 2,
+     "body": "hello", "created_at": "...", "client_id": "optional"}
+
+The id, seq, sender_id, body and created_at fields match a row of
+GET /conversations/{id}/messages, and seq orders messages within the room.
+
+On connect the server sends {"type": "welcome", "resume_token": "..."}. A
+client that reconnects passes it back as ?resume_token=... (which spares the
+server a users lookup while the access token is valid) and, instead of
+joining and reloading history, sends the last seq it saw in each room:
+
+    {"type": "resume", "rooms": {"1": 42, "2": 0}}
+
+The rooms are joined and the messages missed since are replayed, oldest
+first, in batches of
+
+    {"type": "replay", "room": 1, "reset": false, "messages": [<history rows>]}
+
+followed by {"type": "resumed", "rooms": [1, 2]}. Live messages for those rooms
+may interleave with the replay, so clients should merge by seq. When a client
+is more than CHAT_RESUME_MAX_MESSAGES behind, "reset" is true and only the
+latest messages are sent; older ones can be paged through history.
+
+Presence: a client sends {"type": "heartbeat", "away": false} every
+PRESENCE_HEARTBEAT_TIMEOUT_SECONDS or so (sending a message counts as one) and
+follows other users with
+
+    {"type": "presence_subscribe", "users": [2, 3]}
+    {"type": "presence_unsubscribe", "users": [3]}
+
+A subscription is answered with the current statuses, and changes follow as
+they are announced, batched per tick:
+
+    {"type": "presence", "users": {"2": "online", "3": "away"}}
+
+Typing frames are relayed to the room as {"type": "typing", "room": 1,
+"user_id": 2} and are not persisted.
+
+Each socket has its own bounded outbound queue. Behind a backlog, typing and
+presence frames are coalesced and then dropped, and a socket that falls more
+than CHAT_SEND_QUEUE_MAX_BYTES or CHAT_SEND_QUEUE_MAX_LAG_SECONDS behind is
+closed with code 1013; it can reconnect and resume.
+
+For many idle connections per worker, run uvicorn with
+--ws-per-message-deflate false; compression state costs far more per socket
+than anything held here.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+
+from app import metrics
+from app.auth.dependencies import access_token_claims, load_user
+from app.auth.user_cache import CachedUser
+from app.chat.connections import Connection, connection_registry
+from app.chat.presence import STATUS_NAMES, presence
+from app.chat.pubsub import chat_broker
+from app.chat.recent import CachedRow, recent_messages
+from app.chat.resume import create_resume_token, verify_resume_token
+from app.chat.writer import PendingMessage, message_writer
+from app.config.settings import settings
+from app.database import open_session
+from app.services.conversations import HISTORY_FIELDS, ConversationService, row_to_json
+
+router = APIRouter()
+
+resume_token_logins = metrics.counter("chat_resume_token_logins")
+replayed = metrics.counter("chat_messages_replayed")
+
+
+def encode(frame: dict) -> str:
+    return json.dumps(frame, separators=(",", ":"))
+
+
+def _bearer_token(websocket: WebSocket, token: Optional[str]) -> Optional[str]:
+    if token:
+        return token
+    authorization = websocket.headers.get("authorization", "")
+    scheme, _, credentials = authorization.partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    return None
+
+
+async def authenticate(
+        websocket: WebSocket,
+        token: Optional[str],
+        resume_token: Optional[str] = None
+) -> Optional[Tuple[CachedUser, dict]]:
+    """Returns the user and access token claims, or None if not authenticated."""
+    token = _bearer_token(websocket, token)
+    claims = access_token_claims(token) if token is not None else None
+    if claims is None:
+        return None
+    if resume_token:
+        user = verify_resume_token(resume_token, claims["user_id"])
+        if user is not None:
+            resume_token_logins.inc()
+            return user, claims
+    # The session only checks out a connection on a user cache miss, and is
+    # released before the socket is accepted
+    async with open_session() as db:
+        user = await load_user(claims["user_id"], db)
+    return (user, claims) if user is not None else None
+
+
+def remember_membership(connection: Connection, conversation_ids: Iterable[int]):
+    if connection.member_of is None:
+        connection.member_of = set()
+    connection.member_of.update(conversation_ids)
+
+
+async def is_participant(connection: Connection, conversation_id: int) -> bool:
+    """Whether the connection's user takes part in the conversation; positive answers are cached."""
+    if connection.member_of is not None and conversation_id in connection.member_of:
+        return True
+    async with open_session() as db:
+        if not await ConversationService(db).is_participant(conversation_id, connection.user.id):
+            return False
+    remember_membership(connection, (conversation_id,))
+    return True
+
+
+async def send_error(connection: Connection, detail: str):
+    await connection.send(encode({"type": "error", "detail": detail}))
+
+
+async def missed_messages(service: ConversationService, room_id: int, after: int) -> Tuple[List[CachedRow], bool]:
+    """Returns the messages after seq `after`, oldest first, and whether older ones were skipped."""
+    limit = settings.CHAT_RESUME_MAX_MESSAGES
+    rows = recent_messages.since(room_id, after)
+    if rows is None:
+        # The room is joined already, so anything committed after this read is fanned out live
+        prime = recent_messages.track(room_id)
+        fetched = await service.get_messages_after(room_id, after, limit + 1)
+        rows = [(row["seq"], row_to_json(row)) for row in fetched]
+        if prime and rows and len(rows) <= limit:
+            recent_messages.prime(room_id, rows[::-1])
+    if len(rows) <= limit:
+        return rows, False
+
+    latest = recent_messages.page(room_id, None, limit)
+    if latest is None:
+        fetched = await service.get_messages(room_id, None, limit, list(HISTORY_FIELDS))
+        latest = [(row["seq"], row_to_json(row)) for row in fetched]
+    return latest[::-1], True
+
+
+async def send_replay(connection: Connection, room_id: int, rows: List[CachedRow], reset: bool):
+    # Rows are already serialized, so frames are assembled rather than re-encoded
+    size = settings.CHAT_RESUME_FRAME_MESSAGES
+    for start in range(0, len(rows), size):
+        await connection.send('{"type":"replay","room":%d,"reset":%s,"messages":[%s]}' % (
+            room_id, "true" if reset else "false", ",".join(row for _, row in rows[start:start + size])
+        ))
+    replayed.inc(len(rows))
+
+
+async def handle_resume(connection: Connection, rooms):
+    last_seen: Dict[int, int] = {}
+    for room, seq in (rooms.items() if isinstance(rooms, dict) else ()):
+        if not str(room).isdigit() or not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+            await send_error(connection, "rooms must map room ids to the last seq seen")
+            return
+        last_seen[int(room)] = seq
+    if not last_seen:
+        await send_error(connection, "rooms must map room ids to the last seq seen")
+        return
+    if len(connection.rooms | last_seen.keys()) > settings.CHAT_MAX_ROOMS_PER_CONNECTION:
+        await send_error(connection, "Too many rooms")
+        return
+
+    # One session for the whole resume; it only checks out a connection if
+    # something is missing from memory
+    async with open_session() as db:
+        service = ConversationService(db)
+        # Non-participants get the same answer as for a missing conversation
+        member_of = connection.member_of or set()
+        unknown = [room_id for room_id in last_seen if room_id not in member_of]
+        participating = await service.participating(unknown, connection.user.id) if unknown else set()
+        remember_membership(connection, participating)
+        for room_id in unknown:
+            if room_id not in participating:
+                del last_seen[room_id]
+                await send_error(connection, f"Conversation {room_id} not found")
+
+        # Join before reading, so nothing falls between the replay and the live feed
+        for room_id in last_seen:
+            connection_registry.join(connection, room_id)
+        for room_id, after in last_seen.items():
+            rows, reset = await missed_messages(service, room_id, after)
+            await send_replay(connection, room_id, rows, reset)
+    await connection.send(encode({"type": "resumed", "rooms": list(last_seen)}))
+
+
+def _user_ids(value) -> Optional[List[int]]:
+    if not isinstance(value, list) or not all(isinstance(item, int) and not isinstance(item, bool) for item in value):
+        return None
+    return value
+
+
+async def handle_presence(connection: Connection, frame_type: str, users):
+    user_ids = _user_ids(users)
+    if user_ids is None:
+        await send_error(connection, "users must be a list of user ids")
+        return
+    if frame_type == "presence_unsubscribe":
+        presence.unwatch(connection, user_ids)
+        return
+    watching = connection.watching or set()
+    if len(watching | set(user_ids)) > settings.PRESENCE_MAX_WATCHED_PER_CONNECTION:
+        await send_error(connection, "Too many users watched")
+        return
+    presence.watch(connection, user_ids)
+    # Users not known to be online are offline; last_seen_at is served over HTTP
+    snapshot = {}
+    for user_id in user_ids:
+        status = presence.status(user_id)
+        snapshot[str(user_id)] = STATUS_NAMES[status] if status is not None else "offline"
+    await connection.send(encode({"type": "presence", "users": snapshot}))
+
+
+async def handle_frame(connection: Connection, raw: str):
+    if len(raw) > settings.CHAT_MAX_MESSAGE_LENGTH:
+        await send_error(connection, "Frame too large")
+        return
+    try:
+        frame = json.loads(raw)
+    except ValueError:
+        await send_error(connection, "Invalid JSON")
+        return
+
+    frame_type = frame.get("type") if isinstance(frame, dict) else None
+    if frame_type == "heartbeat":
+        presence.heartbeat(connection.user.id, frame.get("away") is True)
+        return
+    if frame_type == "resume":
+        await handle_resume(connection, frame.get("rooms"))
+        return
+    if frame_type in ("presence_subscribe", "presence_unsubscribe"):
+        await handle_presence(connection, frame_type, frame.get("users"))
+        return
+
+    room_id = frame.get("room") if isinstance(frame, dict) else None
+    if not isinstance(room_id, int) or isinstance(room_id, bool):
+        await send_error(connection, "A numeric room is required")
+        return
+
+    if frame_type == "join":
+        if room_id not in connection.rooms and len(connection.rooms) >= settings.CHAT_MAX_ROOMS_PER_CONNECTION:
+            await send_error(connection, "Too many rooms")
+            return
+        if room_id not in connection.rooms and not await is_participant(connection, room_id):
+            await send_error(connection, "Conversation not found")
+            return
+        connection_registry.join(connection, room_id)
+        await connection.send(encode({"type": "joined", "room": room_id}))
+    elif frame_type == "leave":
+        connection_registry.leave(connection, room_id)
+        await connection.send(encode({"type": "left", "room": room_id}))
+    elif frame_type == "message":
+        body = frame.get("body")
+        if not isinstance(body, str) or not body:
+            await send_error(connection, "Message body is required")
+            return
+        if room_id not in connection.rooms:
+            await send_error(connection, "Join the room first")
+            return
+        client_id = frame.get("client_id")
+        accepted = message_writer.enqueue({
+            "conversation_id": room_id,
+            "sender_id": connection.user.id,
+            "body": body,
+            "created_at": datetime.now(timezone.utc),
+        }, client_id)
+        if not accepted:
+            await send_error(connection, "Message not accepted, try again later")
+            return
+        presence.heartbeat(connection.user.id)
+        await connection.send(encode({"type": "ack", "room": room_id, "client_id": client_id}))
+    elif frame_type == "typing":
+        if room_id not in connection.rooms:
+            await send_error(connection, "Join the room first")
+            return
+        chat_broker.publish(room_id, encode({"type": "typing", "room": room_id, "user_id": connection.user.id}))
+    else:
+        await send_error(connection, "Unknown frame type")
+
+
+def publish_committed(messages: List[PendingMessage]):
+    """Fans out messages the writer has committed, now that they carry a seq."""
+    for message in messages:
+        row = message.row
+        # Serialized once here and shared by every recipient on every worker
+        payload = encode({
+            "type": "message",
+            "room": row["conversation_id"],
+            "id": row["id"],
+            "seq": row["seq"],
+            "sender_id": row["sender_id"],
+            "body": row["body"],
+            "created_at": row["created_at"].isoformat(),
+            "client_id": message.client_id,
+        })
+        chat_broker.publish(row["conversation_id"], payload)
+
+
+@router.websocket("/ws")
+async def chat_gateway(websocket: WebSocket, token: Optional[str] = None, resume_token: Optional[str] = None):
+    authenticated = await authenticate(websocket, token, resume_token)
+    if authenticated is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user, claims = authenticated
+
+    await websocket.accept()
+    connection = Connection(websocket, user)
+    connection_registry.add(connection)
+    presence.connected(user.id)
+    try:
+        await connection.send(encode({"type": "welcome", "resume_token": create_resume_token(user, claims["exp"])}))
+        while True:
+            await handle_frame(connection, await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection.discard()
+        presence.forget(connection)
+        presence.disconnected(user.id)
+        connection_registry.remove(connection)
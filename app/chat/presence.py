@@ -0,0 +1,379 @@
+"""Online / away / offline presence for chat users.
+
+Each worker tracks the users with sockets on it in a table of parallel arrays
+indexed by slot, so 100k online users cost a few megabytes and a heartbeat is
+a couple of array writes. Status changes are announced once per tick:
+
+- going online is announced at the next tick;
+- going away or offline must hold for PRESENCE_DEBOUNCE_SECONDS first, so a
+  flapping connection that comes straight back announces nothing.
+
+Announcements from every worker travel through the chat broker on a pinned
+room as one frame per tick, and each worker forwards them only to its sockets
+that watch the users concerned. A worker that sees a remote announcement
+contradicting its own sockets re-announces, so a user connected on two
+workers converges to the live status. last_seen_at is written to the users
+table in batched UPDATEs at most once per PRESENCE_LAST_SEEN_RESOLUTION_SECONDS
+per user, plus once on going offline.
+"""
+import asyncio
+import json
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics
+from app.chat.connections import Connection
+from app.chat.pubsub import Broker, BrokerObserver, chat_broker
+from app.config.settings import settings
+from app.database import open_session
+from app.models import User
+
+# Conversation ids start at 1, so broker room 0 is free for presence frames
+PRESENCE_ROOM = 0
+
+OFFLINE, ONLINE, AWAY = 0, 1, 2
+# Announced status of a slot that must be announced again whatever it is
+UNKNOWN = 255
+STATUS_NAMES = {OFFLINE: "offline", ONLINE: "online", AWAY: "away"}
+STATUS_CODES = {name: code for code, name in STATUS_NAMES.items()}
+
+FLUSH_CHUNK = 1000
+# Setting updated_at to itself keeps its onupdate from firing: being seen is not a profile change
+LAST_SEEN_UPDATE = (
+    update(User.__table__)
+    .where(User.__table__.c.id == bindparam("user_id"))
+    .values(last_seen_at=bindparam("last_seen_at"), updated_at=User.__table__.c.updated_at)
+)
+
+
+class PresenceService(BrokerObserver):
+    def __init__(
+            self,
+            broker: Broker,
+            tick_ms: int = settings.PRESENCE_TICK_MS,
+            debounce_seconds: float = settings.PRESENCE_DEBOUNCE_SECONDS,
+            heartbeat_timeout: float = settings.PRESENCE_HEARTBEAT_TIMEOUT_SECONDS,
+            sweep_seconds: float = settings.PRESENCE_SWEEP_SECONDS,
+            flush_seconds: float = settings.PRESENCE_FLUSH_INTERVAL_SECONDS,
+            last_seen_resolution: float = settings.PRESENCE_LAST_SEEN_RESOLUTION_SECONDS
+    ):
+        self.broker = broker
+        self.tick_interval = tick_ms / 1000
+        self.debounce_seconds = debounce_seconds
+        self.heartbeat_timeout = heartbeat_timeout
+        self.sweep_seconds = sweep_seconds
+        self.flush_seconds = flush_seconds
+        self.last_seen_resolution = last_seen_resolution
+
+        # Slot table: one entry per user with sockets here (or not yet flushed)
+        self._slots: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._user_ids = array("q")
+        self._connections = array("l")
+        self._last_seen = array("d")  # wall-clock time of the last sign of life
+        self._persisted = array("d")  # last_seen value last written to the database
+        self._pending_since = array("d")  # when a debounced change was first seen
+        self._announced = bytearray()
+        self._away = bytearray()
+        self._dirty: Set[int] = set()
+
+        # Online / away users announced by other workers
+        self._remote: Dict[int, int] = {}
+        self._watchers: Dict[int, Set[Connection]] = {}
+        self._live = True
+        self._sync_needed = False
+        self._next_sweep = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+        self.heartbeats = metrics.counter("presence_heartbeats")
+        self.announced = metrics.counter("presence_announced")
+        self.rows_written = metrics.counter("presence_last_seen_written")
+        self.tick_time = metrics.latency("presence_tick")
+        self.flush_time = metrics.latency("presence_flush")
+        metrics.gauge("presence_local_users", lambda: len(self._slots))
+        metrics.gauge("presence_remote_users", lambda: len(self._remote))
+
+    def start(self):
+        self.broker.pin(PRESENCE_ROOM)
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._tick_loop()), asyncio.create_task(self._flush_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Sockets are going away with the worker; tell the others without debouncing
+        now = time.time()
+        for slot in self._slots.values():
+            if self._connections[slot]:
+                self._connections[slot] = 0
+                self._last_seen[slot] = now
+                self._announced[slot] = UNKNOWN
+                self._dirty.add(slot)
+        self.tick()
+        await asyncio.sleep(0)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Presence flush on shutdown failed: {str(e)}")
+
+    # Local sockets
+
+    def _slot(self, user_id: int) -> int:
+        slot = self._slots.get(user_id)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+            self._user_ids[slot] = user_id
+            self._connections[slot] = 0
+            self._persisted[slot] = 0.0
+            self._pending_since[slot] = 0.0
+            self._announced[slot] = OFFLINE
+            self._away[slot] = 0
+        else:
+            slot = len(self._user_ids)
+            self._user_ids.append(user_id)
+            self._connections.append(0)
+            self._last_seen.append(0.0)
+            self._persisted.append(0.0)
+            self._pending_since.append(0.0)
+            self._announced.append(OFFLINE)
+            self._away.append(0)
+        self._slots[user_id] = slot
+        return slot
+
+    def connected(self, user_id: int):
+        slot = self._slot(user_id)
+        self._connections[slot] += 1
+        self._last_seen[slot] = time.time()
+        self._away[slot] = 0
+        self._dirty.add(slot)
+
+    def disconnected(self, user_id: int):
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return
+        self._connections[slot] = max(self._connections[slot] - 1, 0)
+        self._last_seen[slot] = time.time()
+        self._dirty.add(slot)
+
+    def heartbeat(self, user_id: int, away: bool = False):
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return
+        self.heartbeats.inc()
+        self._last_seen[slot] = time.time()
+        self._away[slot] = away
+        if self._announced[slot] != (AWAY if away else ONLINE):
+            self._dirty.add(slot)
+
+    def _status(self, slot: int, now: float) -> int:
+        if not self._connections[slot]:
+            return OFFLINE
+        if self._away[slot] or now - self._last_seen[slot] > self.heartbeat_timeout:
+            return AWAY
+        return ONLINE
+
+    # Announcements
+
+    def tick(self) -> Dict[int, int]:
+        """Announces the status changes that are due; returns them by user id."""
+        now = time.time()
+        if now >= self._next_sweep:
+            # Sockets that stopped heartbeating turn away without any event
+            self._next_sweep = now + self.sweep_seconds
+            limit = now - self.heartbeat_timeout
+            self._dirty.update(
+                slot for slot in self._slots.values()
+                if self._announced[slot] == ONLINE and self._last_seen[slot] < limit
+            )
+
+        changes: Dict[int, int] = {}
+        for slot in list(self._dirty):
+            status = self._status(slot, now)
+            announced = self._announced[slot]
+            if status == announced:
+                self._pending_since[slot] = 0.0
+                self._dirty.discard(slot)
+                continue
+            if status != ONLINE and announced != UNKNOWN:
+                if not self._pending_since[slot]:
+                    self._pending_since[slot] = now
+                if now - self._pending_since[slot] < self.debounce_seconds:
+                    continue
+            self._announced[slot] = status
+            self._pending_since[slot] = 0.0
+            self._dirty.discard(slot)
+            changes[self._user_ids[slot]] = status
+
+        if self._sync_needed:
+            self._sync_needed = False
+            self.broker.publish(PRESENCE_ROOM, json.dumps({"type": "presence_sync"}, separators=(",", ":")))
+        if changes:
+            self.announced.inc(len(changes))
+            self.broker.publish(PRESENCE_ROOM, json.dumps(
+                {"type": "presence", "users": {str(user_id): STATUS_NAMES[status] for user_id, status in changes.items()}},
+                separators=(",", ":")
+            ))
+        return changes
+
+    def set_live(self, live: bool):
+        # Statuses announced while we were cut off (or before we started) were
+        # missed; ask every worker to announce its users again
+        if live and not self._live:
+            self._sync_needed = True
+        elif not live:
+            self._remote.clear()
+        self._live = live
+
+    def observe(self, room_id: int, payload: str):
+        if room_id != PRESENCE_ROOM:
+            return
+        frame = json.loads(payload)
+        if frame.get("type") == "presence_sync":
+            for slot in self._slots.values():
+                if self._connections[slot]:
+                    self._announced[slot] = UNKNOWN
+                    self._dirty.add(slot)
+            return
+
+        updates: Dict[Connection, Dict[str, str]] = {}
+        for key, name in frame["users"].items():
+            user_id, status = int(key), STATUS_CODES[name]
+            slot = self._slots.get(user_id)
+            if slot is not None and self._connections[slot]:
+                # Our sockets decide; this is our own announcement or another
+                # worker's that has not heard of them
+                self._remote.pop(user_id, None)
+                if self._announced[slot] not in (status, UNKNOWN):
+                    self._announced[slot] = UNKNOWN
+                    self._dirty.add(slot)
+            elif status == OFFLINE:
+                self._remote.pop(user_id, None)
+            else:
+                self._remote[user_id] = status
+            for connection in self._watchers.get(user_id, ()):
+                updates.setdefault(connection, {})[key] = name
+        for connection, users in updates.items():
+            connection.enqueue_presence(users)
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            start = time.perf_counter()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Presence tick failed: {str(e)}")
+            self.tick_time.observe(time.perf_counter() - start)
+
+    # Watching
+
+    def watch(self, connection: Connection, user_ids: Iterable[int]):
+        if connection.watching is None:
+            connection.watching = set()
+        for user_id in user_ids:
+            connection.watching.add(user_id)
+            self._watchers.setdefault(user_id, set()).add(connection)
+
+    def unwatch(self, connection: Connection, user_ids: Iterable[int]):
+        if connection.watching is None:
+            return
+        for user_id in user_ids:
+            connection.watching.discard(user_id)
+            watchers = self._watchers.get(user_id)
+            if watchers is not None:
+                watchers.discard(connection)
+                if not watchers:
+                    del self._watchers[user_id]
+
+    def forget(self, connection: Connection):
+        if connection.watching:
+            self.unwatch(connection, list(connection.watching))
+        connection.watching = None
+
+    # Lookups
+
+    def status(self, user_id: int) -> Optional[int]:
+        """Returns the announced status of a user known to be online or away, else None."""
+        slot = self._slots.get(user_id)
+        if slot is not None and self._announced[slot] in (ONLINE, AWAY):
+            return self._announced[slot]
+        return self._remote.get(user_id)
+
+    async def lookup(self, user_ids: List[int], db: AsyncSession) -> Dict[int, dict]:
+        """Returns status and last_seen_at for each user, in one query for the offline ones."""
+        result: Dict[int, dict] = {}
+        offline = []
+        for user_id in user_ids:
+            status = self.status(user_id)
+            if status is None:
+                offline.append(user_id)
+            else:
+                result[user_id] = {"status": STATUS_NAMES[status], "last_seen_at": None}
+        if offline:
+            rows = await db.execute(select(User.id, User.last_seen_at).where(User.id.in_(offline)))
+            for user_id, last_seen_at in rows.all():
+                result[user_id] = {
+                    "status": "offline",
+                    "last_seen_at": last_seen_at.isoformat() if last_seen_at is not None else None,
+                }
+        return result
+
+    # Persistence
+
+    async def flush(self) -> int:
+        """Writes last_seen_at for users due an update; returns the number of rows."""
+        due: List[Tuple[int, float]] = []
+        for user_id, slot in self._slots.items():
+            last_seen = self._last_seen[slot]
+            if last_seen > self._persisted[slot] and (
+                    not self._connections[slot] or last_seen - self._persisted[slot] >= self.last_seen_resolution):
+                due.append((user_id, last_seen))
+        if not due:
+            self._release()
+            return 0
+
+        start = time.perf_counter()
+        async with open_session() as db:
+            for offset in range(0, len(due), FLUSH_CHUNK):
+                # One executemany per chunk; users deleted meanwhile simply match no row
+                await db.execute(LAST_SEEN_UPDATE, [
+                    {"user_id": user_id, "last_seen_at": datetime.fromtimestamp(last_seen, timezone.utc)}
+                    for user_id, last_seen in due[offset:offset + FLUSH_CHUNK]
+                ])
+            await db.commit()
+        for user_id, last_seen in due:
+            slot = self._slots.get(user_id)
+            if slot is not None:
+                self._persisted[slot] = max(self._persisted[slot], last_seen)
+        self.rows_written.inc(len(due))
+        self.flush_time.observe(time.perf_counter() - start)
+        self._release()
+        return len(due)
+
+    def _release(self):
+        # Free the slots of users who are gone, announced and written
+        for user_id, slot in list(self._slots.items()):
+            if (not self._connections[slot] and self._announced[slot] == OFFLINE
+                    and slot not in self._dirty and self._persisted[slot] >= self._last_seen[slot]):
+                del self._slots[user_id]
+                self._free.append(slot)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Presence flush failed: {str(e)}")
+
+
+presence = PresenceService(chat_broker)
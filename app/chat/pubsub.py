@@ -0,0 +1,236 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+
+from app import metrics
+from app.chat.connections import ConnectionRegistry
+from app.config.settings import settings
+
+# (room_id, published_at, payload); published_at is wall-clock so latency can
+# be measured across processes
+Envelope = Tuple[int, float, str]
+
+
+class BrokerObserver:
+    """Sees every frame delivered to this worker, in delivery order."""
+
+    def observe(self, room_id: int, payload: str):
+        raise NotImplementedError
+
+    def set_live(self, live: bool):
+        """Told whether every frame for this worker's rooms is being received."""
+        raise NotImplementedError
+
+
+class Broker:
+    """Carries serialized room frames between workers.
+
+    Publishes are collected and flushed once per event-loop tick. Delivery to
+    local sockets goes through a single drain task, so frames reach a room in
+    the order they were published.
+    """
+
+    def __init__(self):
+        self.registry: Optional[ConnectionRegistry] = None
+        self._pending: List[Envelope] = []
+        self._flush_scheduled = False
+        self._inbox: Deque[Envelope] = deque()
+        self._drain_task: Optional[asyncio.Task] = None
+        self._observers: List[BrokerObserver] = []
+        # Rooms subscribed to whether or not local sockets are in them
+        self._pinned: Set[int] = set()
+
+        self.published = metrics.counter("chat_broker_published")
+        self.publish_to_deliver = metrics.latency("chat_publish_to_deliver")
+        self.flush_time = metrics.latency("chat_broker_flush")
+
+    async def start(self, registry: ConnectionRegistry):
+        self.registry = registry
+        registry.add_room_listener(self.subscribe, self.unsubscribe)
+
+    async def stop(self):
+        if self._drain_task is not None:
+            await asyncio.gather(self._drain_task, return_exceptions=True)
+            self._drain_task = None
+
+    @property
+    def live(self) -> bool:
+        return True
+
+    def add_observer(self, observer: BrokerObserver):
+        """Registers an observer that sees each frame before it is delivered."""
+        self._observers.append(observer)
+        observer.set_live(self.live)
+
+    def _set_live(self, live: bool):
+        for observer in self._observers:
+            observer.set_live(live)
+
+    def publish(self, room_id: int, payload: str):
+        self._pending.append((room_id, time.time(), payload))
+        self.published.inc()
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def pin(self, room_id: int):
+        """Subscribes to a room for good, for frames meant for an observer rather than sockets."""
+        if room_id not in self._pinned:
+            self._pinned.add(room_id)
+            self.subscribe(room_id)
+
+    def subscribe(self, room_id: int):
+        pass
+
+    def unsubscribe(self, room_id: int):
+        pass
+
+    def _flush(self):
+        batch, self._pending = self._pending, []
+        self._flush_scheduled = False
+        start = time.perf_counter()
+        self._send(batch)
+        self.flush_time.observe(time.perf_counter() - start)
+
+    def _send(self, batch: List[Envelope]):
+        raise NotImplementedError
+
+    def _deliver(self, batch: List[Envelope]):
+        self._inbox.extend(batch)
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while self._inbox:
+            room_id, published_at, payload = self._inbox.popleft()
+            for observer in self._observers:
+                observer.observe(room_id, payload)
+            await self.registry.broadcast(room_id, payload)
+            self.publish_to_deliver.observe(time.time() - published_at)
+
+
+class LocalBroker(Broker):
+    """Single-process broker: publishes go straight to this worker's sockets."""
+
+    def _send(self, batch: List[Envelope]):
+        self._deliver(batch)
+
+
+class NetworkBroker(Broker):
+    """Relays publishes through a TCP broker (see app.chat.broker_server).
+
+    Frames are delivered to local sockets directly and to other workers via the
+    server, which does not echo them back. A worker subscribes to a room only
+    while it holds sockets in it. Publishes made while disconnected reach
+    local sockets only.
+    """
+
+    def __init__(self, host: str, port: int, reconnect_delay: float = 1.0):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.reconnect_delay = reconnect_delay
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+        self.dropped = metrics.counter("chat_broker_dropped")
+        metrics.gauge("chat_broker_connected", lambda: int(self._writer is not None))
+
+    async def start(self, registry: ConnectionRegistry):
+        await super().start(registry)
+        self._reader_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+        self._close()
+        await super().stop()
+
+    @property
+    def live(self) -> bool:
+        return self._writer is not None
+
+    async def wait_connected(self, timeout: float = 5.0):
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    def subscribe(self, room_id: int):
+        self._write(b"SUB %d\n" % room_id)
+
+    def unsubscribe(self, room_id: int):
+        self._write(b"UNSUB %d\n" % room_id)
+
+    def _send(self, batch: List[Envelope]):
+        if self._writer is not None:
+            self._writer.write(b"".join(
+                b"PUB %d %.6f %s\n" % (room_id, published_at, payload.encode())
+                for room_id, published_at, payload in batch
+            ))
+        else:
+            self.dropped.inc(len(batch))
+        self._deliver(batch)
+
+    def _write(self, data: bytes):
+        if self._writer is not None:
+            self._writer.write(data)
+
+    def _close(self):
+        self._connected.clear()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            # Frames published elsewhere are missed until we are back
+            self._set_live(False)
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                print(f"Chat broker connection to {self.host}:{self.port} failed: {str(e)}")
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            self._writer = writer
+            rooms = (self.registry.rooms() if self.registry is not None else []) + list(self._pinned)
+            writer.write(b"".join(b"SUB %d\n" % room_id for room_id in rooms))
+            self._connected.set()
+            self._set_live(True)
+            try:
+                await self._read(reader)
+            except ConnectionError:
+                pass
+            finally:
+                self._close()
+            print("Chat broker connection lost, reconnecting")
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _read(self, reader: asyncio.StreamReader):
+        buffer = b""
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            batch = []
+            for line in lines:
+                try:
+                    _, room, published_at, payload = line.split(b" ", 3)
+                    batch.append((int(room), float(published_at), payload.decode()))
+                except ValueError:
+                    print(f"Chat broker sent a malformed line, skipping it: {line[:200]!r}")
+            if batch:
+                self._deliver(batch)
+
+
+def create_broker() -> Broker:
+    if settings.CHAT_BROKER == "tcp":
+        return NetworkBroker(settings.CHAT_BROKER_HOST, settings.CHAT_BROKER_PORT)
+    return LocalBroker()
+
+
+chat_broker = create_broker()
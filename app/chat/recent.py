@@ -0,0 +1,187 @@
+import json
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app import metrics
+from app.chat.connections import ConnectionRegistry, connection_registry
+from app.chat.pubsub import BrokerObserver
+from app.config.settings import settings
+
+# Same keys, in the same order, as a full history row
+ROW_FIELDS = ("id", "seq", "sender_id", "body", "created_at")
+# Rough cost of a cached row beyond its serialized length: deque slot, tuple, str header
+ROW_OVERHEAD = 120
+
+# (seq, history row serialized as JSON)
+CachedRow = Tuple[int, str]
+
+
+class RoomBuffer:
+    """The latest rows of one room, oldest first, with no gaps in seq."""
+    __slots__ = ("rows", "last_seq", "primed", "early", "size")
+
+    def __init__(self, capacity: int):
+        self.rows: Deque[CachedRow] = deque(maxlen=capacity)
+        self.last_seq = 0
+        self.primed = False
+        # Frames that arrived ahead of a missing seq (or before priming)
+        self.early: Dict[int, str] = {}
+        self.size = 0
+
+    @property
+    def first_seq(self) -> int:
+        return self.rows[0][0] if self.rows else self.last_seq + 1
+
+    def _append(self, seq: int, row: str):
+        if len(self.rows) == self.rows.maxlen:
+            self.size -= len(self.rows[0][1]) + ROW_OVERHEAD
+        self.rows.append((seq, row))
+        self.last_seq = seq
+        self.size += len(row) + ROW_OVERHEAD
+
+    def _drain_early(self):
+        for seq in [seq for seq in self.early if seq <= self.last_seq]:
+            del self.early[seq]
+        while self.last_seq + 1 in self.early:
+            self._append(self.last_seq + 1, self.early.pop(self.last_seq + 1))
+
+    def add(self, seq: int, row: str) -> bool:
+        """Returns False once the buffer can no longer be made contiguous."""
+        if self.primed and seq == self.last_seq + 1:
+            self._append(seq, row)
+            if self.early:
+                self._drain_early()
+        elif not self.primed or seq > self.last_seq:
+            self.early[seq] = row
+        return len(self.early) <= self.rows.maxlen
+
+    def prime(self, rows: List[CachedRow]):
+        """Seeds the buffer with the newest rows from the database, newest first."""
+        for seq, row in reversed(rows):
+            self._append(seq, row)
+        self.primed = True
+        self._drain_early()
+
+
+class RecentMessages(BrokerObserver):
+    """Per-worker ring buffers of the most recent messages of hot rooms.
+
+    Buffers are kept only for rooms with sockets on this worker, since only
+    those receive every frame from the broker. A buffer is seeded by the first
+    history request that misses it and then follows the fanout path, so the
+    first page of a busy room (and reconnect catch-up) is answered from memory.
+    Rows are held in their serialized history form and served as is. Whole
+    rooms are evicted, least recently used first, to stay within max_bytes.
+    """
+
+    def __init__(
+            self,
+            registry: ConnectionRegistry,
+            room_capacity: int = settings.CHAT_RECENT_MESSAGES_PER_ROOM,
+            max_bytes: int = settings.CHAT_RECENT_MAX_BYTES
+    ):
+        self.registry = registry
+        self.room_capacity = room_capacity
+        self.max_bytes = max_bytes
+        self.live = True
+        self.size = 0
+        self._rooms: "OrderedDict[int, RoomBuffer]" = OrderedDict()
+        registry.add_room_listener(lambda room_id: None, self.discard)
+
+        self.hits = metrics.counter("chat_recent_hits")
+        self.misses = metrics.counter("chat_recent_misses")
+        self.evictions = metrics.counter("chat_recent_evictions")
+        metrics.gauge("chat_recent_bytes", lambda: self.size)
+        metrics.gauge("chat_recent_rooms", lambda: len(self._rooms))
+
+    def set_live(self, live: bool):
+        self.live = live
+        if not live:
+            self.clear()
+
+    def clear(self):
+        self._rooms.clear()
+        self.size = 0
+
+    def discard(self, room_id: int):
+        buffer = self._rooms.pop(room_id, None)
+        if buffer is not None:
+            self.size -= buffer.size
+
+    def observe(self, room_id: int, payload: str):
+        buffer = self._rooms.get(room_id)
+        if buffer is None:
+            return
+        frame = json.loads(payload)
+        if frame.get("type") != "message":
+            return
+        before = buffer.size
+        if not buffer.add(frame["seq"], json.dumps({name: frame[name] for name in ROW_FIELDS})):
+            # Too far out of order to recover; the next miss reseeds it
+            self.discard(room_id)
+            return
+        self._resized(room_id, buffer, before)
+
+    def track(self, room_id: int) -> bool:
+        """Starts buffering a room ahead of seeding it; False if it cannot be cached."""
+        if not self.live or not self.registry.room_size(room_id):
+            return False
+        if room_id not in self._rooms:
+            self._rooms[room_id] = RoomBuffer(self.room_capacity)
+        return True
+
+    def prime(self, room_id: int, rows: List[CachedRow]):
+        """Seeds a tracked room with its newest rows, as read after track()."""
+        buffer = self._rooms.get(room_id)
+        if buffer is None or buffer.primed:
+            return
+        before = buffer.size
+        buffer.prime(rows)
+        self._resized(room_id, buffer, before)
+
+    def page(self, room_id: int, before: Optional[int], limit: int) -> Optional[List[CachedRow]]:
+        """Returns a history page, newest first, or None if it is not all cached."""
+        buffer = self._rooms.get(room_id)
+        if buffer is None or not buffer.primed:
+            self.misses.inc()
+            return None
+        upper = buffer.last_seq if before is None else min(before - 1, buffer.last_seq)
+        lower = max(upper - limit + 1, 1)
+        first_seq = buffer.first_seq
+        if lower < first_seq:
+            self.misses.inc()
+            return None
+        self.hits.inc()
+        self._rooms.move_to_end(room_id)
+        rows = list(islice(buffer.rows, lower - first_seq, max(upper - first_seq + 1, 0)))
+        rows.reverse()
+        return rows
+
+    def since(self, room_id: int, after_seq: int) -> Optional[List[CachedRow]]:
+        """Returns every row after after_seq, oldest first, or None if some are not cached.
+
+        Rows still waiting on a missing seq are included too: they have already
+        been fanned out, so a socket that joined since would otherwise miss them.
+        """
+        buffer = self._rooms.get(room_id)
+        if buffer is None or not buffer.primed or after_seq + 1 < buffer.first_seq:
+            self.misses.inc()
+            return None
+        self.hits.inc()
+        self._rooms.move_to_end(room_id)
+        rows = list(islice(buffer.rows, max(after_seq + 1 - buffer.first_seq, 0), None))
+        if buffer.early:
+            rows += sorted((seq, row) for seq, row in buffer.early.items() if seq > after_seq)
+        return rows
+
+    def _resized(self, room_id: int, buffer: RoomBuffer, before: int):
+        self.size += buffer.size - before
+        self._rooms.move_to_end(room_id)
+        while self.size > self.max_bytes and len(self._rooms) > 1:
+            _, evicted = self._rooms.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions.inc()
+
+
+recent_messages = RecentMessages(connection_registry)
@@ -0,0 +1,60 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import astuple
+from typing import Optional
+
+from app.auth.user_cache import CachedUser
+from app.config.settings import settings
+
+def _resume_key() -> bytes:
+    # Kept apart from the JWT signing key so one token type can never pass for the other.
+    # Every worker must derive the same key, so it comes from shared configuration.
+    if settings.RESUME_SECRET or settings.SECRET_KEY:
+        secret = (settings.RESUME_SECRET or settings.SECRET_KEY).encode()
+    elif settings.JWT_PRIVATE_KEY_FILE:
+        with open(settings.JWT_PRIVATE_KEY_FILE, "rb") as f:
+            secret = f.read()
+    else:
+        raise ValueError("Chat resume tokens need RESUME_SECRET, SECRET_KEY or JWT_PRIVATE_KEY_FILE")
+    return hashlib.sha256(b"chat-resume:" + secret).digest()
+
+
+_KEY = _resume_key()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def create_resume_token(user: CachedUser, expires_at: int) -> str:
+    """Signs a snapshot of the user that lets a reconnect skip the users table.
+
+    expires_at should be the exp of the access token the user authenticated
+    with, so the snapshot is trusted no longer than that token was.
+    """
+    body = _b64encode(json.dumps([expires_at, *astuple(user)], separators=(",", ":")).encode())
+    signature = hmac.new(_KEY, body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_b64encode(signature)}"
+
+
+def verify_resume_token(token: str, user_id: int) -> Optional[CachedUser]:
+    """Returns the user snapshot if the token is authentic, unexpired and for user_id."""
+    body, _, signature = token.partition(".")
+    try:
+        expected = hmac.new(_KEY, body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        expires_at, *fields = json.loads(_b64decode(body))
+        user = CachedUser(*fields)
+    except (ValueError, TypeError):
+        return None
+    if expires_at < time.time() or user.id != user_id:
+        return None
+    return user
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app import metrics
+from app.config.settings import settings
+from app.database import open_session
+from app.models import Conversation, Message
+
+
+class PendingMessage:
+    __slots__ = ("row", "client_id", "enqueued_at")
+
+    def __init__(self, row: dict, client_id: Any = None):
+        self.row = row
+        self.client_id = client_id
+        self.enqueued_at = time.monotonic()
+
+
+class MessageWriter:
+    """Write-behind buffer that persists chat messages in multi-row INSERTs.
+
+    Messages are accepted into a bounded in-memory buffer and written every
+    flush_interval_ms or batch_size messages, with one commit per batch. A
+    message is acknowledged once it is in the buffer, so a crash loses at most
+    what was buffered (see the chat_write_lag and chat_write_buffer_age
+    metrics). While the database is unavailable the buffer fills and new
+    messages are refused rather than dropped silently.
+
+    Sequence numbers are allocated per conversation in the same transaction as
+    the insert, and committed messages are handed to on_committed with their
+    id and seq set.
+    """
+
+    def __init__(
+            self,
+            batch_size: int = settings.CHAT_WRITE_BATCH_SIZE,
+            flush_interval_ms: int = settings.CHAT_WRITE_FLUSH_INTERVAL_MS,
+            max_buffer: int = settings.CHAT_WRITE_MAX_BUFFER,
+            retry_delay: float = settings.CHAT_WRITE_RETRY_DELAY
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_buffer = max_buffer
+        self.retry_delay = retry_delay
+        self._buffer: List[PendingMessage] = []
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self.on_committed: Callable[[List[PendingMessage]], None] = lambda messages: None
+
+        self.written = metrics.counter("chat_messages_written")
+        self.rejected = metrics.counter("chat_messages_rejected")
+        self.discarded = metrics.counter("chat_messages_discarded")
+        self.flush_time = metrics.latency("chat_write_flush")
+        self.lag = metrics.latency("chat_write_lag")
+        metrics.gauge("chat_write_buffer_depth", lambda: len(self._buffer))
+        metrics.gauge("chat_write_buffer_age", self.oldest_age)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, on_committed: Optional[Callable[[List[PendingMessage]], None]] = None):
+        if on_committed is not None:
+            self.on_committed = on_committed
+        if not self.running:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # Let the loop finish its current flush instead of cancelling it mid-write
+            self._stopping = True
+            self._batch_ready.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._buffer:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Message writer stopped with {len(self._buffer)} unwritten messages: {str(e)}")
+
+    def oldest_age(self) -> float:
+        return time.monotonic() - self._buffer[0].enqueued_at if self._buffer else 0.0
+
+    def enqueue(self, row: dict, client_id: Any = None) -> bool:
+        if len(self._buffer) >= self.max_buffer:
+            self.rejected.inc()
+            return False
+        self._buffer.append(PendingMessage(row, client_id))
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            timer = loop.call_later(self.flush_interval, self._batch_ready.set)
+            await self._batch_ready.wait()
+            timer.cancel()
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Message writer flush failed, retrying: {str(e)}")
+                await asyncio.sleep(self.retry_delay)
+
+    async def flush(self):
+        while self._buffer:
+            batch = self._buffer[:self.batch_size]
+            start = time.perf_counter()
+            try:
+                committed = await self._write(batch)
+            except IntegrityError:
+                # One bad row (e.g. a deleted sender) must not sink the batch
+                await self._write_each(batch)
+            else:
+                self._finish(batch, committed)
+            self.flush_time.observe(time.perf_counter() - start)
+
+    async def _write_each(self, batch: List[PendingMessage]):
+        committed = []
+        written = 0
+        try:
+            for message in batch:
+                try:
+                    committed += await self._write([message])
+                except IntegrityError as e:
+                    self.discarded.inc()
+                    print(f"Discarding message for conversation {message.row['conversation_id']}: {str(e.orig)}")
+                written += 1
+        finally:
+            # Committed messages leave the buffer even if a later one fails,
+            # so the retry does not write them twice
+            self._finish(batch[:written], committed)
+
+    def _finish(self, written: List[PendingMessage], committed: List[PendingMessage]):
+        """Drops messages from the front of the buffer once committed or discarded, and hands on the committed ones."""
+        del self._buffer[:len(written)]
+        now = time.monotonic()
+        for message in written:
+            self.lag.observe(now - message.enqueued_at)
+        if committed:
+            try:
+                self.on_committed(committed)
+            except Exception as e:
+                print(f"Message writer on_committed failed: {str(e)}")
+
+    async def _write(self, batch: List[PendingMessage]) -> List[PendingMessage]:
+        counts = Counter(message.row["conversation_id"] for message in batch)
+        async with open_session() as db:
+            # Reserve a block of seqs per conversation in one statement; the row
+            # locks serialize allocation across workers until commit
+            result = await db.execute(
+                update(Conversation)
+                .where(Conversation.id.in_(sorted(counts)))
+                .values(last_seq=Conversation.last_seq + case(counts, value=Conversation.id))
+                .returning(Conversation.id, Conversation.last_seq)
+                .execution_options(synchronize_session=False)
+            )
+            next_seq = {conversation_id: last_seq - counts[conversation_id] + 1 for conversation_id, last_seq in result.all()}
+
+            committed = []
+            for message in batch:
+                conversation_id = message.row["conversation_id"]
+                if conversation_id not in next_seq:
+                    self.discarded.inc()
+                    continue
+                message.row["seq"] = next_seq[conversation_id]
+                next_seq[conversation_id] += 1
+                committed.append(message)
+
+            if committed:
+                result = await db.execute(
+                    insert(Message)
+                    .values([message.row for message in committed])
+                    .returning(Message.id, Message.conversation_id, Message.seq)
+                )
+                ids = {(conversation_id, seq): id for id, conversation_id, seq in result.all()}
+                for message in committed:
+                    message.row["id"] = ids[message.row["conversation_id"], message.row["seq"]]
+            await db.commit()
+        self.written.inc(len(committed))
+        return committed
+
+
+message_writer = MessageWriter()
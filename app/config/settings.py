@@ -10,15 +10,129 @@ load_dotenv()
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    DB_ASYNC: bool = False  # use an AsyncEngine on asyncpg instead of psycopg2 on the threadpool
+    DB_ECHO: bool = False  # per-request query stats come from app.instrumentation instead
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: Optional[int] = None
 
     # JWT
-    SECRET_KEY: str = os.getenv("SECRET_KEY")
-    ALGORITHM: str = "HS256"
+    SECRET_KEY: Optional[str] = os.getenv("SECRET_KEY")  # required for HS256/HS384/HS512
+    ALGORITHM: str = "HS256"  # HS256/HS384/HS512 with SECRET_KEY, or EdDSA/ES256 with a key pair
+    JWT_PRIVATE_KEY_FILE: Optional[str] = None  # PEM; required for EdDSA and ES256
+    JWT_PUBLIC_KEY_FILES: list = []  # PEM public keys of retired key pairs, still accepted and published
+    JWT_CACHE_MAX_SIZE: int = 10000  # verified access tokens kept in memory; 0 disables
+    RESUME_SECRET: Optional[str] = None  # signs chat resume tokens; derived from SECRET_KEY or the JWT private key if unset
     ACCESS_TOKEN_EXPIRE_MINUTES: int = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
     REFRESH_TOKEN_EXPIRE_DAYS: int = os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")
 
     # Security
-    BCRYPT_ROUNDS: int = os.getenv("BCRYPT_ROUNDS")
+    BCRYPT_ROUNDS: Optional[int] = os.getenv("BCRYPT_ROUNDS")  # unused: bcrypt hashes are only verified, then rehashed with Argon2
+
+    # Request instrumentation
+    REQUEST_LOG_ENABLED: bool = False  # one JSON line per request with its DB stats, on the "app.requests" logger
+    METRICS_ENABLED: bool = True  # Prometheus text format at /metrics
+
+    # Authenticated user cache (0 disables)
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+
+    # Mail
+    SMTP_SERVER: Optional[str] = os.getenv("SMTP_SERVER")
+    SMTP_PORT: int = 587
+    SMTP_USERNAME: Optional[str] = os.getenv("SMTP_USERNAME")
+    SMTP_PASSWORD: Optional[str] = os.getenv("SMTP_PASSWORD")
+    SMTP_STARTTLS: bool = True
+    SMTP_TIMEOUT: int = 10
+    FROM_EMAIL: Optional[str] = os.getenv("FROM_EMAIL")
+    FRONTEND_URL: Optional[str] = os.getenv("FRONTEND_URL")
+
+    # Outbound mail queue
+    MAIL_QUEUE_ENABLED: bool = True
+    MAIL_QUEUE_MAX_SIZE: int = 10000
+    MAIL_WORKERS: int = 2  # one pooled SMTP connection per worker
+    MAIL_BATCH_SIZE: int = 50
+    MAIL_MAX_RETRIES: int = 5
+    MAIL_RETRY_BASE_DELAY: float = 1.0
+    MAIL_CONNECT_MAX_BACKOFF: float = 60.0  # cap on a worker's wait after failed SMTP connections
+    MAIL_CONNECTION_IDLE_TIMEOUT: int = 30
+    MAIL_SHUTDOWN_TIMEOUT: int = 10
+    MAIL_DEAD_LETTER_PATH: Optional[str] = None
+
+    # Mail templates
+    MAIL_TEMPLATE_BYTECODE_CACHE_DIR: Optional[str] = None
+    MAIL_TEMPLATE_AUTO_RELOAD: bool = False  # re-check template files on every render
+
+    # Token garbage collection
+    TOKEN_GC_ENABLED: bool = False  # run in-app; otherwise use `python -m app.maintenance.token_gc`
+    TOKEN_GC_INTERVAL_SECONDS: int = 3600
+    TOKEN_GC_BATCH_SIZE: int = 1000
+    TOKEN_GC_BATCH_PAUSE_MS: int = 50
+    TOKEN_GC_MAX_RUNTIME_SECONDS: Optional[float] = None
+
+    # Access-token revocation list, held in memory by every worker
+    REVOCATION_BLOOM_CAPACITY: int = 100000  # revoked jtis before the filter is resized at the next reload
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    REVOCATION_LOAD_MAX_SECONDS: float = 5  # startup waits this long for the rebuild, which then finishes in the background
+    REVOCATION_LOAD_BATCH_SIZE: int = 10000
+    REVOCATION_RELOAD_SECONDS: float = 300
+
+    # Chat gateway
+    CHAT_MAX_MESSAGE_LENGTH: int = 4000
+    CHAT_MAX_ROOMS_PER_CONNECTION: int = 100
+    # Outbound queue per socket: typing/presence frames are dropped past DROP_BYTES,
+    # and a socket is closed as too slow past MAX_BYTES or MAX_LAG_SECONDS of backlog
+    CHAT_SEND_QUEUE_DROP_BYTES: int = 64 * 1024
+    CHAT_SEND_QUEUE_MAX_BYTES: int = 1024 * 1024
+    CHAT_SEND_QUEUE_MAX_LAG_SECONDS: float = 15
+    CHAT_BROKER: str = "local"  # "local" for a single worker, "tcp" to fan out through app.chat.broker_server
+    CHAT_BROKER_HOST: str = "127.0.0.1"
+    CHAT_BROKER_PORT: int = 7010
+
+    # Chat message write-behind; a crash loses at most the unflushed buffer
+    CHAT_WRITE_BATCH_SIZE: int = 500
+    CHAT_WRITE_FLUSH_INTERVAL_MS: int = 50
+    CHAT_WRITE_MAX_BUFFER: int = 50000  # new messages are refused beyond this
+    CHAT_WRITE_RETRY_DELAY: float = 1.0
+
+    # User directory pages
+    USERS_PAGE_DEFAULT_LIMIT: int = 50
+    USERS_PAGE_MAX_LIMIT: int = 500
+
+    # User search (@-mention autocomplete)
+    USER_SEARCH_DEFAULT_LIMIT: int = 10
+    USER_SEARCH_MAX_LIMIT: int = 50
+    USER_SEARCH_CACHE_SIZE: int = 10000  # cached prefixes; 0 disables
+    USER_SEARCH_CACHE_TTL_SECONDS: float = 30
+    USER_SEARCH_INDEX_ENABLED: bool = False  # in-memory prefix index; costs roughly 200 bytes per user
+    USER_SEARCH_INDEX_BATCH_SIZE: int = 10000
+    USER_SEARCH_INDEX_REFRESH_SECONDS: float = 30
+
+    # Chat history pages
+    CHAT_HISTORY_DEFAULT_LIMIT: int = 50
+    CHAT_HISTORY_MAX_LIMIT: int = 1000
+    CHAT_HISTORY_MAX_STREAM_LIMIT: int = 10000  # NDJSON responses
+
+    # Recent messages of hot rooms kept in memory by each worker
+    CHAT_RECENT_MESSAGES_PER_ROOM: int = 100
+    CHAT_RECENT_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Reconnect resume; a client further behind than this gets the latest messages and pages back
+    CHAT_RESUME_MAX_MESSAGES: int = 500
+    CHAT_RESUME_FRAME_MESSAGES: int = 100
+
+    # Presence; away after no heartbeat for the timeout, changes to away/offline held back by the debounce
+    PRESENCE_HEARTBEAT_TIMEOUT_SECONDS: float = 60
+    PRESENCE_DEBOUNCE_SECONDS: float = 5
+    PRESENCE_TICK_MS: int = 1000
+    PRESENCE_SWEEP_SECONDS: float = 10
+    PRESENCE_FLUSH_INTERVAL_SECONDS: float = 30
+    PRESENCE_LAST_SEEN_RESOLUTION_SECONDS: float = 60  # last_seen_at is written at most this often per user
+    PRESENCE_BULK_MAX_IDS: int = 1000
+    PRESENCE_MAX_WATCHED_PER_CONNECTION: int = 1000
 
     # CORS
     ALLOWED_ORIGINS: list = ["http://localhost:8000", "http://127.0.0.1:8000"]
@@ -29,6 +143,15 @@ class Settings(BaseSettings):
     ARGON2_PARALLELISM: int = 4
     ARGON2_HASH_LENGTH: int = 32
     ARGON2_SALT_LENGTH: int = 16
+    # Calibration (python -m app.auth.calibration); the file's costs replace the three above
+    ARGON2_CALIBRATION_FILE: Optional[str] = None  # calibrated at startup and written here if missing
+    ARGON2_TARGET_MS: float = 250  # per hash, with every hashing worker busy
+    ARGON2_MEMORY_BUDGET_MB: int = 1024  # shared by the hashes one process runs at once
+
+    # Password hashing process pool
+    PASSWORD_HASH_WORKERS: Optional[int] = None  # defaults to the CPU count
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_RETRY_AFTER: int = 1
 
     # class Config:
     #     env_file = ".env"
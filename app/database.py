@@ -1,19 +1,152 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
 
+from app.config.settings import settings
+from app.instrumentation import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_engine
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set in .env")
 
+IS_SQLITE = "sqlite" in DATABASE_URL
+
+
+def _engine_options(is_async: bool) -> dict:
+    options = {
+        "echo": settings.DB_ECHO,  # prints SQL statements
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if not IS_SQLITE:
+        options["poolclass"] = TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+        options["pool_timeout"] = settings.DB_POOL_TIMEOUT
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE
+    return options
+
+
+def _connect_args(is_async: bool) -> dict:
+    if IS_SQLITE:
+        return {"check_same_thread": False}  # needed for SQLite
+
+    if not settings.DB_STATEMENT_TIMEOUT_MS:
+        return {}
+    if is_async:
+        return {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+    return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+
+def async_database_url(url: str) -> str:
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
 engine = create_engine(
     DATABASE_URL,
-    echo=True,  # prints SQL statements
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},  # needed for SQLite
+    connect_args=_connect_args(is_async=False),
+    **_engine_options(is_async=False)
 )
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+async_engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+if settings.DB_ASYNC:
+    async_engine = create_async_engine(
+        async_database_url(DATABASE_URL),
+        connect_args=_connect_args(is_async=True),
+        **_engine_options(is_async=True)
+    )
+    instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class ThreadedSession:
+    """AsyncSession-compatible wrapper running a sync Session on the threadpool.
+
+    Used when DB_ASYNC is off so services can be written once against the
+    AsyncSession API.
+    """
+
+    def __init__(self, sync_session: Session):
+        self.sync_session = sync_session
+
+    @property
+    def bind(self):
+        return self.sync_session.bind
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        # Sessions that never checked out a connection close without I/O
+        if self.sync_session.in_transaction():
+            await run_in_threadpool(self.sync_session.close)
+        else:
+            self.sync_session.close()
+
+
+@asynccontextmanager
+async def open_session() -> AsyncIterator[AsyncSession]:
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    db = ThreadedSession(SessionLocal(expire_on_commit=False))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def dispose_engines():
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
@@ -1,10 +1,7 @@
-from app.database import SessionLocal
-from sqlalchemy.orm import Session
-from fastapi import Depends
+from typing import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import open_session
 
-def get_db() -> Session:
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with open_session() as db:
         yield db
-    finally:
-        db.close()
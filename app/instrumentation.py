@@ -0,0 +1,171 @@
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app import metrics
+from app.config.settings import settings
+
+SLOWEST_STATEMENT_MAX_LENGTH = 200
+
+
+class RequestMetrics:
+    __slots__ = ("query_count", "db_time", "pool_wait", "slowest_statement", "slowest_time")
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.slowest_time = 0.0
+
+    def record_query(self, statement: str, seconds: float):
+        self.query_count += 1
+        self.db_time += seconds
+        if seconds > self.slowest_time:
+            self.slowest_time = seconds
+            self.slowest_statement = statement
+
+
+# Shared by reference with the threadpool and greenlets a request's queries
+# run on, so they can all add to the same RequestMetrics
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+_db_query = metrics.latency("db_query")
+_db_pool_checkout = metrics.latency("db_pool_checkout")
+
+
+class _TimedCheckout:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            _db_pool_checkout.observe(elapsed)
+            request = current_request.get()
+            if request is not None:
+                request.pool_wait += elapsed
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+# Kept on the statement's execution context, which is dropped with it when the
+# statement fails and after_cursor_execute never runs
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    _db_query.observe(elapsed)
+    request = current_request.get()
+    if request is not None:
+        request.record_query(statement[:SLOWEST_STATEMENT_MAX_LENGTH], elapsed)
+
+
+def instrument_engine(sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RequestLog:
+    """The "app.requests" logger, with a queued stderr handler unless logging is configured elsewhere.
+
+    Records are formatted and written on a listener thread, off the event loop.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("app.requests")
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._handler: Optional[logging.Handler] = None
+
+    def start(self):
+        if self.logger.level == logging.NOTSET:
+            self.logger.setLevel(logging.INFO)
+        if self.logger.hasHandlers():
+            return
+        records = queue.SimpleQueue()
+        self._handler = logging.handlers.QueueHandler(records)
+        self._listener = logging.handlers.QueueListener(records, logging.StreamHandler())
+        self.logger.addHandler(self._handler)
+        self._listener.start()
+
+    def stop(self):
+        if self._listener is None:
+            return
+        self.logger.removeHandler(self._handler)
+        self._listener.stop()
+        self._listener = self._handler = None
+
+
+request_log = RequestLog()
+
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class InstrumentationMiddleware:
+    """Records per-request DB usage and reports it as Server-Timing and a log line."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics()
+        token = current_request.set(request)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                server_timing = (
+                    f'db;dur={request.db_time * 1000:.2f};desc="{request.query_count} queries", '
+                    f"pool;dur={request.pool_wait * 1000:.2f}, "
+                    f"app;dur={total_ms:.2f}"
+                )
+                message.setdefault("headers", []).append((b"server-timing", server_timing.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - start
+            route = _route_name(scope)
+            metrics.latency("http_request", method=scope["method"], route=route).observe(elapsed)
+            metrics.counter("http_db_queries").inc(request.query_count)
+            if settings.REQUEST_LOG_ENABLED and request_log.logger.isEnabledFor(logging.INFO):
+                request_log.logger.info(json.dumps({
+                    "event": "request",
+                    "method": scope["method"],
+                    "route": route,
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "db_queries": request.query_count,
+                    "db_ms": round(request.db_time * 1000, 2),
+                    "pool_wait_ms": round(request.pool_wait * 1000, 2),
+                    "slowest_query_ms": round(request.slowest_time * 1000, 2),
+                    "slowest_query": request.slowest_statement,
+                }))
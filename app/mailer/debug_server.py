@@ -0,0 +1,112 @@
+"""Minimal SMTP sink for local development and benchmarks.
+
+Accepts EHLO/HELO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP and QUIT, counts
+the delivered messages and discards them. It does not speak STARTTLS, so run
+the app with SMTP_STARTTLS=false against it:
+
+    python -m app.mailer.debug_server --port 1025
+"""
+import argparse
+import asyncio
+from email import message_from_bytes
+from typing import List, Optional
+
+
+class DebugSMTPServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 1025, verbose: bool = False):
+        self.host = host
+        self.port = port
+        self.verbose = verbose
+        self.messages_received = 0
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Debug SMTP server listening on {self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        async def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        recipients: List[str] = []
+        await reply("220 localhost debug SMTP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    await reply("250-localhost")
+                    await reply("250-AUTH PLAIN")
+                    await reply("250 8BITMIME")
+                elif verb == "HELO":
+                    await reply("250 localhost")
+                elif verb == "AUTH":
+                    await reply("235 Authentication successful")
+                elif verb == "MAIL":
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[-1].strip(" <>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = bytearray()
+                    while True:
+                        chunk = await reader.readline()
+                        if not chunk or chunk == b".\r\n":
+                            break
+                        data += chunk[1:] if chunk.startswith(b"..") else chunk
+                    self.messages_received += 1
+                    if self.verbose:
+                        message = message_from_bytes(bytes(data))
+                        print(f"[{self.messages_received}] to={recipients} subject={message['Subject']!r}")
+                    await reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    server = DebugSMTPServer(args.host, args.port, verbose=not args.quiet)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import asyncio
+import json
+import random
+import smtplib
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.message import Message
+from typing import Dict, List, Optional, Tuple
+
+from app import metrics
+from app.config.settings import settings
+
+
+@dataclass
+class OutboundEmail:
+    message: Message
+    recipients: List[str]
+    attempts: int = 0
+    last_error: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class PermanentDeliveryError(Exception):
+    pass
+
+
+class ConnectionFailedError(Exception):
+    """The SMTP session could not be opened, so nothing was attempted."""
+
+
+class SMTPConnection:
+    """A reusable, authenticated SMTP session owned by a single worker."""
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+        try:
+            smtp.ehlo()
+            if settings.SMTP_STARTTLS:
+                smtp.starttls()
+                smtp.ehlo()
+            if settings.SMTP_USERNAME:
+                smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+
+    def _get(self) -> smtplib.SMTP:
+        idle = time.monotonic() - self._last_used
+        if self._smtp is not None and idle > settings.MAIL_CONNECTION_IDLE_TIMEOUT:
+            self.close()
+        if self._smtp is None:
+            try:
+                self._smtp = self._connect()
+            except Exception as e:
+                raise ConnectionFailedError(str(e)) from e
+        return self._smtp
+
+    def send(self, email: OutboundEmail):
+        smtp = self._get()
+        try:
+            smtp.send_message(email.message, from_addr=settings.FROM_EMAIL, to_addrs=email.recipients)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentDeliveryError(str(e.recipients)) from e
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500:
+                # The session is still usable after a rejected message
+                smtp.rset()
+                raise PermanentDeliveryError(f"{e.smtp_code} {e.smtp_error!r}") from e
+            self.close()
+            raise
+        except (smtplib.SMTPException, OSError):
+            self.close()
+            raise
+        finally:
+            self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+
+class DeadLetterStore:
+    def __init__(self, max_entries: int = 1000, path: Optional[str] = None):
+        self.entries = deque(maxlen=max_entries)
+        self.path = path
+
+    def add(self, email: OutboundEmail):
+        entry = {
+            "to": email.recipients,
+            "subject": email.message["Subject"],
+            "attempts": email.attempts,
+            "error": email.last_error,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.entries.append(entry)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        print(f"Email to {', '.join(email.recipients)} dead-lettered: {email.last_error}")
+
+
+class MailQueue:
+    """In-memory outbound mail queue drained in batches by SMTP worker tasks."""
+
+    def __init__(self):
+        self.dead_letters = DeadLetterStore(path=settings.MAIL_DEAD_LETTER_PATH)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Read by the send threads, which finish their current email and hand back the rest
+        self._stopping = False
+        # Emails waiting out a retry delay, by id
+        self._retries: Dict[int, Tuple[asyncio.TimerHandle, OutboundEmail]] = {}
+
+        self.sent = metrics.counter("mail_sent")
+        self.retried = metrics.counter("mail_retried")
+        self.dead_lettered = metrics.counter("mail_dead_lettered")
+        self.rejected = metrics.counter("mail_rejected")
+        self.batch_stats = metrics.latency("mail_batch_send")
+        self.queue_wait = metrics.latency("mail_queue_wait")
+        metrics.gauge("mail_queue_depth", lambda: self._queue.qsize() if self._queue else 0)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, workers: int = settings.MAIL_WORKERS):
+        if self.running:
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=settings.MAIL_QUEUE_MAX_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    async def stop(self, timeout: float = settings.MAIL_SHUTDOWN_TIMEOUT):
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Mail queue not drained within {timeout}s; dead-lettering what is left")
+        self._stopping = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Nothing is sent after this, so whatever is left is recorded rather than dropped
+        for handle, email in self._retries.values():
+            handle.cancel()
+            self._dead_letter(email)
+        self._retries.clear()
+        while not self._queue.empty():
+            self._dead_letter(self._queue.get_nowait(), "undelivered at shutdown")
+
+    def submit(self, message: Message, recipients: List[str]) -> bool:
+        email = OutboundEmail(message=message, recipients=recipients)
+        if not self.running:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return self._send_now(email)
+            # smtplib blocks, so keep it off the event loop
+            loop.run_in_executor(None, self._send_now, email)
+            return True
+        try:
+            self._queue.put_nowait(email)
+        except asyncio.QueueFull:
+            self.rejected.inc()
+            print(f"Mail queue full, dropping email to {', '.join(recipients)}")
+            return False
+        return True
+
+    def _send_now(self, email: OutboundEmail) -> bool:
+        connection = SMTPConnection()
+        try:
+            connection.send(email)
+            self.sent.inc()
+            return True
+        except Exception as e:
+            print(f"Failed to send email to {', '.join(email.recipients)}: {str(e)}")
+            return False
+        finally:
+            connection.close()
+
+    async def _worker(self):
+        connection = SMTPConnection()
+        batch: List[OutboundEmail] = []
+        waiting: List[OutboundEmail] = []
+        connect_failures = 0
+        try:
+            while True:
+                if not batch:
+                    batch = [await self._queue.get()]
+                    while len(batch) < settings.MAIL_BATCH_SIZE and not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+
+                    now = time.monotonic()
+                    for email in batch:
+                        self.queue_wait.observe(now - email.enqueued_at)
+
+                start = time.perf_counter()
+                sending = asyncio.ensure_future(asyncio.to_thread(self._send_batch, connection, batch))
+                try:
+                    failures, unsent = await asyncio.shield(sending)
+                except asyncio.CancelledError:
+                    # The thread still holds the connection and some of the batch;
+                    # it stops after the current email, and what it did not send is recorded
+                    failures, unsent = await sending
+                    for email, permanent in failures:
+                        self._handle_failure(email, permanent)
+                    waiting = unsent
+                    raise
+                self.batch_stats.observe(time.perf_counter() - start)
+
+                for email, permanent in failures:
+                    self._handle_failure(email, permanent)
+                for _ in range(len(batch) - len(unsent)):
+                    self._queue.task_done()
+                batch = unsent
+                if not unsent:
+                    connect_failures = 0
+                    continue
+
+                # One backoff per failed connection, not a retry per message
+                connect_failures += 1
+                delay = min(settings.MAIL_RETRY_BASE_DELAY * (2 ** (connect_failures - 1)), settings.MAIL_CONNECT_MAX_BACKOFF)
+                delay *= random.uniform(0.8, 1.2)
+                print(f"SMTP connection failed, retrying {len(unsent)} emails in {delay:.1f}s: {unsent[0].last_error}")
+                waiting = unsent
+                await asyncio.sleep(delay)
+                waiting = []
+        finally:
+            for email in waiting:
+                self._dead_letter(email)
+            await asyncio.to_thread(connection.close)
+
+    def _send_batch(self, connection: SMTPConnection, batch: List[OutboundEmail]):
+        """Returns the failed emails, and the ones left unsent because no connection could be opened."""
+        failures = []
+        for index, email in enumerate(batch):
+            if self._stopping:
+                for unsent in batch[index:]:
+                    unsent.last_error = "undelivered at shutdown"
+                return failures, batch[index:]
+            try:
+                connection.send(email)
+                self.sent.inc()
+            except ConnectionFailedError as e:
+                for unsent in batch[index:]:
+                    unsent.last_error = str(e)
+                return failures, batch[index:]
+            except Exception as e:
+                email.attempts += 1
+                email.last_error = str(e)
+                failures.append((email, isinstance(e, PermanentDeliveryError)))
+        return failures, []
+
+    def _handle_failure(self, email: OutboundEmail, permanent: bool):
+        if permanent or email.attempts >= settings.MAIL_MAX_RETRIES:
+            self._dead_letter(email)
+            return
+
+        self.retried.inc()
+        delay = settings.MAIL_RETRY_BASE_DELAY * (2 ** (email.attempts - 1))
+        delay *= random.uniform(0.8, 1.2)
+        handle = asyncio.get_running_loop().call_later(delay, self._requeue, email)
+        self._retries[id(email)] = (handle, email)
+
+    def _requeue(self, email: OutboundEmail):
+        self._retries.pop(id(email), None)
+        email.enqueued_at = time.monotonic()
+        try:
+            self._queue.put_nowait(email)
+        except asyncio.QueueFull:
+            self._dead_letter(email, "queue full on retry")
+
+    def _dead_letter(self, email: OutboundEmail, error: Optional[str] = None):
+        if error is not None:
+            email.last_error = error
+        self.dead_lettered.inc()
+        self.dead_letters.add(email)
+
+
+mail_queue = MailQueue()
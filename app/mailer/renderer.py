@@ -0,0 +1,124 @@
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
+
+from app import metrics
+from app.config.settings import settings
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates/mailer"
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+_METRIC_NAME_RE = re.compile(r'\W+')
+
+
+def format_date(value, format='%B %d, %Y'):
+    if isinstance(value, datetime):
+        return value.strftime(format)
+    return value
+
+
+def strip_html(html: str) -> str:
+    text = _TAG_RE.sub(' ', html)
+    text = text.replace('&nbsp;', ' ')
+    text = text.replace('&amp;', '&')
+    text = text.replace('&lt;', '<')
+    text = text.replace('&gt;', '>')
+    return text
+
+
+def collapse_whitespace(text: str) -> str:
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def html_to_plain_text(html: str) -> str:
+    return collapse_whitespace(strip_html(html))
+
+
+class PlainTextLoader(BaseLoader):
+    """Serves each HTML template with its markup already stripped.
+
+    The tag-stripping pass then runs once per template at compile time instead
+    of on every rendered email.
+    """
+
+    def __init__(self, loader: BaseLoader):
+        self.loader = loader
+
+    def get_source(self, environment: Environment, template: str) -> Tuple[str, Optional[str], Any]:
+        source, filename, uptodate = self.loader.get_source(environment, template)
+        return strip_html(source), filename, uptodate
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+
+class MailRenderer:
+    def __init__(
+            self,
+            template_dir: Path = TEMPLATE_DIR,
+            bytecode_cache_dir: Optional[str] = None,
+            auto_reload: bool = False
+    ):
+        loader = FileSystemLoader(template_dir)
+        self.auto_reload = auto_reload
+        self.html_env = self._create_env(
+            loader,
+            bytecode_cache_dir,
+            "__jinja2_html_%s.cache",
+            autoescape=select_autoescape(['html', 'xml'])
+        )
+        self.text_env = self._create_env(
+            PlainTextLoader(loader),
+            bytecode_cache_dir,
+            "__jinja2_text_%s.cache",
+            autoescape=False
+        )
+        self._templates: Dict[str, Tuple[Template, Template]] = {}
+        self._stats: Dict[str, metrics.LatencyStats] = {}
+
+    def _create_env(self, loader: BaseLoader, bytecode_cache_dir: Optional[str], pattern: str, autoescape) -> Environment:
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            Path(bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir, pattern)
+
+        env = Environment(
+            loader=loader,
+            autoescape=autoescape,
+            bytecode_cache=bytecode_cache,
+            auto_reload=self.auto_reload
+        )
+        env.filters['format_date'] = format_date
+        return env
+
+    def load(self):
+        for name in self.html_env.list_templates(extensions=["html"]):
+            self._compile(name)
+
+    def _compile(self, name: str) -> Tuple[Template, Template]:
+        templates = (self.html_env.get_template(name), self.text_env.get_template(name))
+        self._templates[name] = templates
+        self._stats[name] = metrics.latency("mail_render_" + _METRIC_NAME_RE.sub("_", name.rsplit(".", 1)[0]))
+        return templates
+
+    def render(self, name: str, context: Dict[str, Any]) -> Tuple[str, str]:
+        templates = self._templates.get(name)
+        if templates is None or self.auto_reload:
+            templates = self._compile(name)
+
+        start = time.perf_counter()
+        html = templates[0].render(context)
+        text = collapse_whitespace(templates[1].render(context))
+        self._stats[name].observe(time.perf_counter() - start)
+        return html, text
+
+
+mail_renderer = MailRenderer(
+    bytecode_cache_dir=settings.MAIL_TEMPLATE_BYTECODE_CACHE_DIR,
+    auto_reload=settings.MAIL_TEMPLATE_AUTO_RELOAD
+)
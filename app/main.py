@@ -1,13 +1,64 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
-from app.routers import users, auth
+from fastapi.responses import PlainTextResponse
+from app.routers import users, auth, conversations, presence as presence_router, well_known
+from app.chat import gateway
+from app.chat.connections import connection_registry
+from app.chat.presence import presence
+from app.chat.pubsub import chat_broker
+from app.chat.recent import recent_messages
+from app.chat.writer import message_writer
 from fastapi.middleware.cors import CORSMiddleware
 from app.config.settings import settings
 from app.auth.dependencies import get_current_user
-from app.models import User
+from app.auth.user_cache import CachedUser
 from app.schemas.auth import UserResponse
+from app.auth.calibration import configured_cost
+from app.auth.hashing import password_hasher, password_rehasher
+from app.auth.revocation import revocations
+from app.database import dispose_engines
+from app.instrumentation import InstrumentationMiddleware, request_log
+from app import metrics
+from app.mailer.queue import mail_queue
+from app.mailer.renderer import mail_renderer
+from app.maintenance.token_gc import token_gc
+from app.search.user_index import user_index
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.REQUEST_LOG_ENABLED:
+        request_log.start()
+    password_hasher.configure(await configured_cost())
+    mail_renderer.load()
+    if not await revocations.start():
+        print("Token revocation list not loaded yet; serving while it finishes in the background")
+    chat_broker.add_observer(recent_messages)
+    chat_broker.add_observer(presence)
+    await chat_broker.start(connection_registry)
+    presence.start()
+    message_writer.start(on_committed=gateway.publish_committed)
+    if settings.MAIL_QUEUE_ENABLED:
+        mail_queue.start()
+    if settings.TOKEN_GC_ENABLED:
+        token_gc.start()
+    if settings.USER_SEARCH_INDEX_ENABLED:
+        user_index.start()
+    yield
+    await user_index.stop()
+    await revocations.stop()
+    await presence.stop()
+    await chat_broker.stop()
+    await message_writer.stop()
+    await token_gc.stop()
+    await mail_queue.stop()
+    await password_rehasher.stop()
+    password_hasher.shutdown()
+    await dispose_engines()
+    request_log.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -17,13 +68,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(InstrumentationMiddleware)
 @app.get("/")
 def home():
     return {"message": "`Running!"}
     
 @app.get("/me", response_model=UserResponse)
-async def me(current_user: User = Depends(get_current_user)):
+async def me(current_user: CachedUser = Depends(get_current_user)):
     return current_user
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def prometheus_metrics():
+        return metrics.render_prometheus()
+
 app.include_router(auth.router)
-app.include_router(users.router)
\ No newline at end of file
+app.include_router(users.router)
+app.include_router(conversations.router)
+app.include_router(presence_router.router)
+app.include_router(well_known.router)
+app.include_router(gateway.router)
\ No newline at end of file
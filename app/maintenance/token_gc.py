@@ -0,0 +1,142 @@
+"""Purges expired, revoked and used auth tokens, and expired revocations, in bounded batches.
+
+Runs in-app on a schedule when TOKEN_GC_ENABLED is set, or once from the CLI
+(e.g. from cron):
+
+    python -m app.maintenance.token_gc --batch-size 1000 --pause-ms 50
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, or_, select
+
+from app import metrics
+from app.config.settings import settings
+from app.database import dispose_engines, open_session
+from app.models import PasswordResetToken, RefreshToken, TokenRevocation, VerificationToken
+
+
+def _purge_conditions():
+    now = func.now()
+    return {
+        RefreshToken: or_(RefreshToken.expires_at < now, RefreshToken.is_revoked == True),
+        VerificationToken: VerificationToken.expires_at < now,
+        PasswordResetToken: or_(PasswordResetToken.expires_at < now, PasswordResetToken.is_used == True),
+        TokenRevocation: TokenRevocation.expires_at < now,
+    }
+
+
+@dataclass
+class GCReport:
+    rows: Dict[str, int] = field(default_factory=dict)
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+    completed: bool = True
+
+    @property
+    def total_rows(self) -> int:
+        return sum(self.rows.values())
+
+    def __str__(self):
+        tables = ", ".join(f"{name}={count}" for name, count in self.rows.items())
+        status = "" if self.completed else " (stopped at time budget)"
+        return f"Token GC reclaimed {self.total_rows} rows [{tables}] in {self.batches} batches, {self.elapsed_seconds:.2f}s{status}"
+
+
+async def purge_expired_tokens(
+        batch_size: int = settings.TOKEN_GC_BATCH_SIZE,
+        pause_ms: int = settings.TOKEN_GC_BATCH_PAUSE_MS,
+        max_runtime: Optional[float] = settings.TOKEN_GC_MAX_RUNTIME_SECONDS
+) -> GCReport:
+    report = GCReport()
+    start = time.perf_counter()
+    deadline = start + max_runtime if max_runtime else None
+
+    async with open_session() as db:
+        for model, condition in _purge_conditions().items():
+            table = model.__tablename__
+            report.rows[table] = 0
+            reclaimed = metrics.counter(f"token_gc_rows_{table}")
+
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    report.completed = False
+                    break
+
+                # Delete by primary key through a LIMITed subquery so each batch
+                # holds locks on a bounded number of rows
+                batch_ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+                result = await db.execute(
+                    delete(model).where(model.id.in_(batch_ids)).execution_options(synchronize_session=False)
+                )
+                await db.commit()
+
+                report.batches += 1
+                report.rows[table] += result.rowcount
+                reclaimed.inc(result.rowcount)
+
+                if result.rowcount < batch_size:
+                    break
+                if pause_ms:
+                    await asyncio.sleep(pause_ms / 1000)
+
+            if not report.completed:
+                break
+
+    report.elapsed_seconds = time.perf_counter() - start
+    metrics.latency("token_gc_run").observe(report.elapsed_seconds)
+    return report
+
+
+class TokenGarbageCollector:
+    def __init__(self, interval_seconds: int = settings.TOKEN_GC_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.last_report: Optional[GCReport] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                self.last_report = await purge_expired_tokens()
+                print(self.last_report)
+            except Exception as e:
+                print(f"Token GC failed: {str(e)}")
+
+
+token_gc = TokenGarbageCollector()
+
+
+async def _run_once(args) -> GCReport:
+    try:
+        return await purge_expired_tokens(args.batch_size, args.pause_ms, args.max_runtime)
+    finally:
+        await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Purge expired, revoked and used auth tokens")
+    parser.add_argument("--batch-size", type=int, default=settings.TOKEN_GC_BATCH_SIZE)
+    parser.add_argument("--pause-ms", type=int, default=settings.TOKEN_GC_BATCH_PAUSE_MS)
+    parser.add_argument("--max-runtime", type=float, default=settings.TOKEN_GC_MAX_RUNTIME_SECONDS)
+    args = parser.parse_args()
+
+    report = asyncio.run(_run_once(args))
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import re
+import threading
+from typing import Callable, Dict, Tuple
+
+# Sorted (label, value) pairs; a metric name with several label sets is one
+# metric with several series
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class LatencyStats:
+    __slots__ = ("name", "labels", "count", "total", "max", "bucket_counts", "_lock")
+
+    BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, name: str, labels: Labels = ()):
+        self.name = name
+        self.labels = labels
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bucket_counts = [0] * len(self.BUCKETS)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_seconds": self.total,
+                "avg_seconds": self.total / self.count if self.count else 0.0,
+                "max_seconds": self.max,
+                "buckets": dict(zip(self.BUCKETS, self.bucket_counts)),
+            }
+
+
+class Counter:
+    __slots__ = ("name", "labels", "value", "_lock")
+
+    def __init__(self, name: str, labels: Labels = ()):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+
+_latencies: Dict[Tuple[str, Labels], LatencyStats] = {}
+_counters: Dict[Tuple[str, Labels], Counter] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+
+def latency(name: str, **labels: str) -> LatencyStats:
+    key = (name, tuple(sorted(labels.items())))
+    stats = _latencies.get(key)
+    if stats is None:
+        stats = _latencies.setdefault(key, LatencyStats(*key))
+    return stats
+
+
+def counter(name: str, **labels: str) -> Counter:
+    key = (name, tuple(sorted(labels.items())))
+    value = _counters.get(key)
+    if value is None:
+        value = _counters.setdefault(key, Counter(*key))
+    return value
+
+
+def gauge(name: str, fn: Callable[[], float]):
+    _gauges[name] = fn
+
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]+")
+
+
+def _metric_name(name: str) -> str:
+    return _INVALID_NAME_CHARS.sub("_", name).strip("_")
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels) -> str:
+    """Renders labels as `{a="x",b="y"}`, or nothing when there are none."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{_metric_name(key)}="{_label_value(value)}"' for key, value in labels) + "}"
+
+
+def _series_name(name: str, labels: Labels) -> str:
+    return name + _labels(labels)
+
+
+def snapshot() -> dict:
+    return {
+        "latencies": {_series_name(*key): stats.snapshot() for key, stats in _latencies.items()},
+        "counters": {_series_name(*key): c.value for key, c in _counters.items()},
+        "gauges": {name: fn() for name, fn in _gauges.items()},
+    }
+
+
+def render_prometheus() -> str:
+    lines = []
+    typed = set()
+    for (name, labels), stats in sorted(_latencies.items()):
+        metric = f"{_metric_name(name)}_seconds"
+        with stats._lock:
+            bucket_counts = list(stats.bucket_counts)
+            count, total = stats.count, stats.total
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(stats.BUCKETS, bucket_counts):
+            cumulative += bucket_count
+            lines.append(f'{metric}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+        lines.append(f'{metric}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+        lines.append(f"{metric}_sum{_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_labels(labels)} {count}")
+    for (name, labels), value in sorted(_counters.items()):
+        metric = f"{_metric_name(name)}_total"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_labels(labels)} {value.value}")
+    for name, fn in sorted(_gauges.items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {fn()}")
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,8 @@
 from .user import User
 from .refresh_token import RefreshToken
 from .verification_token import VerificationToken
-from .password_reset_token import PasswordResetToken
\ No newline at end of file
+from .password_reset_token import PasswordResetToken
+from .conversation import Conversation
+from .message import Message
+from .token_revocation import TokenRevocation
+from .conversation_participant import ConversationParticipant
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(255), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_seq = Column(BigInteger, nullable=False, default=0, server_default="0")  # seq of the newest message
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
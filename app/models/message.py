@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, BigInteger, Text, DateTime, ForeignKey, Index
+from app.database import Base
+
+class Message(Base):
+    __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset pagination of a conversation's history runs on this index
+        Index("ix_messages_conversation_id_seq", "conversation_id", "seq", unique=True),
+    )
+
+    # SQLite only autoincrements INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(BigInteger, nullable=False)  # per-conversation, allocated from Conversation.last_seq
+    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    body = Column(Text, nullable=False)
+    # Set when the gateway accepts the message, not when the batch is written
+    created_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,13 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, LargeBinary, Boolean, DateTime, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id_is_revoked", "user_id", "is_revoked"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True, nullable=False)
-    token = Column(String(512), unique=True, index=True, nullable=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    jti_hash = Column(LargeBinary(32), unique=True, index=True, nullable=False)  # sha256 of the JWT's jti
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
     is_revoked = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+class TokenRevocation(Base):
+    """A revoked access token (jti set) or all of a user's access tokens issued before revoked_before."""
+    __tablename__ = "token_revocations"
+    __table_args__ = (
+        Index("ix_token_revocations_expires_at_id", "expires_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    jti = Column(String(64), nullable=True)
+    revoked_before = Column(DateTime(timezone=True), nullable=True)
+    # No token this row could reject outlives it
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, LargeBinary, DateTime
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -6,7 +6,7 @@ class VerificationToken(Base):
     __tablename__ = "verification_tokens"
 
     id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True, index=True, nullable=False)
-    user_id = Column(Integer, nullable=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    token_hash = Column(LargeBinary(32), unique=True, index=True, nullable=False)  # sha256 of the emailed token
+    user_id = Column(Integer, index=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
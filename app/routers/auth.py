@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
-from fastapi.security import HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.dependencies import get_db
 from app.services.auth import AuthService
 from app.schemas.auth import (
@@ -20,26 +21,27 @@ router = APIRouter(
     tags=["auth"]
 )
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
-    user = auth_service.register_user(user_data)
+    user = await auth_service.register_user(user_data)
     return user
 
 
 @router.get("/verify-email")
 async def verify_email_page(
         token: str,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    result = AuthService(db).verify_token(token)
+    result = await AuthService(db).verify_token(token)
     return result
 
 @router.post("/login", response_model=Token)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
-    user, access_token, refresh_token = auth_service.authenticate_user(login_data)
+    user, access_token, refresh_token = await auth_service.authenticate_user(login_data)
 
     return Token(
         access_token=access_token,
@@ -48,9 +50,9 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh", response_model=Token)
-def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+async def refresh_token(request: RefreshTokenRequest, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
-    access_token, refresh_token = auth_service.refresh_access_token(request.refresh_token)
+    access_token, refresh_token = await auth_service.refresh_access_token(request.refresh_token)
 
     return Token(
         access_token=access_token,
@@ -58,22 +60,27 @@ def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)):
     )
 
 @router.post("/forgot-password", response_model=ResetPasswordResponse)
-async def forgot_password(data: ForgotPasswordRequest, db: Session = Depends(get_db)):
+async def forgot_password(data: ForgotPasswordRequest, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
-    auth_service.forgot_password(data.email)
+    await auth_service.forgot_password(data.email)
 
     return {"success": True, "message": "Email sent"}
 
 @router.post("/reset-password", response_model=PasswordResetTokenResponse)
-async def reset_password(reset_password_request: ResetPasswordRequest, db: Session = Depends(get_db)):
+async def reset_password(reset_password_request: ResetPasswordRequest, db: AsyncSession = Depends(get_db)):
     auth_service = AuthService(db)
-    auth_service.reset_password(reset_password_request.token, reset_password_request.new_password)
+    await auth_service.reset_password(reset_password_request.token, reset_password_request.new_password)
 
     return {"success": True, "message": "Password reset"}
 
 @router.post("/logout")
-def logout(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+async def logout(
+        request: RefreshTokenRequest,
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+        db: AsyncSession = Depends(get_db)
+):
+    # The access token in the Authorization header, if any, is revoked as well
     auth_service = AuthService(db)
-    auth_service.logout(request.refresh_token)
+    await auth_service.logout(request.refresh_token, credentials.credentials if credentials else None)
 
     return {"message": "Successfully logged out"}
\ No newline at end of file
@@ -0,0 +1,109 @@
+import json
+from typing import Iterator, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.dependencies import get_current_user
+from app.auth.user_cache import CachedUser
+from app.chat.recent import recent_messages
+from app.config.settings import settings
+from app.dependencies import get_db
+from app.services.conversations import ConversationService, HISTORY_FIELDS, row_to_json
+from app.schemas.chat import ConversationCreate, ConversationResponse
+
+router = APIRouter(
+    prefix="/conversations",
+    tags=["conversations"]
+)
+
+NDJSON_CHUNK_ROWS = 500
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(HISTORY_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in HISTORY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    # seq is the pagination cursor, so it is always returned
+    return ["seq"] + [name for name in dict.fromkeys(names) if name != "seq"]
+
+
+def _ndjson_lines(rows: List[str]) -> Iterator[bytes]:
+    for start in range(0, len(rows), NDJSON_CHUNK_ROWS):
+        yield "".join(row + "\n" for row in rows[start:start + NDJSON_CHUNK_ROWS]).encode()
+
+
+async def _read_page(
+        service: ConversationService,
+        conversation_id: int,
+        user_id: int,
+        before: Optional[int],
+        limit: int,
+        fields: List[str]
+) -> List[Tuple[int, str]]:
+    """Returns (seq, serialized row) pairs, from the recent-message cache when it holds the page."""
+    # Checked before the cache, and answered like a missing conversation
+    if not await service.is_participant(conversation_id, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    full_rows = fields == list(HISTORY_FIELDS)
+    if full_rows:
+        cached = recent_messages.page(conversation_id, before, limit)
+        if cached is not None:
+            return cached
+    # Start buffering before the read so nothing committed meanwhile is missed
+    prime = full_rows and before is None and recent_messages.track(conversation_id)
+
+    rows = await service.get_messages(conversation_id, before, limit, fields)
+    page = [(row["seq"], row_to_json(row)) for row in rows]
+    if prime:
+        recent_messages.prime(conversation_id, page)
+    return page
+
+
+@router.post("/", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
+async def create_conversation(
+        data: ConversationCreate,
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    return await ConversationService(db).create_conversation(data, current_user.id)
+
+
+@router.get("/{conversation_id}/messages")
+async def get_messages(
+        conversation_id: int,
+        request: Request,
+        before: Optional[int] = Query(None, ge=1, description="return messages with a seq lower than this"),
+        limit: int = Query(settings.CHAT_HISTORY_DEFAULT_LIMIT, ge=1),
+        fields: Optional[str] = Query(None, description="comma-separated subset of id, seq, sender_id, body, created_at"),
+        format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    stream = format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", ""))
+    max_limit = settings.CHAT_HISTORY_MAX_STREAM_LIMIT if stream else settings.CHAT_HISTORY_MAX_LIMIT
+    if limit > max_limit:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must not exceed {max_limit}"
+        )
+
+    page = await _read_page(
+        ConversationService(db), conversation_id, current_user.id, before, limit, _parse_fields(fields)
+    )
+    rows = [row for _, row in page]
+
+    next_before = page[-1][0] if len(page) == limit else None
+    if stream:
+        headers = {"X-Next-Before": str(next_before)} if next_before is not None else {}
+        return StreamingResponse(_ndjson_lines(rows), media_type="application/x-ndjson", headers=headers)
+    body = '{"messages": [%s], "next_before": %s}' % (", ".join(rows), json.dumps(next_before))
+    return Response(body, media_type="application/json")
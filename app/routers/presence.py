@@ -0,0 +1,43 @@
+import json
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.dependencies import get_current_user
+from app.auth.user_cache import CachedUser
+from app.chat.presence import presence
+from app.config.settings import settings
+from app.dependencies import get_db
+
+router = APIRouter(
+    prefix="/presence",
+    tags=["presence"]
+)
+
+
+@router.get("/")
+async def get_presence(
+        ids: str = Query(..., description="comma-separated user ids"),
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    try:
+        user_ids = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be comma-separated integers"
+        )
+    if not user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must not be empty"
+        )
+    if len(user_ids) > settings.PRESENCE_BULK_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.PRESENCE_BULK_MAX_IDS} ids per request"
+        )
+
+    # Online users are answered from memory; only the rest cost a query
+    found = await presence.lookup(user_ids, db)
+    body = json.dumps({"users": {str(user_id): found[user_id] for user_id in user_ids if user_id in found}})
+    return Response(body, media_type="application/json")
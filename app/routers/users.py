@@ -1,6 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+import json
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.dependencies import get_current_user
+from app.auth.user_cache import CachedUser
+from app.config.settings import settings
 from app.dependencies import get_db
+from app.search.user_index import search_cache, user_index
+from app.services.users import DEFAULT_USER_FIELDS, SEARCH_RESULT_FIELDS, USER_FIELDS, UserService
 
 router = APIRouter(
     prefix="/users",
@@ -8,6 +16,78 @@ router = APIRouter(
 )
 
 
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return DEFAULT_USER_FIELDS
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in USER_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    # id is the pagination cursor, so it is always returned
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+
 @router.get("/")
-def get_users(db: Session = Depends(get_db)):
-    return [] 
+async def get_users(
+        after: Optional[int] = Query(None, ge=0, description="return users with an id greater than this"),
+        limit: int = Query(settings.USERS_PAGE_DEFAULT_LIMIT, ge=1),
+        is_active: Optional[bool] = None,
+        is_verified: Optional[bool] = None,
+        fields: Optional[str] = Query(None, description="comma-separated subset of " + ", ".join(USER_FIELDS)),
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    if limit > settings.USERS_PAGE_MAX_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must not exceed {settings.USERS_PAGE_MAX_LIMIT}"
+        )
+
+    names = _parse_fields(fields)
+    rows = await UserService(db).list_users(after, limit, names, is_active=is_active, is_verified=is_verified)
+    next_after = rows[-1][0] if len(rows) == limit else None
+    body = json.dumps(
+        {"users": [dict(zip(names, row)) for row in rows], "next_after": next_after},
+        default=datetime.isoformat
+    )
+    return Response(body, media_type="application/json")
+
+
+@router.get("/search")
+async def search_users(
+        q: str = Query(..., min_length=1, max_length=100, description="prefix of a name or email"),
+        limit: int = Query(settings.USER_SEARCH_DEFAULT_LIMIT, ge=1),
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    prefix = q.strip().lower()
+    if not prefix:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="q must not be blank"
+        )
+    if limit > settings.USER_SEARCH_MAX_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must not exceed {settings.USER_SEARCH_MAX_LIMIT}"
+        )
+
+    body = search_cache.get(prefix, limit)
+    if body is None:
+        service = UserService(db)
+        if user_index.ready:
+            user_ids = user_index.search(prefix, limit)
+            rows = await service.get_users(user_ids, SEARCH_RESULT_FIELDS)
+            # Ids the database did not return belong to deactivated or deleted users
+            while len(rows) < len(user_ids):
+                user_index.remove(set(user_ids).difference(row[0] for row in rows))
+                user_ids = user_index.search(prefix, limit)
+                rows = await service.get_users(user_ids, SEARCH_RESULT_FIELDS)
+        else:
+            rows = await service.search_users(prefix, limit)
+        body = json.dumps({"users": [dict(zip(SEARCH_RESULT_FIELDS, row)) for row in rows]})
+        search_cache.set(prefix, limit, body)
+    return Response(body, media_type="application/json")
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+from app.auth.tokens import token_engine
+
+router = APIRouter(
+    prefix="/.well-known",
+    tags=["well-known"]
+)
+
+
+@router.get("/jwks.json")
+def jwks(response: Response):
+    # Keys change only with a deploy; let verifiers cache them
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return token_engine.jwks()
@@ -0,0 +1,19 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class ConversationCreate(BaseModel):
+    title: Optional[str] = Field(None, max_length=255)
+    # Users besides the creator who may join, read and post; unknown ids are skipped
+    participant_ids: List[int] = Field(default_factory=list, max_length=1000)
+
+
+class ConversationResponse(BaseModel):
+    id: int
+    title: Optional[str] = None
+    created_by: int
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
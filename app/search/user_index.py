@@ -0,0 +1,225 @@
+"""In-memory prefix index over user names and emails for @-mention autocomplete.
+
+Terms (full name, last name, email; lowercased) are kept in one sorted list
+with a parallel array of user ids, so a prefix lookup is a bisect and a short
+scan. Users added since the last rebuild go to a small sorted delta that is
+merged in once it grows. The index warms in the background at startup and then
+picks up users registered on other workers by polling for ids above the
+highest one loaded; this worker's registrations are added immediately.
+Deactivated and deleted users are dropped when a search finds them missing
+from the database; their entries are skipped until the next merge.
+"""
+import asyncio
+import heapq
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app import metrics
+from app.config.settings import settings
+from app.database import open_session
+from app.services.users import SEARCH_RESULT_FIELDS, UserService
+
+# Longest prefix whose cached results a new user can invalidate
+MAX_CACHED_PREFIX = 32
+
+
+def user_terms(email: str, first_name: Optional[str], last_name: Optional[str]) -> List[str]:
+    full_name = " ".join(name for name in (first_name, last_name) if name).lower()
+    terms = [full_name, (last_name or "").lower(), email.lower()]
+    return [term for term in dict.fromkeys(terms) if term]
+
+
+class UserPrefixIndex:
+    def __init__(
+            self,
+            batch_size: int = settings.USER_SEARCH_INDEX_BATCH_SIZE,
+            refresh_seconds: float = settings.USER_SEARCH_INDEX_REFRESH_SECONDS,
+            delta_limit: int = 1024
+    ):
+        self.batch_size = batch_size
+        self.refresh_seconds = refresh_seconds
+        self.delta_limit = delta_limit
+        self.ready = False
+        self.loaded_through = 0
+        self._terms: List[str] = []
+        self._ids = array("q")
+        self._delta: List[Tuple[str, int]] = []
+        # Ids added out of band, above loaded_through, so polling does not add them twice
+        self._added: Set[int] = set()
+        # Ids no longer active, skipped by searches and dropped on merge
+        self._removed: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        metrics.gauge("user_index_terms", lambda: len(self))
+
+    def __len__(self) -> int:
+        return len(self._terms) + len(self._delta)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def add(self, user_id: int, email: str, first_name: Optional[str], last_name: Optional[str]):
+        for term in user_terms(email, first_name, last_name):
+            insort(self._delta, (term, user_id))
+        if user_id > self.loaded_through:
+            self._added.add(user_id)
+        self._removed.discard(user_id)
+        if len(self._delta) >= self.delta_limit:
+            self._merge()
+
+    def remove(self, user_ids: Iterable[int]):
+        self._removed.update(user_ids)
+        if len(self._removed) >= self.delta_limit:
+            self._merge()
+
+    def search(self, prefix: str, limit: int) -> List[int]:
+        """Returns up to `limit` distinct user ids with a term starting with prefix."""
+        found: Dict[int, None] = {}
+        removed = self._removed
+        for term, user_id in heapq.merge(self._scan_main(prefix), self._scan_delta(prefix)):
+            if not term.startswith(prefix):
+                break
+            if user_id in removed:
+                continue
+            found[user_id] = None
+            if len(found) >= limit:
+                break
+        return list(found)
+
+    def _scan_main(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        terms, ids = self._terms, self._ids
+        for i in range(bisect_left(terms, prefix), len(terms)):
+            yield terms[i], ids[i]
+
+    def _scan_delta(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        delta = self._delta
+        for i in range(bisect_left(delta, (prefix,)), len(delta)):
+            yield delta[i]
+
+    def _merge(self):
+        removed = self._removed
+        merged = [entry for entry in heapq.merge(zip(self._terms, self._ids), self._delta) if entry[1] not in removed]
+        self._removed = set()
+        self._terms = [term for term, _ in merged]
+        self._ids = array("q", (user_id for _, user_id in merged))
+        self._delta = []
+
+    async def _load_since(self, after: int) -> Tuple[List[Tuple[str, int]], int]:
+        """Reads active users with an id above `after`; returns their entries and the last id read."""
+        entries = []
+        while True:
+            async with open_session() as db:
+                rows = await UserService(db).list_users(after, self.batch_size, SEARCH_RESULT_FIELDS, is_active=True)
+            for user_id, email, first_name, last_name in rows:
+                if user_id not in self._added and user_id not in self._removed:
+                    entries.extend((term, user_id) for term in user_terms(email, first_name, last_name))
+            if rows:
+                after = rows[-1][0]
+            if len(rows) < self.batch_size:
+                return entries, after
+            # Yield between batches so a cold start does not stall the event loop
+            await asyncio.sleep(0)
+
+    async def build(self):
+        start = time.perf_counter()
+        entries, loaded_through = await self._load_since(0)
+        entries.sort()
+        self._terms = [term for term, _ in entries]
+        self._ids = array("q", (user_id for _, user_id in entries))
+        self.loaded_through = loaded_through
+        self._added = {user_id for user_id in self._added if user_id > loaded_through}
+        self.ready = True
+        print(f"User search index built with {len(entries)} terms in {time.perf_counter() - start:.1f}s")
+
+    async def refresh(self) -> List[Tuple[str, int]]:
+        entries, loaded_through = await self._load_since(self.loaded_through)
+        for term, user_id in entries:
+            insort(self._delta, (term, user_id))
+        self.loaded_through = loaded_through
+        self._added = {user_id for user_id in self._added if user_id > loaded_through}
+        if len(self._delta) >= self.delta_limit:
+            self._merge()
+        return entries
+
+    async def _run(self):
+        while not self.ready:
+            try:
+                await self.build()
+            except Exception as e:
+                print(f"User search index build failed, retrying: {str(e)}")
+                await asyncio.sleep(self.refresh_seconds)
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                for term, _ in await self.refresh():
+                    search_cache.invalidate(term)
+            except Exception as e:
+                print(f"User search index refresh failed: {str(e)}")
+
+
+class SearchCache:
+    """LRU of serialized search responses for popular prefixes.
+
+    Entries expire after ttl_seconds; a new user also drops the cached results
+    of every prefix of its terms, so they show up at once on this worker.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[int, str]]]" = OrderedDict()
+
+        self.hits = metrics.counter("user_search_cache_hits")
+        self.misses = metrics.counter("user_search_cache_misses")
+
+    def get(self, prefix: str, limit: int) -> Optional[str]:
+        entry = self._entries.get(prefix)
+        if entry is None or entry[0] < time.monotonic() or limit not in entry[1]:
+            self.misses.inc()
+            return None
+        self._entries.move_to_end(prefix)
+        self.hits.inc()
+        return entry[1][limit]
+
+    def set(self, prefix: str, limit: int, body: str):
+        if self.max_size <= 0 or len(prefix) > MAX_CACHED_PREFIX:
+            return
+        entry = self._entries.get(prefix)
+        if entry is None or entry[0] < time.monotonic():
+            entry = self._entries[prefix] = (time.monotonic() + self.ttl_seconds, {})
+        entry[1][limit] = body
+        self._entries.move_to_end(prefix)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, term: str):
+        for length in range(1, min(len(term), MAX_CACHED_PREFIX) + 1):
+            self._entries.pop(term[:length], None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+user_index = UserPrefixIndex()
+search_cache = SearchCache(
+    max_size=settings.USER_SEARCH_CACHE_SIZE,
+    ttl_seconds=settings.USER_SEARCH_CACHE_TTL_SECONDS
+)
+
+
+def user_registered(user_id: int, email: str, first_name: Optional[str], last_name: Optional[str]):
+    """Makes a new user searchable on this worker straight away."""
+    if user_index.ready:
+        user_index.add(user_id, email, first_name, last_name)
+    for term in user_terms(email, first_name, last_name):
+        search_cache.invalidate(term)
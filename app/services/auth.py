@@ -1,59 +1,105 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, update, insert, literal, false
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
-from app.models import User, RefreshToken, VerificationToken, PasswordResetToken
+from app.models import User, RefreshToken, VerificationToken, PasswordResetToken, TokenRevocation
+from app.auth.hashing import password_hasher, password_rehasher
+from app.auth.revocation import revocations
+from app.auth.user_cache import user_cache
 from app.auth.security import (
-    verify_password,
-    get_password_hash,
     create_access_token,
     create_refresh_token,
-    verify_token
+    verify_token,
+    new_jti,
+    hash_token
 )
 from app.schemas.auth import UserCreate, LoginRequest
 from app.config.settings import settings
 from app.mailer.auth_mailer import AuthMailer
+from app.search.user_index import user_registered
 
 import secrets
+import time
+
+VERIFICATION_TOKEN_EXPIRE_HOURS = 24
 
 
 class AuthService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
         self.auth_mailer = AuthMailer()
 
-    def register_user(self, user_data: UserCreate) -> User:
-        # Check if user already exists
-        existing_user = self.db.query(User).filter(User.email == user_data.email).first()
-        if existing_user:
+    async def register_user(self, user_data: UserCreate) -> Row:
+        hashed_password = await password_hasher.hash(user_data.password)
+        token = self.generate_token()
+        expires_at = datetime.now(timezone.utc) + timedelta(hours=VERIFICATION_TOKEN_EXPIRE_HOURS)
+
+        # The unique index on email is the existence check, so concurrent
+        # signups for one address cannot both succeed
+        user = await self._insert_user(user_data, hashed_password, token, expires_at)
+        if user is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
 
-        # Create new user
-        hashed_password = get_password_hash(user_data.password)
-        user = User(
-            email=user_data.email,
-            hashed_password=hashed_password,
-            first_name=user_data.first_name,
-            last_name=user_data.last_name
-        )
-
-        self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
-
-        token = self.create_verification_token(user.id)
+        await self.db.commit()
+        user_registered(user.id, user.email, user.first_name, user.last_name)
         self.auth_mailer.send_verification_email(user.email, user.first_name, token)
 
         return user
 
-    def authenticate_user(self, login_data: LoginRequest) -> Tuple[User, str, str]:
-        user = self.db.query(User).filter(User.email == login_data.email).first()
+    async def _insert_user(self, user_data: UserCreate, hashed_password: str, token: str, expires_at: datetime) -> Optional[Row]:
+        """Insert the user and its verification token unless the email is taken.
+
+        Returns the new users row, or None when the email already exists.
+        Nothing is committed.
+        """
+        is_postgres = self.db.bind.dialect.name == "postgresql"
+        new_user = (
+            (postgresql.insert if is_postgres else sqlite.insert)(User.__table__)
+            .values(
+                email=user_data.email,
+                hashed_password=hashed_password,
+                first_name=user_data.first_name,
+                last_name=user_data.last_name,
+                # The model's Python-side defaults; not applied to an INSERT inside a CTE
+                is_active=True,
+                is_verified=False
+            )
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(*User.__table__.c)
+        )
+
+        if not is_postgres:
+            # No data-modifying CTEs; same transaction, separate statements
+            user = (await self.db.execute(new_user)).first()
+            if user is not None:
+                await self.db.execute(
+                    insert(VerificationToken.__table__).values(token_hash=hash_token(token), user_id=user.id, expires_at=expires_at)
+                )
+            return user
+
+        # Postgres: insert the user and its verification token in one statement
+        new_user = new_user.cte("new_user")
+        verification = (
+            insert(VerificationToken.__table__)
+            .from_select(
+                ["token_hash", "user_id", "expires_at"],
+                select(literal(hash_token(token)), new_user.c.id, literal(expires_at))
+            )
+            .cte("verification")
+        )
+        return (await self.db.execute(select(new_user).add_cte(verification))).first()
+
+    async def authenticate_user(self, login_data: LoginRequest) -> Tuple[User, str, str]:
+        user = await self.get_user_by_email(login_data.email)
 
-        if not user or not verify_password(login_data.password, user.hashed_password):
+        if not user or not await password_hasher.verify(login_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
@@ -65,86 +111,136 @@ class AuthService:
                 detail="Inactive user"
             )
 
+        # Legacy bcrypt hashes and Argon2 hashes at an old cost are upgraded in the background
+        if password_hasher.needs_rehash(user.hashed_password):
+            password_rehasher.schedule(user.id, login_data.password, user.hashed_password)
+
         # Create tokens
         access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
-        refresh_token = create_refresh_token(data={"sub": user.email, "user_id": user.id})
+        refresh_token = self._issue_refresh_token(user)
 
-        # Store refresh token
-        self._store_refresh_token(user.id, refresh_token)
+        await self.db.commit()
 
         return user, access_token, refresh_token
 
-    def _store_refresh_token(self, user_id: int, token: str):
-        expires_at = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    def _issue_refresh_token(self, user: User) -> str:
+        jti = new_jti()
 
-        refresh_token = RefreshToken(
-            user_id=user_id,
-            token=token,
-            expires_at=expires_at
+        # Stored by jti hash; added to the caller's transaction
+        self.db.add(RefreshToken(
+            user_id=user.id,
+            jti_hash=hash_token(jti),
+            expires_at=self._refresh_token_expiry()
+        ))
+
+        return create_refresh_token(data={"sub": user.email, "user_id": user.id, "jti": jti})
+
+    def _refresh_token_expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+    async def _rotate_refresh_token(self, old_jti: str, jti: str):
+        """Revoke the live token for old_jti and store jti for the same user.
+
+        Returns the (id, email, is_active) row of the token's owner, or None when
+        the old token is unknown, expired or already revoked. The new token is only
+        stored for active users. Nothing is committed.
+        """
+        expires_at = self._refresh_token_expiry()
+        revoked = (
+            update(RefreshToken)
+            .where(
+                RefreshToken.jti_hash == hash_token(old_jti),
+                RefreshToken.is_revoked == False,
+                RefreshToken.expires_at > datetime.utcnow()
+            )
+            .values(is_revoked=True)
+            .returning(RefreshToken.user_id)
         )
 
-        self.db.add(refresh_token)
-        self.db.commit()
+        if self.db.bind.dialect.name != "postgresql":
+            # No data-modifying CTEs; same transaction, separate statements
+            user_id = await self.db.scalar(revoked.execution_options(synchronize_session=False))
+            if user_id is None:
+                return None
+            user = (await self.db.execute(
+                select(User.id, User.email, User.is_active).where(User.id == user_id)
+            )).first()
+            if user is not None and user.is_active:
+                self.db.add(RefreshToken(user_id=user.id, jti_hash=hash_token(jti), expires_at=expires_at))
+            return user
+
+        # Postgres: revoke, load the owner and insert the replacement in one statement
+        revoked = revoked.cte("revoked")
+        owner = (
+            select(User.id, User.email, User.is_active)
+            .join(revoked, User.id == revoked.c.user_id)
+            .cte("owner")
+        )
+        replacement = (
+            insert(RefreshToken)
+            .from_select(
+                ["user_id", "jti_hash", "expires_at", "is_revoked"],
+                select(owner.c.id, literal(hash_token(jti)), literal(expires_at), false())
+                .where(owner.c.is_active == True)
+            )
+            .cte("replacement")
+        )
+        return (await self.db.execute(
+            select(owner.c.id, owner.c.email, owner.c.is_active).add_cte(replacement)
+        )).first()
 
     def generate_token(self) -> str:
         return secrets.token_urlsafe(32)
 
-    def create_verification_token(self, user_id: int, expires_hours: int = 24):
-        # Remove any existing tokens for this user
-        self.db.query(VerificationToken).filter(
-            VerificationToken.user_id == user_id
-        ).delete()
-
-        # Generate new token
-        token = self.generate_token()
-        expires_at = datetime.utcnow() + timedelta(hours=expires_hours)
-
-        # Store token
-        verification_token = VerificationToken(
-            token=token,
-            user_id=user_id,
-            expires_at=expires_at
-        )
-
-        self.db.add(verification_token)
-        self.db.commit()
-
-        return token
-
-    def verify_token(self, token: str):
-        verification_token = self.db.query(VerificationToken).filter(
-            VerificationToken.token == token
-        ).first()
+    async def verify_token(self, token: str):
+        # Token, expiry and owner in one locked lookup. The database compares
+        # the expiry, so SQLite's naive timestamps need no special casing.
+        row = (await self.db.execute(
+            select(
+                VerificationToken.id,
+                (VerificationToken.expires_at < datetime.now(timezone.utc)).label("expired"),
+                User.id.label("user_id"),
+                User.email,
+                User.first_name,
+                User.last_name
+            )
+            .outerjoin(User, User.id == VerificationToken.user_id)
+            .where(VerificationToken.token_hash == hash_token(token))
+            .with_for_update(of=VerificationToken)
+        )).first()
 
-        if not verification_token:
+        if not row:
             return {"success": False, "message": "Invalid token"}
 
-        if verification_token.expires_at < datetime.now(timezone.utc):
-            self.db.delete(verification_token)
-            self.db.commit()
+        if row.expired:
+            await self.db.execute(delete(VerificationToken).where(VerificationToken.id == row.id))
+            await self.db.commit()
             return {"success": False, "message": "Token expired"}
 
-        user = self.db.query(User).filter(User.id == verification_token.user_id).first()
-        if user:
-            user.is_verified = True
-            user.is_active = True
-
-            self.db.delete(verification_token)
-            self.db.commit()
+        if row.user_id is None:
+            return {"success": False, "message": "User not found"}
 
-            full_name = f"{user.first_name} {user.last_name}"
-            self.auth_mailer.send_welcome_email(full_name, user.email)
+        await self.db.execute(
+            update(User)
+            .where(User.id == row.user_id)
+            .values(is_verified=True, is_active=True)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.execute(delete(VerificationToken).where(VerificationToken.id == row.id))
+        await self.db.commit()
+        user_cache.invalidate(row.user_id)
 
-            return {"success": True, "message": "Email verified successfully"}
+        full_name = f"{row.first_name} {row.last_name}"
+        self.auth_mailer.send_welcome_email(full_name, row.email)
 
-        return {"success": False, "message": "User not found"}
+        return {"success": True, "message": "Email verified successfully"}
 
-    def forgot_password(self, user_email: str):
-        user, token = self.create_password_reset_token(user_email)
+    async def forgot_password(self, user_email: str):
+        user, token = await self.create_password_reset_token(user_email)
         self.auth_mailer.send_password_reset_email(user.email, user.first_name, token)
 
-    def create_password_reset_token(self, user_email: str, expires_hours: int = 2):
-        user = self.db.query(User).filter(User.email == user_email).first()
+    async def create_password_reset_token(self, user_email: str, expires_hours: int = 2):
+        user = await self.get_user_by_email(user_email)
         if not user or not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -154,123 +250,157 @@ class AuthService:
         token = self.generate_token()
         expires_at = datetime.now(timezone.utc) + timedelta(hours=expires_hours)
 
-        self.db.query(PasswordResetToken).filter(
-            PasswordResetToken.user_id == user.id,
-            PasswordResetToken.is_used == False
-        ).delete()
+        await self.db.execute(
+            delete(PasswordResetToken).where(
+                PasswordResetToken.user_id == user.id,
+                PasswordResetToken.is_used == False
+            )
+        )
 
         reset_token = PasswordResetToken(
-            token=token,
+            token_hash=hash_token(token),
             user_id=user.id,
             expires_at=expires_at,
             is_used=False
         )
 
         self.db.add(reset_token)
-        self.db.commit()
-        # self.db.refresh(reset_token)
+        await self.db.commit()
 
         return [user, token]
 
-    def reset_password(self, token: str, new_password: str):
-        validation_result = self.validate_reset_token(token)
-
-        if not validation_result["valid"]:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=validation_result["message"]
+    async def reset_password(self, token: str, new_password: str):
+        now = datetime.now(timezone.utc)
+        # One locked lookup for the token, its expiry and its owner; a second
+        # reset with the same token waits here and then finds it used
+        row = (await self.db.execute(
+            select(
+                PasswordResetToken.id,
+                (PasswordResetToken.expires_at < now).label("expired"),
+                User.id.label("user_id")
             )
-
-        reset_token = self.db.query(PasswordResetToken).filter(
-            PasswordResetToken.token == token
-        ).first()
-
-        if not reset_token:
+            .outerjoin(User, User.id == PasswordResetToken.user_id)
+            .where(
+                PasswordResetToken.token_hash == hash_token(token),
+                PasswordResetToken.is_used == False
+            )
+            .with_for_update(of=PasswordResetToken)
+        )).first()
+
+        if not row:
+            message = "Invalid or expired reset token"
+        elif row.expired:
+            message = "Reset token has expired"
+        elif row.user_id is None:
+            message = "User not found"
+        else:
+            message = None
+        if message is not None:
             raise HTTPException(
-                status_code=status.HTTP_404_BAD_REQUEST,
-                detail="Token not found"
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=message
             )
 
-        user = self.db.query(User).filter(User.id == reset_token.user_id).first()
-        if not user:
-            return {"success": False, "message": "User not found"}
-
-        hashed_password = get_password_hash(new_password)
-        user.hashed_password = hashed_password
-
-        reset_token.is_used = True
-        reset_token.used_at = datetime.now(timezone.utc)
-
-        self.db.commit()
-
-    def validate_reset_token(self, token: str):
-        reset_token = self.db.query(PasswordResetToken).filter(
-            PasswordResetToken.token == token,
-            PasswordResetToken.is_used == False
-        ).first()
-
-        if not reset_token:
-            return {"valid": False, "message": "Invalid or expired reset token"}
-
-        if reset_token.expires_at < datetime.now(timezone.utc):
-            return {"valid": False, "message": "Reset token has expired"}
-
-        # Get user
-        user = self.db.query(User).filter(User.id == reset_token.user_id).first()
-        if not user:
-            return {"valid": False, "message": "User not found"}
-
-        return {"valid": True, "message": "Reset Token valid"}
+        hashed_password = await password_hasher.hash(new_password)
+        await self.db.execute(
+            update(User)
+            .where(User.id == row.user_id)
+            .values(hashed_password=hashed_password)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.execute(
+            update(PasswordResetToken)
+            .where(PasswordResetToken.id == row.id)
+            .values(is_used=True, used_at=now)
+            .execution_options(synchronize_session=False)
+        )
 
-    def refresh_access_token(self, refresh_token: str) -> Tuple[str, str]:
+        revoked_before = await self.revoke_user_tokens(row.user_id)
+        await self.db.commit()
+        user_cache.invalidate(row.user_id)
+        revocations.revoke_user(row.user_id, revoked_before)
+
+    async def revoke_user_tokens(self, user_id: int) -> float:
+        """Revoke every refresh token of the user and every access token issued before now.
+
+        For password resets and deactivation. Nothing is committed; after the
+        commit, pass the returned time to revocations.revoke_user.
+        """
+        revoked_before = time.time()
+        await self.db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.user_id == user_id, RefreshToken.is_revoked == False)
+            .values(is_revoked=True)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.add(TokenRevocation(
+            user_id=user_id,
+            revoked_before=datetime.fromtimestamp(revoked_before, timezone.utc),
+            # Every access token issued before then has expired by now
+            expires_at=datetime.fromtimestamp(revoked_before, timezone.utc)
+            + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        ))
+        return revoked_before
+
+    async def refresh_access_token(self, refresh_token: str) -> Tuple[str, str]:
         payload = verify_token(refresh_token)
-        if not payload or payload.get("type") != "refresh":
+        if not payload or payload.get("type") != "refresh" or not payload.get("jti"):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid refresh token"
             )
 
-        # Check if token exists in database and is not revoked
-        token_record = self.db.query(RefreshToken).filter(
-            RefreshToken.token == refresh_token,
-            RefreshToken.is_revoked == False,
-            RefreshToken.expires_at > datetime.utcnow()
-        ).first()
+        # The conditional UPDATE is the reuse check: of two concurrent refreshes
+        # of the same token only one gets a row back
+        jti = new_jti()
+        user = await self._rotate_refresh_token(payload["jti"], jti)
 
-        if not token_record:
+        if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Refresh token not found or expired"
             )
 
-        # Get user
-        user = self.db.query(User).filter(User.id == token_record.user_id).first()
-        if not user or not user.is_active:
+        if not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found or inactive"
             )
 
-        # Create new tokens
-        new_access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
-        new_refresh_token = create_refresh_token(data={"sub": user.email, "user_id": user.id})
+        await self.db.commit()
 
-        # Revoke old refresh token and store new one
-        token_record.is_revoked = True
-        self._store_refresh_token(user.id, new_refresh_token)
-        self.db.commit()
+        new_access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
+        new_refresh_token = create_refresh_token(data={"sub": user.email, "user_id": user.id, "jti": jti})
 
         return new_access_token, new_refresh_token
 
-    def logout(self, refresh_token: str):
-        # Revoke the refresh token
-        token_record = self.db.query(RefreshToken).filter(
-            RefreshToken.token == refresh_token
-        ).first()
-
-        if token_record:
-            token_record.is_revoked = True
-            self.db.commit()
+    async def logout(self, refresh_token: str, access_token: Optional[str] = None):
+        payload = verify_token(refresh_token)
+        if payload and payload.get("type") == "refresh" and payload.get("jti"):
+            # Revoke the refresh token
+            await self.db.execute(
+                update(RefreshToken)
+                .where(RefreshToken.jti_hash == hash_token(payload["jti"]))
+                .values(is_revoked=True)
+                .execution_options(synchronize_session=False)
+            )
 
-    def get_user_by_email(self, email: str) -> Optional[User]:
-        return self.db.query(User).filter(User.email == email).first()
\ No newline at end of file
+        # Revoke the access token too, if the client sent it
+        access = verify_token(access_token) if access_token else None
+        revoke_access = (
+            access is not None and access.get("type") == "access" and access.get("jti")
+            and access.get("user_id") is not None and isinstance(access.get("exp"), (int, float))
+        )
+        if revoke_access:
+            self.db.add(TokenRevocation(
+                user_id=access["user_id"],
+                jti=access["jti"],
+                expires_at=datetime.fromtimestamp(access["exp"], timezone.utc)
+            ))
+
+        await self.db.commit()
+        if revoke_access:
+            revocations.revoke_token(access["jti"], access["exp"])
+
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        return await self.db.scalar(select(User).where(User.email == email))
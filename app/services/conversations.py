@@ -0,0 +1,93 @@
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Set
+from sqlalchemy import insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Conversation, ConversationParticipant, Message, User
+from app.schemas.chat import ConversationCreate
+
+HISTORY_FIELDS = {
+    "id": Message.id,
+    "seq": Message.seq,
+    "sender_id": Message.sender_id,
+    "body": Message.body,
+    "created_at": Message.created_at,
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def row_to_json(row: dict) -> str:
+    """Serializes a history row the way the history endpoint returns it."""
+    return json.dumps(row, default=_json_default)
+
+
+class ConversationService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_conversation(self, data: ConversationCreate, user_id: int) -> Conversation:
+        conversation = Conversation(title=data.title, created_by=user_id)
+        self.db.add(conversation)
+        await self.db.flush()
+        await self.db.execute(
+            insert(ConversationParticipant).from_select(
+                ["conversation_id", "user_id"],
+                select(literal(conversation.id), User.id).where(User.id.in_({user_id, *data.participant_ids}))
+            )
+        )
+        await self.db.commit()
+        await self.db.refresh(conversation)
+        return conversation
+
+    async def is_participant(self, conversation_id: int, user_id: int) -> bool:
+        return await self.db.get(ConversationParticipant, (conversation_id, user_id)) is not None
+
+    async def participating(self, conversation_ids: Iterable[int], user_id: int) -> Set[int]:
+        """Returns which of the given conversations the user takes part in, in one query."""
+        result = await self.db.execute(
+            select(ConversationParticipant.conversation_id).where(
+                ConversationParticipant.user_id == user_id,
+                ConversationParticipant.conversation_id.in_(list(conversation_ids))
+            )
+        )
+        return set(result.scalars().all())
+
+    async def get_messages(
+            self,
+            conversation_id: int,
+            before: Optional[int],
+            limit: int,
+            fields: Sequence[str]
+    ) -> List[dict]:
+        """Returns up to `limit` messages older than seq `before`, newest first.
+
+        Keyset pagination on (conversation_id, seq): every page costs the same
+        index range scan however deep it is, unlike OFFSET.
+        """
+        query = (
+            select(*(HISTORY_FIELDS[name] for name in fields))
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.seq.desc())
+            .limit(limit)
+        )
+        if before is not None:
+            query = query.where(Message.seq < before)
+        result = await self.db.execute(query)
+        return [dict(zip(fields, row)) for row in result.all()]
+
+    async def get_messages_after(self, conversation_id: int, after: int, limit: int) -> List[dict]:
+        """Returns up to `limit` full rows with a seq above `after`, oldest first."""
+        query = (
+            select(*HISTORY_FIELDS.values())
+            .where(Message.conversation_id == conversation_id, Message.seq > after)
+            .order_by(Message.seq)
+            .limit(limit)
+        )
+        result = await self.db.execute(query)
+        return [dict(zip(HISTORY_FIELDS, row)) for row in result.all()]
@@ -0,0 +1,81 @@
+from typing import List, Optional, Sequence
+from sqlalchemy import literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import User
+
+# Columns a directory listing may select; hashed_password is deliberately absent
+USER_FIELDS = {
+    "id": User.id,
+    "email": User.email,
+    "first_name": User.first_name,
+    "last_name": User.last_name,
+    "is_active": User.is_active,
+    "is_verified": User.is_verified,
+    "created_at": User.created_at,
+    "updated_at": User.updated_at,
+}
+DEFAULT_USER_FIELDS = ["id", "email", "first_name", "last_name", "is_active", "is_verified"]
+SEARCH_RESULT_FIELDS = ["id", "email", "first_name", "last_name"]
+
+# Written out literally so they match the expressions of the ix_users_search_trgm
+# GIN index; the full name term also covers first-name prefixes
+SEARCH_TERMS = [
+    literal_column("lower(coalesce(users.first_name, '') || ' ' || coalesce(users.last_name, ''))"),
+    literal_column("lower(users.last_name)"),
+    literal_column("lower(users.email)"),
+]
+
+
+def _like_prefix(prefix: str) -> str:
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class UserService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_users(
+            self,
+            after: Optional[int],
+            limit: int,
+            fields: Sequence[str],
+            is_active: Optional[bool] = None,
+            is_verified: Optional[bool] = None
+    ) -> List[tuple]:
+        """Returns up to `limit` users with an id above `after`, in id order.
+
+        Rows are plain column tuples in `fields` order rather than User
+        objects, and keyset pagination on the primary key keeps every page an
+        index range scan however deep it is.
+        """
+        query = select(*(USER_FIELDS[name] for name in fields)).order_by(User.id).limit(limit)
+        if after is not None:
+            query = query.where(User.id > after)
+        if is_active is not None:
+            query = query.where(User.is_active == is_active)
+        if is_verified is not None:
+            query = query.where(User.is_verified == is_verified)
+        result = await self.db.execute(query)
+        return [tuple(row) for row in result.all()]
+
+    async def search_users(self, prefix: str, limit: int) -> List[tuple]:
+        """Returns up to `limit` active users whose name or email starts with `prefix` (lowercase)."""
+        pattern = _like_prefix(prefix)
+        result = await self.db.execute(
+            select(*(USER_FIELDS[name] for name in SEARCH_RESULT_FIELDS))
+            .where(or_(*(term.like(pattern, escape="\\") for term in SEARCH_TERMS)), User.is_active == True)
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def get_users(self, user_ids: Sequence[int], fields: Sequence[str]) -> List[tuple]:
+        """Returns the active users among `user_ids`, in the order given."""
+        if not user_ids:
+            return []
+        result = await self.db.execute(
+            select(*(USER_FIELDS[name] for name in fields))
+            .where(User.id.in_(list(user_ids)), User.is_active == True)
+        )
+        rows = {row[0]: tuple(row) for row in result.all()}
+        return [rows[user_id] for user_id in user_ids if user_id in rows]
@@ -0,0 +1,194 @@
+"""Load test for the auth endpoints.
+
+Drives /auth/register, /auth/login, /me, /auth/refresh and /auth/logout and
+reports throughput, p50/p95/p99 latency and (in-process only) DB statements per
+request. A local SMTP sink absorbs outgoing mail.
+
+    python -m benchmarks.bench_auth --mode asgi --users 50 --requests 1000
+    python -m benchmarks.bench_auth --mode uvicorn --users 50 --requests 1000
+
+"asgi" runs the app in-process through httpx's ASGI transport. "uvicorn" starts
+a local uvicorn server (or targets --url) and goes over real HTTP. The database
+is DATABASE_URL, defaulting to a throwaway SQLite file.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from benchmarks.common import QueryCounter, print_table, reset_database, setup_environment, summarize, write_results
+
+setup_environment()
+
+import httpx  # noqa: E402
+
+from app.mailer.debug_server import DebugSMTPServer  # noqa: E402
+
+PASSWORD = "BenchPassw0rd"
+
+
+class Phase:
+    def __init__(self, counter: Optional[QueryCounter]):
+        self.counter = counter
+        self.samples: List[float] = []
+        self.errors = 0
+
+    async def run(self, calls: List[Callable], concurrency: int) -> Dict[str, float]:
+        queue = iter(calls)
+        return await self.run_lanes([queue] * concurrency)
+
+    async def run_lanes(self, lanes: List[Iterable[Callable]]) -> Dict[str, float]:
+        """Runs each lane's calls in order, with the lanes running concurrently."""
+        if self.counter:
+            self.counter.count = 0
+
+        async def worker(lane):
+            for call in lane:
+                t0 = time.perf_counter()
+                response = await call()
+                self.samples.append(time.perf_counter() - t0)
+                if response.status_code >= 400:
+                    self.errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(lane) for lane in lanes))
+        summary = summarize(self.samples, time.perf_counter() - start, self.counter.count if self.counter else None)
+        summary["errors"] = self.errors
+        return summary
+
+
+async def run_scenario(client: httpx.AsyncClient, args, counter: Optional[QueryCounter]) -> Dict[str, Dict[str, float]]:
+    run_id = int(time.time())
+    emails = [f"bench-{run_id}-{i}@example.com" for i in range(args.users)]
+    results = {}
+    tokens: Dict[str, dict] = {}
+
+    def register(email):
+        return lambda: client.post("/auth/register", json={"email": email, "password": PASSWORD, "first_name": "Bench"})
+
+    def login(email):
+        async def call():
+            response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+            if response.status_code == 200:
+                tokens[email] = response.json()
+            return response
+        return call
+
+    def me(email):
+        return lambda: client.get("/me", headers={"Authorization": f"Bearer {tokens[email]['access_token']}"})
+
+    def refresh(email):
+        async def call():
+            response = await client.post("/auth/refresh", json={"refresh_token": tokens[email]["refresh_token"]})
+            if response.status_code == 200:
+                tokens[email] = response.json()
+            return response
+        return call
+
+    def logout(email):
+        return lambda: client.post("/auth/logout", json={"refresh_token": tokens[email]["refresh_token"]})
+
+    results["register"] = await Phase(counter).run([register(e) for e in emails], args.concurrency)
+    results["login"] = await Phase(counter).run([login(e) for e in emails], args.concurrency)
+
+    # Spread the cheap endpoints over the logged-in users. A refresh consumes
+    # the previous token, so each user's refreshes stay in one lane
+    active = [e for e in emails if e in tokens]
+    cycle = list(itertools.islice(itertools.cycle(active), args.requests))
+    results["me"] = await Phase(counter).run([me(e) for e in cycle], args.concurrency)
+    rounds = max(1, args.requests // max(1, len(active)))
+    lanes = [
+        [refresh(e) for e in active[i::args.concurrency] for _ in range(rounds)]
+        for i in range(min(args.concurrency, len(active)))
+    ]
+    results["refresh"] = await Phase(counter).run_lanes(lanes)
+    results["logout"] = await Phase(counter).run([logout(e) for e in active], args.concurrency)
+    return results
+
+
+async def run_asgi(args) -> Dict[str, Dict[str, float]]:
+    reset_database()
+    from app.main import app
+
+    counter = QueryCounter()
+    counter.install()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_scenario(client, args, counter)
+
+
+async def wait_until_ready(url: str, server: Optional[asyncio.subprocess.Process], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if server is not None and server.returncode is not None:
+                raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+            try:
+                await client.get("/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start within {timeout}s")
+
+
+async def run_uvicorn(args) -> Dict[str, Dict[str, float]]:
+    server = None
+    url = args.url
+    if url is None:
+        reset_database()
+        url = f"http://127.0.0.1:{args.port}"
+        # Spawned from the event loop so the SMTP sink keeps serving while
+        # the server drains its mail queue on shutdown
+        server = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+            env=os.environ.copy()
+        )
+    try:
+        await wait_until_ready(url, server)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            return await run_scenario(client, args, None)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                await asyncio.wait_for(server.wait(), 30)
+            except asyncio.TimeoutError:
+                server.kill()
+                await server.wait()
+
+
+async def main(args):
+    smtp = DebugSMTPServer(port=int(os.environ["SMTP_PORT"]))
+    await smtp.start()
+    try:
+        if args.mode == "asgi":
+            results = await run_asgi(args)
+        else:
+            results = await run_uvicorn(args)
+    finally:
+        await smtp.stop()
+
+    print_table(results)
+    errors = {name: r["errors"] for name, r in results.items() if r["errors"]}
+    if errors:
+        print(f"errors: {errors}")
+    print(f"results written to {write_results(f'auth-{args.mode}', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--url", help="target an already running server instead of spawning uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000, help="requests for /me and /auth/refresh")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
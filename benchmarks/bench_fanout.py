@@ -0,0 +1,220 @@
+"""Chat fanout benchmark.
+
+Broadcasts messages into rooms of increasing size through the gateway's
+ConnectionRegistry, using in-memory sockets, and reports messages and
+deliveries per second and per-message fanout latency. It also reports the
+memory held per idle connection. "per_recipient" re-serializes the frame for
+every member, which is what the registry avoids. "one_stalled" adds a member
+whose socket never completes a send: fanout to the rest must not slow down,
+and the stalled socket's queue must stay within CHAT_SEND_QUEUE_MAX_BYTES
+until it is closed.
+
+The broker cases publish through the pub/sub layer and time each frame from
+publish to delivery: "local" stays in-process, "tcp" crosses two workers' brokers
+and an app.chat.broker_server.
+
+    python -m benchmarks.bench_fanout --sizes 10 100 1000 10000 --messages 200
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.common import print_table, setup_environment, summarize, write_results
+
+setup_environment()
+
+from app.auth.user_cache import CachedUser  # noqa: E402
+from app.chat.broker_server import BrokerServer  # noqa: E402
+from app.chat.connections import Connection, ConnectionRegistry, send_backlog  # noqa: E402
+from app.chat.gateway import encode  # noqa: E402
+from app.chat.pubsub import LocalBroker, NetworkBroker  # noqa: E402
+
+
+class NullSocket:
+    __slots__ = ("received",)
+
+    def __init__(self):
+        self.received = 0
+
+    async def send_text(self, data: str):
+        self.received += 1
+
+
+class StalledSocket:
+    """A client that stopped reading: sends never complete."""
+
+    async def send_text(self, data: str):
+        await asyncio.Event().wait()
+
+    async def close(self, code: int):
+        pass
+
+
+class TimingSocket:
+    """Records publish-to-delivery time from the frame's embedded timestamp."""
+
+    def __init__(self):
+        self.samples = []
+
+    async def send_text(self, data: str):
+        self.samples.append(time.time() - json.loads(data)["published_at"])
+
+
+def build_room(registry: ConnectionRegistry, size: int, room_id: int = 1, socket_factory=NullSocket):
+    for i in range(size):
+        user = CachedUser(id=i, email=f"user{i}@example.com", first_name=None, last_name=None, is_active=True, is_verified=True)
+        connection = Connection(socket_factory(), user)
+        registry.add(connection)
+        registry.join(connection, room_id)
+
+
+def frame(i: int) -> dict:
+    return {
+        "type": "message", "room": 1, "id": i, "seq": i, "sender_id": 1,
+        "body": f"message {i} " + "x" * 80, "created_at": datetime.now(timezone.utc).isoformat(), "client_id": None,
+    }
+
+
+async def fanout_once(size: int, messages: int) -> dict:
+    registry = ConnectionRegistry()
+    build_room(registry, size)
+    samples = []
+    start = time.perf_counter()
+    for i in range(messages):
+        t0 = time.perf_counter()
+        await registry.broadcast(1, encode(frame(i)))
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    summary = summarize(samples, elapsed)
+    summary["deliveries_per_sec"] = summary["throughput_per_sec"] * size
+    return summary
+
+
+async def fanout_per_recipient(size: int, messages: int) -> dict:
+    registry = ConnectionRegistry()
+    build_room(registry, size)
+    members = list(registry._rooms[1])
+    samples = []
+    start = time.perf_counter()
+    for i in range(messages):
+        t0 = time.perf_counter()
+        message = frame(i)
+        for connection in members:
+            await connection.send(json.dumps(message))
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    summary = summarize(samples, elapsed)
+    summary["deliveries_per_sec"] = summary["throughput_per_sec"] * size
+    return summary
+
+
+async def fanout_with_stalled(size: int, messages: int) -> dict:
+    registry = ConnectionRegistry()
+    build_room(registry, size - 1)
+    build_room(registry, 1, socket_factory=StalledSocket)
+    closed_before = send_backlog.slow_consumers.value
+    peak_bytes = 0
+    samples = []
+    start = time.perf_counter()
+    for i in range(messages):
+        t0 = time.perf_counter()
+        await registry.broadcast(1, encode(frame(i)))
+        samples.append(time.perf_counter() - t0)
+        peak_bytes = max(peak_bytes, send_backlog.bytes)
+    elapsed = time.perf_counter() - start
+    summary = summarize(samples, elapsed)
+    summary["deliveries_per_sec"] = summary["throughput_per_sec"] * size
+    summary["peak_queued_bytes"] = peak_bytes
+    summary["slow_consumers_closed"] = send_backlog.slow_consumers.value - closed_before
+    return summary
+
+
+async def broker_latency(kind: str, size: int, messages: int, burst: int) -> dict:
+    server = None
+    subscriber_registry = ConnectionRegistry()
+    if kind == "tcp":
+        server = BrokerServer(port=0)
+        await server.start()
+        publisher = NetworkBroker("127.0.0.1", server.port)
+        subscriber = NetworkBroker("127.0.0.1", server.port)
+        await publisher.start(ConnectionRegistry())
+        await subscriber.start(subscriber_registry)
+        await publisher.wait_connected()
+        await subscriber.wait_connected()
+    else:
+        publisher = subscriber = LocalBroker()
+        await subscriber.start(subscriber_registry)
+
+    build_room(subscriber_registry, size - 1)
+    probe = TimingSocket()
+    build_room(subscriber_registry, 1, socket_factory=lambda: probe)
+    await asyncio.sleep(0.05)  # let the subscription reach the server
+
+    start = time.perf_counter()
+    for i in range(messages):
+        publisher.publish(1, encode({"type": "message", "room": 1, "body": f"message {i}", "published_at": time.time()}))
+        if i % burst == burst - 1:
+            await asyncio.sleep(0)
+    while len(probe.samples) < messages and time.perf_counter() - start < 30:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    await publisher.stop()
+    if subscriber is not publisher:
+        await subscriber.stop()
+    if server is not None:
+        await server.stop()
+    summary = summarize(probe.samples, elapsed)
+    summary["deliveries_per_sec"] = summary["throughput_per_sec"] * size
+    return summary
+
+
+def idle_connection_bytes(count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    registry = ConnectionRegistry()
+    build_room(registry, count)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return allocated / count
+
+
+async def main(args):
+    results = {}
+    for size in args.sizes:
+        messages = max(10, args.messages * 100 // max(size, 100))
+        results[f"room_{size}_serialize_once"] = await fanout_once(size, messages)
+        results[f"room_{size}_per_recipient"] = await fanout_per_recipient(size, messages)
+        if size <= 1000:
+            results[f"room_{size}_one_stalled"] = await fanout_with_stalled(size, args.stalled_messages)
+        for kind in ("local", "tcp"):
+            results[f"room_{size}_broker_{kind}"] = await broker_latency(kind, size, messages, args.burst)
+
+    print_table(results)
+    print(f"{'case':<32}{'deliveries_per_sec':>20}")
+    for case, summary in results.items():
+        print(f"{case:<32}{summary['deliveries_per_sec']:>20.0f}")
+
+    for case, summary in results.items():
+        if "peak_queued_bytes" in summary:
+            print(f"{case}: peak queued {summary['peak_queued_bytes']:.0f} bytes, {summary['slow_consumers_closed']:.0f} slow consumer closed")
+
+    per_connection = idle_connection_bytes(args.idle_connections)
+    results["idle_connection"] = {"bytes_per_connection": per_connection}
+    print(f"idle connection overhead: {per_connection:.0f} bytes each (registry side, excluding the server's socket state)")
+    print(f"results written to {write_results('fanout', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--messages", type=int, default=200, help="messages per room of up to 100 members; scaled down for larger rooms")
+    parser.add_argument("--burst", type=int, default=10, help="publishes per event-loop tick in the broker cases")
+    parser.add_argument("--stalled-messages", type=int, default=6000, help="enough to fill the stalled socket's queue")
+    parser.add_argument("--idle-connections", type=int, default=20000)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
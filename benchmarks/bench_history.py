@@ -0,0 +1,123 @@
+"""Chat history paging benchmark.
+
+Seeds one conversation with many messages and fetches pages at increasing
+depths, comparing the keyset query behind GET /conversations/{id}/messages
+("before seq X, limit N") with the equivalent OFFSET query, and the first
+page read through the database with the same page served by the per-worker
+recent-message cache.
+
+    python -m benchmarks.bench_history --messages 1000000 --depths 0 1000 100000 900000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+
+from benchmarks.common import print_table, reset_database, setup_environment, summarize, write_results
+
+setup_environment()
+
+from app.auth.user_cache import CachedUser  # noqa: E402
+from app.chat.connections import Connection, ConnectionRegistry  # noqa: E402
+from app.chat.recent import RecentMessages  # noqa: E402
+from app.database import SessionLocal, dispose_engines, open_session  # noqa: E402
+from app.models import Conversation, Message, User  # noqa: E402
+from app.services.conversations import HISTORY_FIELDS, ConversationService  # noqa: E402
+
+SEED_BATCH = 10000
+
+
+def seed(messages: int) -> int:
+    reset_database()
+    with SessionLocal() as db:
+        user = User(email="history@example.com", hashed_password="x", is_active=True)
+        db.add(user)
+        db.flush()
+        conversation = Conversation(title="history", created_by=user.id, last_seq=messages)
+        db.add(conversation)
+        db.flush()
+        now = datetime.now(timezone.utc)
+        for start in range(1, messages + 1, SEED_BATCH):
+            db.execute(insert(Message), [
+                {"conversation_id": conversation.id, "seq": seq, "sender_id": user.id, "body": f"message {seq}", "created_at": now}
+                for seq in range(start, min(start + SEED_BATCH, messages + 1))
+            ])
+        db.commit()
+        return conversation.id
+
+
+async def page_latency(fetch, iterations: int) -> dict:
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fetch()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def main(args):
+    print(f"seeding {args.messages} messages")
+    conversation_id = seed(args.messages)
+    fields = ["seq", "sender_id", "body", "created_at"]
+    columns = [Message.seq, Message.sender_id, Message.body, Message.created_at]
+    results = {}
+
+    for depth in args.depths:
+        if depth >= args.messages:
+            continue
+        before = args.messages - depth + 1
+
+        async def keyset():
+            async with open_session() as db:
+                await ConversationService(db).get_messages(conversation_id, before, args.limit, fields)
+
+        async def offset():
+            async with open_session() as db:
+                result = await db.execute(
+                    select(*columns)
+                    .where(Message.conversation_id == conversation_id)
+                    .order_by(Message.seq.desc())
+                    .offset(depth)
+                    .limit(args.limit)
+                )
+                result.all()
+
+        results[f"depth_{depth}_keyset"] = await page_latency(keyset, args.iterations)
+        results[f"depth_{depth}_offset"] = await page_latency(offset, args.iterations)
+
+    # The cache only holds rooms with local sockets, so give the room one member
+    registry = ConnectionRegistry()
+    registry.join(Connection(None, CachedUser(id=1, email="history@example.com", first_name=None, last_name=None, is_active=True, is_verified=True)), conversation_id)
+    recent = RecentMessages(registry, room_capacity=args.limit)
+
+    async def first_page_db():
+        async with open_session() as db:
+            rows = await ConversationService(db).get_messages(conversation_id, None, args.limit, list(HISTORY_FIELDS))
+            return [(row["seq"], json.dumps(row, default=str)) for row in rows]
+
+    recent.track(conversation_id)
+    recent.prime(conversation_id, await first_page_db())
+
+    async def first_page_cached():
+        recent.page(conversation_id, None, args.limit)
+
+    results["first_page_db"] = await page_latency(first_page_db, args.iterations)
+    results["first_page_cached"] = await page_latency(first_page_cached, args.iterations)
+
+    await dispose_engines()
+    print_table(results)
+    print(f"results written to {write_results('history', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 100000, 190000])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
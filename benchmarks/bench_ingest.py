@@ -0,0 +1,118 @@
+"""Chat message ingest benchmark.
+
+Compares committing each message in its own transaction (allocating its seq
+and inserting it), as AuthService does for its writes, with the write-behind
+MessageWriter. Reports committed messages per second and, for the writer, the
+enqueue-to-commit lag. The lag bounds what a crash can lose.
+
+    python -m benchmarks.bench_ingest --messages 5000 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+
+from benchmarks.common import QueryCounter, print_table, reset_database, setup_environment, summarize, write_results
+
+setup_environment()
+
+from app.chat.writer import MessageWriter  # noqa: E402
+from app.database import SessionLocal, dispose_engines, open_session  # noqa: E402
+from app.models import Conversation, Message, User  # noqa: E402
+
+
+def seed() -> dict:
+    reset_database()
+    with SessionLocal() as db:
+        user = User(email="ingest@example.com", hashed_password="x", is_active=True)
+        db.add(user)
+        db.flush()
+        conversation = Conversation(title="ingest", created_by=user.id)
+        db.add(conversation)
+        db.commit()
+        return {"conversation_id": conversation.id, "sender_id": user.id}
+
+
+def row(ids: dict, i: int) -> dict:
+    return {**ids, "body": f"message {i}", "created_at": datetime.now(timezone.utc)}
+
+
+async def commit_per_message(ids: dict, messages: int, concurrency: int, counter: QueryCounter) -> dict:
+    pending = iter(range(messages))
+    samples = []
+    counter.count = 0
+
+    async def worker():
+        for i in pending:
+            t0 = time.perf_counter()
+            async with open_session() as db:
+                seq = await db.scalar(
+                    update(Conversation)
+                    .where(Conversation.id == ids["conversation_id"])
+                    .values(last_seq=Conversation.last_seq + 1)
+                    .returning(Conversation.last_seq)
+                )
+                db.add(Message(**row(ids, i), seq=seq))
+                await db.commit()
+            samples.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - start, counter.count)
+
+
+async def write_behind(ids: dict, messages: int, batch_size: int, interval_ms: int, counter: QueryCounter) -> dict:
+    writer = MessageWriter(batch_size=batch_size, flush_interval_ms=interval_ms, max_buffer=messages)
+    written_before = writer.written.value
+    lag_before = writer.lag.snapshot()
+    counter.count = 0
+    writer.start()
+
+    start = time.perf_counter()
+    samples = []
+    for i in range(messages):
+        t0 = time.perf_counter()
+        writer.enqueue(row(ids, i))
+        samples.append(time.perf_counter() - t0)
+        if i % 100 == 99:
+            await asyncio.sleep(0)  # let the writer run between bursts, like a busy gateway
+    while writer.written.value - written_before < messages:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    await writer.stop()
+
+    summary = summarize(samples, elapsed, counter.count)
+    lag = writer.lag.snapshot()
+    lag_count = lag["count"] - lag_before["count"]
+    summary["lag_avg_ms"] = (lag["total_seconds"] - lag_before["total_seconds"]) / lag_count * 1000 if lag_count else 0.0
+    summary["lag_max_ms"] = lag["max_seconds"] * 1000
+    return summary
+
+
+async def main(args):
+    ids = seed()
+    counter = QueryCounter()
+    counter.install()
+
+    results = {
+        "commit_per_message": await commit_per_message(ids, args.messages, args.concurrency, counter),
+        "write_behind": await write_behind(ids, args.messages, args.batch_size, args.interval_ms, counter),
+    }
+    await dispose_engines()
+
+    print_table(results)
+    lag = results["write_behind"]
+    print(f"write-behind enqueue-to-commit lag: avg {lag['lag_avg_ms']:.1f} ms, max {lag['lag_max_ms']:.1f} ms")
+    print(f"results written to {write_results('ingest', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent writers for commit_per_message")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--interval-ms", type=int, default=50)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
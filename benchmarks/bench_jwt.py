@@ -0,0 +1,68 @@
+"""JWT encode/decode micro-benchmark.
+
+Compares python-jose, which re-resolves the key and algorithm on every call,
+with the app's token engines (app.auth.tokens), whose keys are parsed once:
+
+    jose_*          python-jose with SECRET_KEY, as security.py used it
+    hs256_*         HmacTokenEngine
+    eddsa_*/es256_* KeyPairTokenEngine with a freshly generated key
+    verify_cached   security.verify_token on a token it has seen before
+
+    python -m benchmarks.bench_jwt --iterations 20000
+"""
+import argparse
+import time
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jose import jwt
+
+from benchmarks.common import print_table, setup_environment, timed_loop, write_results
+
+setup_environment()
+
+from app.auth import security  # noqa: E402
+from app.auth.tokens import HmacTokenEngine, KeyPairTokenEngine  # noqa: E402
+from app.config.settings import settings  # noqa: E402
+
+
+def claims() -> dict:
+    return {"sub": "bench@example.com", "user_id": 42, "type": "access", "exp": int(time.time()) + 3600}
+
+
+def engine_cases(name: str, engine, iterations: int) -> dict:
+    token = engine.encode(claims())
+    tampered = token[:-4] + ("AAAA" if not token.endswith("AAAA") else "BBBB")
+    return {
+        f"{name}_encode": timed_loop(lambda: engine.encode(claims()), iterations),
+        f"{name}_decode": timed_loop(lambda: engine.decode(token), iterations),
+        f"{name}_decode_invalid": timed_loop(lambda: engine.decode(tampered), iterations),
+    }
+
+
+def main(args):
+    results = {}
+
+    token = jwt.encode(claims(), settings.SECRET_KEY, algorithm="HS256")
+    results["jose_encode"] = timed_loop(lambda: jwt.encode(claims(), settings.SECRET_KEY, algorithm="HS256"), args.iterations)
+    results["jose_decode"] = timed_loop(lambda: jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"]), args.iterations)
+
+    results.update(engine_cases("hs256", HmacTokenEngine(settings.SECRET_KEY), args.iterations))
+    results.update(engine_cases("eddsa", KeyPairTokenEngine("EdDSA", ed25519.Ed25519PrivateKey.generate()), args.iterations))
+    results.update(engine_cases("es256", KeyPairTokenEngine("ES256", ec.generate_private_key(ec.SECP256R1())), args.iterations))
+
+    access_token = security.create_access_token({"sub": "bench@example.com", "user_id": 42})
+    security.verify_token(access_token)
+    results["verify_cached"] = timed_loop(lambda: security.verify_token(access_token), args.iterations)
+
+    print_table(results)
+    print(f"{'case':<32}{'ops_per_sec':>20}")
+    for case, summary in results.items():
+        print(f"{case:<32}{summary['throughput_per_sec']:>20.0f}")
+    print(f"results written to {write_results('jwt', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", help="path of the JSON results file")
+    main(parser.parse_args())
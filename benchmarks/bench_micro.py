@@ -0,0 +1,69 @@
+"""Micro-benchmarks for JWT handling, Argon2 and mail template rendering.
+
+    python -m benchmarks.bench_micro --iterations 5000
+"""
+import argparse
+
+import bcrypt
+
+from benchmarks.common import print_table, setup_environment, timed_loop, write_results
+
+setup_environment()
+
+from app.auth import security  # noqa: E402
+from app.mailer.auth_mailer import AuthMailer  # noqa: E402
+
+
+def jwt_cases(iterations: int) -> dict:
+    claims = {"sub": "bench@example.com", "user_id": 42}
+    access_token = security.create_access_token(claims)
+    return {
+        "jwt_encode_access": timed_loop(lambda: security.create_access_token(claims), iterations),
+        "jwt_encode_refresh": timed_loop(lambda: security.create_refresh_token(claims), iterations),
+        "jwt_decode": timed_loop(lambda: security.verify_token(access_token), iterations),
+        "jwt_decode_invalid": timed_loop(lambda: security.verify_token(access_token[:-2] + "xx"), iterations),
+    }
+
+
+def argon2_cases(iterations: int) -> dict:
+    hashed = security.get_password_hash("BenchPassw0rd")
+    legacy = bcrypt.hashpw(b"BenchPassw0rd", bcrypt.gensalt(12)).decode()
+    return {
+        "argon2_hash": timed_loop(lambda: security.get_password_hash("BenchPassw0rd"), iterations),
+        "argon2_verify": timed_loop(lambda: security.verify_password("BenchPassw0rd", hashed), iterations),
+        "argon2_needs_rehash": timed_loop(lambda: security.password_needs_rehash(hashed), iterations * 100),
+        "bcrypt_verify_legacy": timed_loop(lambda: security.verify_password("BenchPassw0rd", legacy), iterations),
+    }
+
+
+def template_cases(iterations: int) -> dict:
+    context = {
+        "user_name": "Bench",
+        "verification_url": "http://localhost:3000/auth/verify-email?token=abc",
+        "expiry_hours": 24,
+        "support_url": "http://localhost:3000/support",
+    }
+    return {
+        "mailer_init": timed_loop(AuthMailer, iterations),
+        "render_verification_email": timed_loop(
+            lambda: AuthMailer().render("verification_email.html", dict(context)), iterations
+        ),
+    }
+
+
+def main(args):
+    results = {}
+    results.update(jwt_cases(args.iterations))
+    results.update(argon2_cases(args.argon2_iterations))
+    results.update(template_cases(args.iterations))
+
+    print_table(results)
+    print(f"results written to {write_results('micro', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--argon2-iterations", type=int, default=20)
+    parser.add_argument("--output", help="path of the JSON results file")
+    main(parser.parse_args())
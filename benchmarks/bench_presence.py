@@ -0,0 +1,178 @@
+"""Presence benchmark at a large number of online users.
+
+Connects --users users to one worker's presence table and measures:
+
+    heartbeat         recording one heartbeat
+    tick              one announcement tick with --churn of the users changing status
+    sweep             the periodic scan for users whose heartbeats stopped
+    fanout            delivering one tick's announcements to watching sockets
+    lookup            GET /presence for --lookup-ids ids, half of them offline
+    flush             writing last_seen_at for every user in batched UPDATEs
+    update_per_beat   the naive alternative: one UPDATE per heartbeat
+
+It also reports the memory held per online user.
+
+    python -m benchmarks.bench_presence --users 100000
+"""
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+
+from sqlalchemy import insert, update
+
+from benchmarks.common import QueryCounter, print_table, reset_database, setup_environment, summarize, timed_loop, write_results
+
+setup_environment()
+
+from app.chat.connections import Connection, ConnectionRegistry  # noqa: E402
+from app.chat.presence import PresenceService  # noqa: E402
+from app.chat.pubsub import LocalBroker  # noqa: E402
+from app.database import SessionLocal, dispose_engines, open_session  # noqa: E402
+from app.models import User  # noqa: E402
+
+SEED_BATCH = 10000
+
+
+class FakeSocket:
+    headers = {}
+
+    def __init__(self):
+        self.frames = 0
+
+    async def send_text(self, data: str):
+        self.frames += 1
+
+
+def seed(users: int):
+    reset_database()
+    with SessionLocal() as db:
+        for start in range(0, users, SEED_BATCH):
+            db.execute(insert(User), [
+                {"email": f"presence{i}@example.com", "hashed_password": "x", "is_active": True}
+                for i in range(start, min(start + SEED_BATCH, users))
+            ])
+        db.commit()
+
+
+async def timed_async(fn, iterations: int, counter: QueryCounter = None) -> dict:
+    samples = []
+    queries = counter.count if counter else 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return summarize(samples, elapsed, counter.count - queries if counter else None)
+
+
+async def main(args):
+    print(f"seeding {args.users} users")
+    seed(args.users)
+    counter = QueryCounter()
+    counter.install()
+    rng = random.Random(42)
+    user_ids = list(range(1, args.users + 1))
+
+    broker = LocalBroker()
+    registry = ConnectionRegistry()
+    await broker.start(registry)
+    # No debounce, and sweeps only when a case asks for one
+    service = PresenceService(broker, debounce_seconds=0, sweep_seconds=3600, last_seen_resolution=0)
+    broker.add_observer(service)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user_id in user_ids:
+        service.connected(user_id)
+    bytes_per_user = (tracemalloc.get_traced_memory()[0] - before) / args.users
+    tracemalloc.stop()
+    service.tick()
+    await asyncio.sleep(0)
+
+    results = {}
+    results["heartbeat"] = timed_loop(lambda: service.heartbeat(rng.choice(user_ids)), args.heartbeats)
+
+    churn = max(1, int(args.users * args.churn))
+
+    def tick():
+        for user_id in rng.sample(user_ids, churn):
+            service.heartbeat(user_id, away=rng.random() < 0.5)
+        service.tick()
+    results["tick"] = timed_loop(tick, args.ticks)
+
+    def sweep():
+        service._next_sweep = 0
+        service.tick()
+    results["sweep"] = timed_loop(sweep, args.ticks)
+
+    # Deliver what the cases above published before anyone watches
+    await asyncio.sleep(1)
+
+    # Sockets that each watch a few hundred users, as a contact list would
+    sockets = [FakeSocket() for _ in range(args.watchers)]
+    for socket in sockets:
+        service.watch(Connection(socket, None), rng.sample(user_ids, args.watched))
+    # Collect the setup garbage now rather than inside the first sample
+    gc.collect()
+
+    async def fanout():
+        tick()
+        # Let the broker deliver the announcement and the fan-out task run
+        for _ in range(3):
+            await asyncio.sleep(0)
+    results["fanout"] = await timed_async(fanout, args.ticks)
+    frames = sum(socket.frames for socket in sockets)
+
+    # Half of the ids are online and answered from memory
+    offline = list(range(args.users + 1, args.users + 1 + args.lookup_ids // 2))
+    for user_id in rng.sample(user_ids, args.lookup_ids // 2):
+        service.disconnected(user_id)
+    service.tick()
+
+    async def lookup():
+        ids = rng.sample(user_ids, args.lookup_ids - len(offline)) + offline
+        async with open_session() as db:
+            await service.lookup(ids, db)
+    results["lookup"] = await timed_async(lookup, args.lookups, counter)
+
+    for slot in range(len(service._persisted)):
+        service._persisted[slot] = 0.0
+    queries = counter.count
+    t0 = time.perf_counter()
+    written = await service.flush()
+    flush_seconds = time.perf_counter() - t0
+    results["flush"] = summarize([flush_seconds], flush_seconds, counter.count - queries)
+    results["flush"]["rows"] = written
+
+    async def update_per_beat():
+        async with open_session() as db:
+            await db.execute(update(User).where(User.id == rng.choice(user_ids)).values(last_seen_at=None))
+            await db.commit()
+    results["update_per_beat"] = await timed_async(update_per_beat, args.naive_updates, counter)
+
+    await broker.stop()
+    results["memory"] = {"bytes_per_user": bytes_per_user, "fanout_frames": frames}
+    await dispose_engines()
+    print_table({case: summary for case, summary in results.items() if "p99_ms" in summary})
+    print(f"{bytes_per_user:.0f} bytes per online user; flush wrote {written} rows in "
+          f"{results['flush']['queries_per_op']:.0f} statements ({flush_seconds:.2f}s); {frames} fan-out frames")
+    print(f"results written to {write_results('presence', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--heartbeats", type=int, default=200000)
+    parser.add_argument("--churn", type=float, default=0.01, help="share of users changing status per tick")
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--watchers", type=int, default=1000)
+    parser.add_argument("--watched", type=int, default=200, help="users watched per socket")
+    parser.add_argument("--lookup-ids", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--naive-updates", type=int, default=500)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
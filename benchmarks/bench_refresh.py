@@ -0,0 +1,131 @@
+"""Refresh-token rotation throughput: the pre-rotation query shape vs AuthService.
+
+    python -m benchmarks.bench_refresh --iterations 2000 --concurrency 8
+
+"legacy" replays the old flow (SELECT token, SELECT user, UPDATE + INSERT in a
+commit, then a second commit). "rotation" is AuthService.refresh_access_token.
+Set DATABASE_URL to a Postgres database to measure the single-statement CTE;
+on SQLite the service falls back to UPDATE ... RETURNING plus a user SELECT.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from benchmarks.common import QueryCounter, print_table, reset_database, setup_environment, summarize, write_results
+
+setup_environment()
+
+from datetime import datetime  # noqa: E402
+
+from fastapi import HTTPException  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.auth.security import create_access_token, create_refresh_token, hash_token, new_jti, verify_token  # noqa: E402
+from app.database import dispose_engines, open_session  # noqa: E402
+from app.models import RefreshToken, User  # noqa: E402
+from app.services.auth import AuthService  # noqa: E402
+
+
+async def legacy_refresh(db, refresh_token: str):
+    payload = verify_token(refresh_token)
+    token_record = await db.scalar(
+        select(RefreshToken).where(
+            RefreshToken.jti_hash == hash_token(payload["jti"]),
+            RefreshToken.is_revoked == False,
+            RefreshToken.expires_at > datetime.utcnow()
+        )
+    )
+    if not token_record:
+        raise HTTPException(status_code=401, detail="Refresh token not found or expired")
+
+    user = await db.scalar(select(User).where(User.id == token_record.user_id))
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+
+    access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
+    jti = new_jti()
+    refresh = create_refresh_token(data={"sub": user.email, "user_id": user.id, "jti": jti})
+
+    token_record.is_revoked = True
+    db.add(RefreshToken(user_id=user.id, jti_hash=hash_token(jti), expires_at=AuthService(db)._refresh_token_expiry()))
+    await db.commit()
+    await db.commit()
+    return access_token, refresh
+
+
+async def rotation_refresh(db, refresh_token: str):
+    return await AuthService(db).refresh_access_token(refresh_token)
+
+
+_user_ids = itertools.count()
+
+
+async def issue_tokens(count: int):
+    async with open_session() as db:
+        user = User(email=f"refresh-bench-{next(_user_ids)}@example.com", hashed_password="x", is_active=True)
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        tokens = [AuthService(db)._issue_refresh_token(user) for _ in range(count)]
+        await db.commit()
+    return tokens
+
+
+async def run_chain(refresh, token: str, iterations: int, samples: list):
+    for _ in range(iterations):
+        async with open_session() as db:
+            t0 = time.perf_counter()
+            _, token = await refresh(db, token)
+            samples.append(time.perf_counter() - t0)
+
+
+async def double_spend(refresh, attempts: int) -> int:
+    """Refresh the same token twice concurrently; count how many pairs both succeeded."""
+    both = 0
+    for token in await issue_tokens(attempts):
+        async def attempt():
+            async with open_session() as db:
+                try:
+                    await refresh(db, token)
+                    return True
+                except HTTPException:
+                    return False
+        results = await asyncio.gather(attempt(), attempt())
+        both += all(results)
+    return both
+
+
+async def bench(name: str, refresh, iterations: int, concurrency: int, counter: QueryCounter) -> dict:
+    reset_database()
+    tokens = await issue_tokens(concurrency)
+    samples = []
+    counter.count = 0
+    start = time.perf_counter()
+    await asyncio.gather(*(run_chain(refresh, t, iterations // concurrency, samples) for t in tokens))
+    summary = summarize(samples, time.perf_counter() - start, counter.count)
+    summary["double_spend_successes"] = await double_spend(refresh, 20)
+    return summary
+
+
+async def main(args):
+    counter = QueryCounter()
+    counter.install()
+    results = {}
+    try:
+        for name, refresh in (("legacy", legacy_refresh), ("rotation", rotation_refresh)):
+            results[name] = await bench(name, refresh, args.iterations, args.concurrency, counter)
+    finally:
+        await dispose_engines()
+
+    print_table(results)
+    print(f"double-spend successes (of 20): " + ", ".join(f"{k}={v['double_spend_successes']}" for k, v in results.items()))
+    print(f"results written to {write_results('refresh', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
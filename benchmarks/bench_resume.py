@@ -0,0 +1,152 @@
+"""Reconnect storm benchmark.
+
+Simulates every client of a worker reconnecting at once (as after a deploy:
+empty user cache, no rooms open, nothing in the recent-message cache) and
+compares the two ways a client can catch up:
+
+    reload  authenticate with the access token, join each room and fetch its
+            first history page
+    resume  authenticate with the access token plus the resume token and send
+            one resume frame with the last seq seen per room
+
+Reports reconnects per second and database statements per reconnect.
+
+    python -m benchmarks.bench_resume --clients 2000 --rooms 200 --rooms-per-client 5
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from benchmarks.common import QueryCounter, print_table, reset_database, setup_environment, summarize, write_results
+
+setup_environment()
+
+from app.auth.security import create_access_token  # noqa: E402
+from app.auth.user_cache import user_cache  # noqa: E402
+from app.chat.connections import Connection, connection_registry  # noqa: E402
+from app.chat.gateway import authenticate, encode, handle_frame  # noqa: E402
+from app.chat.recent import recent_messages  # noqa: E402
+from app.chat.resume import create_resume_token  # noqa: E402
+from app.database import SessionLocal, dispose_engines, open_session  # noqa: E402
+from app.models import Conversation, ConversationParticipant, Message, User  # noqa: E402
+from app.routers.conversations import _read_page  # noqa: E402
+from app.services.conversations import HISTORY_FIELDS, ConversationService  # noqa: E402
+
+
+class FakeSocket:
+    headers = {}
+
+    async def send_text(self, data: str):
+        pass
+
+
+def client_rooms(i: int, args) -> list:
+    return [(i * args.rooms_per_client + j) % args.rooms + 1 for j in range(args.rooms_per_client)]
+
+
+def seed(users: int, rooms: int, messages: int, participants: set):
+    reset_database()
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"email": f"resume{i}@example.com", "hashed_password": "x", "is_active": True} for i in range(users)
+        ])
+        db.execute(insert(Conversation), [
+            {"title": f"room {i}", "created_by": 1, "last_seq": messages} for i in range(rooms)
+        ])
+        db.execute(insert(Message), [
+            {"conversation_id": room, "seq": seq, "sender_id": 1, "body": f"message {seq}", "created_at": now}
+            for room in range(1, rooms + 1) for seq in range(1, messages + 1)
+        ])
+        db.execute(insert(ConversationParticipant), [
+            {"conversation_id": room, "user_id": user_id} for room, user_id in participants
+        ])
+        db.commit()
+
+
+def cold_start():
+    for connection in list(connection_registry._connections):
+        connection_registry.remove(connection)
+    user_cache.clear()
+    recent_messages.clear()
+
+
+async def reload(client: dict):
+    user, _ = await authenticate(FakeSocket(), client["token"])
+    connection = Connection(FakeSocket(), user)
+    connection_registry.add(connection)
+    for room_id in client["rooms"]:
+        await handle_frame(connection, encode({"type": "join", "room": room_id}))
+        async with open_session() as db:
+            await _read_page(ConversationService(db), room_id, user.id, None, 50, list(HISTORY_FIELDS))
+
+
+async def resume(client: dict):
+    user, _ = await authenticate(FakeSocket(), client["token"], client["resume_token"])
+    connection = Connection(FakeSocket(), user)
+    connection_registry.add(connection)
+    await handle_frame(connection, json.dumps({"type": "resume", "rooms": client["last_seen"]}))
+
+
+async def storm(reconnect, clients: list, concurrency: int, counter: QueryCounter) -> dict:
+    cold_start()
+    pending = iter(clients)
+    samples = []
+    counter.count = 0
+
+    async def lane():
+        for client in pending:
+            t0 = time.perf_counter()
+            await reconnect(client)
+            samples.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(lane() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - start, counter.count)
+
+
+async def main(args):
+    print(f"seeding {args.rooms} rooms of {args.messages} messages")
+    participants = {(room_id, i % args.users + 1) for i in range(args.clients) for room_id in client_rooms(i, args)}
+    seed(args.users, args.rooms, args.messages, participants)
+    expires_at = int(time.time()) + 3600
+    clients = []
+    for i in range(args.clients):
+        user_id = i % args.users + 1
+        token = create_access_token({"sub": f"resume{user_id - 1}@example.com", "user_id": user_id})
+        user, _ = await authenticate(FakeSocket(), token)
+        rooms = client_rooms(i, args)
+        clients.append({
+            "token": token,
+            "resume_token": create_resume_token(user, expires_at),
+            "rooms": rooms,
+            "last_seen": {str(room_id): args.messages - args.missed for room_id in rooms},
+        })
+
+    counter = QueryCounter()
+    counter.install()
+    results = {
+        "reload": await storm(reload, clients, args.concurrency, counter),
+        "resume": await storm(resume, clients, args.concurrency, counter),
+    }
+    cold_start()
+    await dispose_engines()
+    print_table(results)
+    print(f"results written to {write_results('resume', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--rooms-per-client", type=int, default=5)
+    parser.add_argument("--messages", type=int, default=200, help="messages already in each room")
+    parser.add_argument("--missed", type=int, default=5, help="messages each client missed per room")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
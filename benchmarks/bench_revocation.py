@@ -0,0 +1,113 @@
+"""Access-token revocation benchmark.
+
+Stores --jtis revoked access tokens and --users revoked_before rows, then
+measures:
+
+    load              rebuilding the in-memory list from token_revocations
+    check_valid       is_revoked for a token that is not revoked (every request)
+    check_jti         is_revoked for a revoked jti
+    check_user        is_revoked for a token issued before its user's revoked_before
+    dict_only         the exact-dict lookup alone, without the Bloom filter
+    db_query          a floor for the alternative: one primary-key SELECT per request
+
+It also reports the Bloom filter's size and measured false-positive rate.
+
+    python -m benchmarks.bench_revocation --jtis 100000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+
+from benchmarks.common import QueryCounter, print_table, reset_database, setup_environment, summarize, timed_loop, write_results
+
+setup_environment()
+
+from app.auth.revocation import LocalRevocationChannel, RevocationList  # noqa: E402
+from app.auth.security import new_jti  # noqa: E402
+from app.database import SessionLocal, dispose_engines, open_session  # noqa: E402
+from app.models import TokenRevocation  # noqa: E402
+
+SEED_BATCH = 10000
+
+
+def seed(jtis: list, users: int):
+    reset_database()
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
+    revoked_before = datetime.now(timezone.utc)
+    rows = [{"user_id": i % 1000 + 1, "jti": jti, "expires_at": expires_at} for i, jti in enumerate(jtis)]
+    rows += [{"user_id": user_id, "revoked_before": revoked_before, "expires_at": expires_at}
+             for user_id in range(1, users + 1)]
+    with SessionLocal() as db:
+        for start in range(0, len(rows), SEED_BATCH):
+            db.execute(insert(TokenRevocation), rows[start:start + SEED_BATCH])
+        db.commit()
+
+
+async def main(args):
+    rng = random.Random(42)
+    revoked = [new_jti() for _ in range(args.jtis)]
+    print(f"seeding {args.jtis} revoked jtis and {args.users} revoked users")
+    seed(revoked, args.users)
+    counter = QueryCounter()
+    counter.install()
+
+    revocations = RevocationList(LocalRevocationChannel())
+    t0 = time.perf_counter()
+    await revocations.load()
+    load_seconds = time.perf_counter() - t0
+
+    now = int(time.time())
+    valid = [{"user_id": args.users + 1 + i, "jti": new_jti(), "iat": now} for i in range(1000)]
+    revoked_claims = [{"user_id": args.users + 1, "jti": jti, "iat": now} for jti in rng.sample(revoked, 1000)]
+    revoked_users = [{"user_id": rng.randint(1, args.users), "jti": new_jti(), "iat": now - 60} for _ in range(1000)]
+
+    results = {"load": summarize([load_seconds], load_seconds)}
+    results["check_valid"] = timed_loop(lambda: revocations.is_revoked(rng.choice(valid)), args.iterations)
+    results["check_jti"] = timed_loop(lambda: revocations.is_revoked(rng.choice(revoked_claims)), args.iterations)
+    results["check_user"] = timed_loop(lambda: revocations.is_revoked(rng.choice(revoked_users)), args.iterations)
+    jtis = revocations._jtis
+    results["dict_only"] = timed_loop(lambda: rng.choice(valid)["jti"] in jtis, args.iterations)
+
+    async def db_query():
+        async with open_session() as db:
+            await db.scalar(select(TokenRevocation.id).where(TokenRevocation.id == rng.randint(1, args.jtis)))
+    samples = []
+    queries = counter.count
+    start = time.perf_counter()
+    for _ in range(args.db_queries):
+        t0 = time.perf_counter()
+        await db_query()
+        samples.append(time.perf_counter() - t0)
+    results["db_query"] = summarize(samples, time.perf_counter() - start, counter.count - queries)
+
+    assert not any(revocations.is_revoked(claims) for claims in valid)
+    assert all(revocations.is_revoked(claims) for claims in revoked_claims + revoked_users)
+    probes = [new_jti() for _ in range(args.probes)]
+    false_positives = sum(1 for jti in probes if jti in revocations._bloom)
+    bloom = revocations._bloom
+    results["bloom"] = {
+        "bits": bloom.num_bits, "hashes": bloom.num_hashes, "bytes": bloom.size_bytes,
+        "false_positive_rate": false_positives / args.probes,
+    }
+
+    await dispose_engines()
+    print_table({case: summary for case, summary in results.items() if "p99_ms" in summary})
+    print(f"loaded {len(revocations._jtis)} jtis and {len(revocations._revoked_before)} users in {load_seconds:.2f}s; "
+          f"Bloom filter {bloom.size_bytes / 1024:.0f} KiB, {bloom.num_hashes} hashes, "
+          f"false positives {false_positives}/{args.probes}")
+    print(f"results written to {write_results('revocation', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jtis", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--db-queries", type=int, default=2000)
+    parser.add_argument("--probes", type=int, default=100000, help="unrevoked jtis tested against the Bloom filter")
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""User search (@-mention autocomplete) benchmark.
+
+Seeds many users and runs prefix searches of 1 to 4 characters three ways:
+through SQL (the ix_users_search_trgm GIN index on Postgres; a table scan on
+SQLite), through the in-memory prefix index plus a primary-key fetch, and
+from the prefix result cache. Also reports how long the index takes to build.
+
+    python -m benchmarks.bench_search --users 1000000
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+
+from sqlalchemy import insert
+
+from benchmarks.common import print_table, reset_database, setup_environment, summarize, write_results
+
+setup_environment()
+
+from app.database import SessionLocal, dispose_engines, open_session  # noqa: E402
+from app.models import User  # noqa: E402
+from app.search.user_index import SearchCache, UserPrefixIndex  # noqa: E402
+from app.services.users import SEARCH_RESULT_FIELDS, UserService  # noqa: E402
+
+SEED_BATCH = 10000
+
+
+def name(rng: random.Random) -> str:
+    return rng.choice(string.ascii_uppercase) + "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+
+
+def seed(users: int):
+    reset_database()
+    rng = random.Random(42)
+    with SessionLocal() as db:
+        for start in range(0, users, SEED_BATCH):
+            rows = []
+            for i in range(start, min(start + SEED_BATCH, users)):
+                first, last = name(rng), name(rng)
+                rows.append({
+                    "email": f"{first.lower()}.{last.lower()}{i}@example.com", "hashed_password": "x",
+                    "first_name": first, "last_name": last, "is_active": True,
+                })
+            db.execute(insert(User), rows)
+        db.commit()
+
+
+async def latency(search, prefixes, limit: int) -> dict:
+    samples = []
+    start = time.perf_counter()
+    for prefix in prefixes:
+        t0 = time.perf_counter()
+        await search(prefix, limit)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def main(args):
+    print(f"seeding {args.users} users")
+    seed(args.users)
+    rng = random.Random(7)
+    prefixes = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 4))) for _ in range(args.searches)]
+
+    index = UserPrefixIndex()
+    t0 = time.perf_counter()
+    await index.build()
+    build_seconds = time.perf_counter() - t0
+    cache = SearchCache(max_size=10000, ttl_seconds=3600)
+
+    async def sql(prefix, limit):
+        async with open_session() as db:
+            await UserService(db).search_users(prefix, limit)
+
+    async def in_memory(prefix, limit):
+        async with open_session() as db:
+            await UserService(db).get_users(index.search(prefix, limit), SEARCH_RESULT_FIELDS)
+
+    async def lookup_only(prefix, limit):
+        index.search(prefix, limit)
+
+    async def cached(prefix, limit):
+        if cache.get(prefix, limit) is None:
+            cache.set(prefix, limit, "{}")
+
+    results = {
+        "sql": await latency(sql, prefixes[:args.sql_searches], args.limit),
+        "prefix_index": await latency(in_memory, prefixes, args.limit),
+        "prefix_index_lookup_only": await latency(lookup_only, prefixes, args.limit),
+        "cached": await latency(cached, prefixes, args.limit),
+    }
+    results["index_build"] = {"seconds": build_seconds, "terms": len(index)}
+    await dispose_engines()
+    print_table({case: summary for case, summary in results.items() if "p99_ms" in summary})
+    print(f"index built in {build_seconds:.1f}s with {len(index)} terms")
+    print(f"results written to {write_results('search', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument("--sql-searches", type=int, default=200, help="SQL is slow without the trigram index, so run fewer")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
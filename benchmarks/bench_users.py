@@ -0,0 +1,87 @@
+"""User directory paging benchmark.
+
+Seeds many users and fetches pages at increasing depths, comparing the keyset
+query behind GET /users/ ("after id X, limit N", column tuples) with OFFSET
+paging over full User objects, the way a naive listing would load them.
+
+    python -m benchmarks.bench_users --users 1000000 --depths 0 1000 100000 900000
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import insert, select
+
+from benchmarks.common import print_table, reset_database, setup_environment, summarize, write_results
+
+setup_environment()
+
+from app.database import SessionLocal, dispose_engines, open_session  # noqa: E402
+from app.models import User  # noqa: E402
+from app.services.users import DEFAULT_USER_FIELDS, UserService  # noqa: E402
+
+SEED_BATCH = 10000
+
+
+def seed(users: int):
+    reset_database()
+    with SessionLocal() as db:
+        for start in range(0, users, SEED_BATCH):
+            db.execute(insert(User), [
+                {
+                    "email": f"user{i}@example.com", "hashed_password": "$argon2id$" + "x" * 87,
+                    "first_name": f"First{i}", "last_name": f"Last{i}", "is_active": i % 10 != 0, "is_verified": i % 3 == 0,
+                }
+                for i in range(start, min(start + SEED_BATCH, users))
+            ])
+        db.commit()
+
+
+async def page_latency(fetch, iterations: int) -> dict:
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fetch()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def main(args):
+    print(f"seeding {args.users} users")
+    seed(args.users)
+    results = {}
+
+    for depth in args.depths:
+        if depth >= args.users:
+            continue
+
+        async def keyset():
+            async with open_session() as db:
+                await UserService(db).list_users(depth or None, args.limit, DEFAULT_USER_FIELDS, is_active=args.active_only or None)
+
+        async def offset_orm():
+            query = select(User).order_by(User.id).offset(depth).limit(args.limit)
+            if args.active_only:
+                query = query.where(User.is_active.is_(True))
+            async with open_session() as db:
+                result = await db.execute(query)
+                result.scalars().all()
+
+        results[f"depth_{depth}_keyset"] = await page_latency(keyset, args.iterations)
+        results[f"depth_{depth}_offset_orm"] = await page_latency(offset_orm, args.iterations)
+
+    await dispose_engines()
+    print_table(results)
+    print(f"results written to {write_results('users', results, args.output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 100000, 190000])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--active-only", action="store_true", help="filter on is_active, as the chat UI does")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="path of the JSON results file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# The app reads its configuration at import time; give benchmarks a local
+# SQLite database and an SMTP sink unless the environment says otherwise.
+BENCH_ENV = {
+    "DATABASE_URL": f"sqlite:///{tempfile.gettempdir()}/live_chatr_bench.db",
+    "SECRET_KEY": "benchmark-secret-key",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "BCRYPT_ROUNDS": "12",
+    "SMTP_SERVER": "127.0.0.1",
+    "SMTP_PORT": "2525",
+    "SMTP_STARTTLS": "false",
+    "FROM_EMAIL": "bench@example.com",
+    "FRONTEND_URL": "http://localhost:3000",
+    "DB_ECHO": "false",
+}
+
+
+def setup_environment(**overrides: str):
+    for key, value in {**BENCH_ENV, **overrides}.items():
+        os.environ.setdefault(key, value)
+
+
+def reset_database():
+    from app.database import Base, engine, IS_SQLITE
+    import app.models  # noqa: F401  registers every table
+
+    if IS_SQLITE:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+class QueryCounter:
+    """Counts statements sent through the app's engines."""
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self):
+        from sqlalchemy import event
+        from app.database import engine, async_engine
+
+        engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+        for target in engines:
+            event.listen(target, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float], elapsed: float, queries: Optional[int] = None) -> Dict[str, float]:
+    summary = {
+        "count": len(samples),
+        "throughput_per_sec": len(samples) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+    if queries is not None:
+        summary["queries_per_op"] = queries / len(samples) if samples else 0.0
+    return summary
+
+
+def timed_loop(fn, iterations: int) -> Dict[str, float]:
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - start)
+
+
+def write_results(name: str, results: dict, output: Optional[str] = None) -> Path:
+    path = Path(output) if output else RESULTS_DIR / f"{name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "benchmark": name,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": os.environ.get("DATABASE_URL", "").split("@")[-1],
+        "results": results,
+    }
+    path.write_text(json.dumps(document, indent=2, sort_keys=True))
+    return path
+
+
+def print_table(results: Dict[str, Dict[str, float]]):
+    columns = ["throughput_per_sec", "p50_ms", "p95_ms", "p99_ms", "queries_per_op"]
+    print(f"{'case':<32}" + "".join(f"{c:>20}" for c in columns))
+    for case, summary in results.items():
+        row = "".join(f"{summary[c]:>20.2f}" if c in summary else f"{'-':>20}" for c in columns)
+        print(f"{case:<32}{row}")
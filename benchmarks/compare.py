@@ -0,0 +1,52 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare benchmarks/results/auth-asgi-A.json benchmarks/results/auth-asgi-B.json
+
+Exits non-zero when any case's throughput drops, or its p95/p99 latency or
+queries per op grow, by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = {"throughput_per_sec"}
+COMPARED = ["throughput_per_sec", "p50_ms", "p95_ms", "p99_ms", "queries_per_op"]
+GATED = {"throughput_per_sec", "p95_ms", "p99_ms", "queries_per_op"}
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> bool:
+    regressed = False
+    print(f"{'case':<28}{'metric':<22}{'baseline':>14}{'candidate':>14}{'change':>10}")
+    for case in sorted(set(baseline) & set(candidate)):
+        for metric in COMPARED:
+            if metric not in baseline[case] or metric not in candidate[case]:
+                continue
+            old, new = baseline[case][metric], candidate[case][metric]
+            change = (new - old) / old * 100 if old else 0.0
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if metric in GATED and worse > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"{case:<28}{metric:<22}{old:>14.2f}{new:>14.2f}{change:>+9.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    if compare(load(args.baseline), load(args.candidate), args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()